@@ -1,65 +1,121 @@
-from time import sleep as wait
+import argparse
+import os
+
 from src.log import log
-from src.heartopia.interfacing import sendChat, getChat
-from src.ai.groq import getResponse
-from src.chat.parsing import (
-    build_llm_role_messages,
-    get_inbound_player_messages,
-    normalize_text_for_history,
-    parse_chat_payload,
+from src.heartopia.interfacing import sendChat, sendPackets, captureChat, getDispatcher, load_or_prompt_positions
+from src.ai.governor import GovernedBackend, Governor
+from src.ai.groq import (
+    VISION_STREAM_ENV,
+    get_backend,
+    get_router,
+    getResponse,
+    getResponseAsync,
+    read_chat_frame,
+    set_backend,
+    streamResponse,
 )
+from src.bot import BotState, PollScheduler, ReplyCache, SchedulerConfig, run_pipeline, run_serial
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Heartopia AI chatbot")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap capture, vision, generation and sending with an asyncio pipeline.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream replies and start typing the first packet before generation finishes.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="Fixed seconds between chat captures. By default polling adapts to chat activity.",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Archive every frame, model call and send to DIR for `python -m src.bot.replay`.",
+    )
+    parser.add_argument(
+        "--prewarm-cache",
+        action="store_true",
+        help="Ask the model for replies to common openers at startup so they are served from the reply cache.",
+    )
+    parser.add_argument(
+        "--reply-concurrency",
+        type=int,
+        default=int(os.getenv("HEARTOPIA_REPLY_CONCURRENCY") or 4),
+        help="Replies generated at once when several messages arrive together (sends stay in chat order).",
+    )
+    args = parser.parse_args()
+
+    backend = get_backend()
+    load_or_prompt_positions()
+
+    governor = Governor.from_env()
+    if governor is not None:
+        backend = GovernedBackend(backend, governor)
+        set_backend(backend)
 
-player_context = set()  # Track only unique player messages
-ai_message_history = set()  # Track what the bot has sent to avoid self-replies
+    capture, read, send, send_packets = captureChat, read_chat_frame, sendChat, sendPackets
+    if args.record:
+        from src.bot.recording import RecordingBackend, SessionRecorder
 
+        recorder = SessionRecorder(args.record)
+        set_backend(RecordingBackend(backend, recorder))
+        capture, read = recorder.capture(captureChat), recorder.read(read_chat_frame)
+        send, send_packets = recorder.send(sendChat), recorder.send_packets(sendPackets)
+        log(f"Recording session to {args.record}")
+    read_chat = lambda **kwargs: read(capture(), **kwargs)  # noqa: E731
 
-def _chunk_message(message: str, size: int = 40) -> list[str]:
-    return [message[i:i + size] for i in range(0, len(message), size)] or [""]
+    respond, respond_async, stream_respond = getResponse, getResponseAsync, streamResponse
+    reply_cache = ReplyCache.from_env()
+    if reply_cache is not None:
+        if args.record:
+            reply_cache.on_hit = recorder.cache_hit
+        if args.prewarm_cache:
+            log(f"Pre-warmed reply cache with {reply_cache.prewarm(getResponse)} replies")
+        respond = reply_cache.wrap(getResponse)
+        respond_async = reply_cache.wrap_async(getResponseAsync)
+        stream_respond = reply_cache.wrap_stream(streamResponse)
 
-log("Bot started, monitoring chat...")
+    streaming = {"stream_respond": stream_respond, "send_packets": send_packets} if args.stream else {}
 
-while True:
-    wait(2)
-    raw_chat = getChat()
-    parsed_chat = parse_chat_payload(raw_chat)
-    role_messages = build_llm_role_messages(parsed_chat)
-    inbound_messages = [
-        msg
-        for msg in get_inbound_player_messages(parsed_chat)
-        if normalize_text_for_history(msg.get("message", "")) not in ai_message_history
-    ]
+    if args.interval is None:
+        scheduler = PollScheduler(SchedulerConfig.from_env())
+        pacing = {"scheduler": scheduler}
+    else:
+        scheduler = None
+        pacing = {"interval": args.interval}
+    pacing["governor"] = governor
 
-    if not parsed_chat.get("chat_region_detected"):
-        log("No chat region detected in OCR output; skipping this cycle.")
-        continue
+    state = BotState.from_env()
 
-    for msg_obj in inbound_messages:
-        user = msg_obj.get("user", "player")
-        msg_text = msg_obj.get("message", "")
+    concurrency = {"reply_concurrency": args.reply_concurrency, "stream_vision": os.getenv(VISION_STREAM_ENV) != "0"}
 
-        # Use a tuple of (user, text) to avoid duplicates
-        msg_id = (user, msg_text)
-        if msg_id in player_context:
-            continue  # Already responded
+    log("Bot started, monitoring chat...")
+    try:
+        if args.pipeline:
+            run_pipeline(capture, read, respond_async, send, state=state, **concurrency, **pacing, **streaming)
+        else:
+            run_serial(read_chat, respond, send, state=state, **concurrency, **pacing, **streaming)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.save()
+        log(f"Dedupe state: {state.stats()}")
+        if scheduler is not None:
+            log(f"Poll scheduler: {scheduler.stats()}")
+        if reply_cache is not None:
+            log(f"Reply cache: {reply_cache.stats()}")
+        if governor is not None:
+            log(f"LLM governor: {governor.stats()}")
+        log(f"Model router: {get_router().stats()}")
+        log(f"Input dispatch: {getDispatcher().stats()}")
 
-        player_context.add(msg_id)
-        log(f"New player message detected from {user}: {msg_text}")
 
-        # Generate AI response
-        try:
-            ai_response = getResponse(
-                msg_text,
-                "Roleplay as a casual 15-year-old girl playing Heartopia; "
-                "reply in short (0–60 character) in-game chat style with light slang and occasional emojis, "
-                "no narration, no meta commentary, never mention being an AI, stay in character.",
-                conversation_messages=role_messages,
-            )
-            reply_content = ai_response["choices"][0]["message"]["content"].strip()
-            sendChat(reply_content)
-            for packet in _chunk_message(reply_content):
-                normalized = normalize_text_for_history(packet)
-                if normalized:
-                    ai_message_history.add(normalized)
-            log(f"Sent AI reply: {reply_content}")
-        except Exception as e:
-            log(f"Failed to generate/send AI response: {e}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: None
+Path: "src/ai/"
+
+HTTP client libraries are imported inside the backends so that importing
+this module (and `src.ai.groq`) stays cheap until a call is actually made.
+"""
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+BACKEND_ENV = "HEARTOPIA_LLM_BACKEND"
+BASE_URL_ENV = "HEARTOPIA_LLM_BASE_URL"
+TIMEOUT_ENV = "HEARTOPIA_LLM_TIMEOUT"
+
+
+class BackendError(RuntimeError):
+    """A failed LLM call, with the HTTP status when the server sent one."""
+
+    def __init__(self, message: str, status_code: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class BackendConfig:
+    api_key: str
+    base_url: str = GROQ_BASE_URL
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    pool_size: int = 4
+    max_retries: int = 0
+
+    @classmethod
+    def from_env(cls, api_key: str) -> "BackendConfig":
+        read_timeout = float(os.getenv(TIMEOUT_ENV) or cls.read_timeout)
+        return cls(
+            api_key=api_key,
+            base_url=(os.getenv(BASE_URL_ENV) or GROQ_BASE_URL).rstrip("/"),
+            read_timeout=read_timeout,
+        )
+
+
+class ChatBackend(ABC):
+    """
+    Minimal chat-completions interface the bot talks to. Responses use the
+    OpenAI/Groq response shape as plain dicts; `stream` yields content deltas.
+    A backend must implement `complete`; without its own `stream` the whole
+    reply arrives as one delta, and `acomplete` runs `complete` in a thread.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        ...
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        response = self.complete(model, messages, **options)
+        content = response["choices"][0]["message"]["content"]
+        if content:
+            yield content
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        return await asyncio.to_thread(self.complete, model, messages, **options)
+
+    def close(self) -> None:
+        pass
+
+
+class GroqBackend(ChatBackend):
+    """Groq SDK clients; both keep a pooled httpx connection alive between calls."""
+
+    name = "groq"
+
+    def __init__(self, config: BackendConfig):
+        import httpx
+        from groq import Groq
+
+        self.config = config
+        self._timeout = httpx.Timeout(config.read_timeout, connect=config.connect_timeout)
+        self._client = Groq(
+            api_key=config.api_key,
+            base_url=_groq_sdk_base_url(config.base_url),
+            timeout=self._timeout,
+            max_retries=config.max_retries,
+        )
+        self._async_client = None
+
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        try:
+            response = self._client.chat.completions.create(model=model, messages=messages, **options)
+        except Exception as exc:
+            raise _wrap_groq_error(exc) from exc
+        return response.model_dump()
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        try:
+            chunks = self._client.chat.completions.create(model=model, messages=messages, stream=True, **options)
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as exc:
+            raise _wrap_groq_error(exc) from exc
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        if self._async_client is None:
+            from groq import AsyncGroq
+
+            self._async_client = AsyncGroq(
+                api_key=self.config.api_key,
+                base_url=_groq_sdk_base_url(self.config.base_url),
+                timeout=self._timeout,
+                max_retries=self.config.max_retries,
+            )
+        try:
+            response = await self._async_client.chat.completions.create(model=model, messages=messages, **options)
+        except Exception as exc:
+            raise _wrap_groq_error(exc) from exc
+        return response.model_dump()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """
+    Plain HTTP client for any OpenAI-compatible `/chat/completions` endpoint
+    (Groq, a local server, or the stand-in in `stub_server.py`). A pooled
+    `requests.Session` keeps connections alive so TLS setup is paid once.
+    """
+
+    name = "openai"
+
+    def __init__(self, config: BackendConfig):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.config = config
+        self.url = f"{config.base_url}/chat/completions"
+        self._request_error = requests.RequestException
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.pool_size, max_retries=config.max_retries)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Authorization": f"Bearer {config.api_key}"})
+        self._async_client = None
+
+    @property
+    def _timeout(self) -> tuple[float, float]:
+        return self.config.connect_timeout, self.config.read_timeout
+
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        body = {"model": model, "messages": messages, **options}
+        try:
+            response = self._session.post(self.url, json=body, timeout=self._timeout)
+        except self._request_error as exc:
+            raise BackendError(f"Request to {self.url} failed: {exc}") from exc
+        _raise_for_status(response.status_code, response.headers, response.text)
+        return response.json()
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        body = {"model": model, "messages": messages, "stream": True, **options}
+        try:
+            with self._session.post(self.url, json=body, timeout=self._timeout, stream=True) as response:
+                if response.status_code >= 400:
+                    _raise_for_status(response.status_code, response.headers, response.text)
+                yield from _iter_sse_deltas(response.iter_lines(decode_unicode=True))
+        except self._request_error as exc:
+            raise BackendError(f"Streaming request to {self.url} failed: {exc}") from exc
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        import httpx
+
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.config.api_key}"},
+                timeout=httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.config.pool_size,
+                    max_keepalive_connections=self.config.pool_size,
+                ),
+            )
+        body = {"model": model, "messages": messages, **options}
+        try:
+            response = await self._async_client.post(self.url, json=body)
+        except httpx.HTTPError as exc:
+            raise BackendError(f"Request to {self.url} failed: {exc}") from exc
+        _raise_for_status(response.status_code, response.headers, response.text)
+        return response.json()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self) -> None:
+        self._session.close()
+
+
+BACKENDS = {
+    GroqBackend.name: GroqBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+}
+
+
+def create_backend(config: BackendConfig, name: str | None = None) -> ChatBackend:
+    """
+    Pick a backend by name (or `HEARTOPIA_LLM_BACKEND`). A custom base URL
+    without an explicit name selects the plain OpenAI-compatible client.
+    """
+    name = name or os.getenv(BACKEND_ENV)
+    if not name:
+        name = GroqBackend.name if config.base_url == GROQ_BASE_URL else OpenAICompatibleBackend.name
+    backend_cls = BACKENDS.get(name.lower())
+    if backend_cls is None:
+        raise ValueError(f"Unknown LLM backend '{name}'. Choose from: {', '.join(sorted(BACKENDS))}")
+    return backend_cls(config)
+
+
+def _groq_sdk_base_url(base_url: str) -> str:
+    # The Groq SDK appends `/openai/v1/...` itself.
+    suffix = "/openai/v1"
+    return base_url[: -len(suffix)] if base_url.endswith(suffix) else base_url
+
+
+def _parse_retry_after(headers: Any) -> float | None:
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _raise_for_status(status_code: int, headers: Any, text: str) -> None:
+    if status_code < 400:
+        return
+    raise BackendError(
+        f"LLM backend returned HTTP {status_code}: {text[:200]}",
+        status_code=status_code,
+        retry_after=_parse_retry_after(headers),
+    )
+
+
+def _wrap_groq_error(exc: Exception) -> BackendError:
+    response = getattr(exc, "response", None)
+    return BackendError(
+        str(exc),
+        status_code=getattr(exc, "status_code", None),
+        retry_after=_parse_retry_after(getattr(response, "headers", None)),
+    )
+
+
+def _iter_sse_deltas(lines: Iterator[str]) -> Iterator[str]:
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
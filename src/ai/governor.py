@@ -0,0 +1,439 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from ..chat.memory import count_tokens
+from ..log import debug, warning
+from .backends import BackendError, ChatBackend
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "chat/memory.py", "ai/backends.py"
+Path: "src/ai/"
+
+Client-side governor for LLM calls, wrapped around the backend:
+- token buckets per model for requests and tokens per minute, so calls wait
+  locally instead of being rejected with HTTP 429;
+- retries with jittered exponential backoff for 429, 5xx and network errors,
+  honoring `Retry-After`;
+- a circuit breaker per model that stops calling it after repeated
+  failures, so the router moves on to another model, and the bot idles
+  (degraded mode) once every model's breaker is open;
+- token usage totals from each response's `usage` field.
+
+Environment:
+- HEARTOPIA_LLM_GOVERNOR=0: disable the governor
+- HEARTOPIA_LLM_RPM: requests per minute per model (default 30)
+- HEARTOPIA_LLM_TPM: tokens per minute per model (default 12000)
+- HEARTOPIA_LLM_RETRIES: retries after a failed call (default 2)
+- HEARTOPIA_LLM_BREAKER_FAILURES: failed calls in a row that open the breaker (default 5)
+- HEARTOPIA_LLM_BREAKER_COOLDOWN: seconds the breaker stays open at first (default 30)
+"""
+
+GOVERNOR_ENV = "HEARTOPIA_LLM_GOVERNOR"
+RPM_ENV = "HEARTOPIA_LLM_RPM"
+TPM_ENV = "HEARTOPIA_LLM_TPM"
+RETRIES_ENV = "HEARTOPIA_LLM_RETRIES"
+BREAKER_FAILURES_ENV = "HEARTOPIA_LLM_BREAKER_FAILURES"
+BREAKER_COOLDOWN_ENV = "HEARTOPIA_LLM_BREAKER_COOLDOWN"
+
+IMAGE_TOKENS = 800  # Rough cost of one chat-panel upload
+COMPLETION_TOKENS = 200  # Expected completion size when `max_tokens` is not set
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpenError(BackendError):
+    """Raised instead of calling the backend while the model's circuit breaker is open."""
+
+
+class ThrottledError(BackendError):
+    """Raised instead of waiting longer than `GovernorConfig.max_wait` for rate-limit budget."""
+
+
+def estimate_tokens(messages: list[dict[str, Any]], max_tokens: int | None = None) -> int:
+    """Prompt plus expected completion tokens, for charging the TPM bucket up front."""
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += count_tokens(content)
+        else:
+            for part in content or ():
+                tokens += IMAGE_TOKENS if part.get("type") == "image_url" else count_tokens(part.get("text", ""))
+    return tokens + (max_tokens or COMPLETION_TOKENS)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (CircuitOpenError, ThrottledError)) or not isinstance(exc, BackendError):
+        return False
+    status = exc.status_code
+    return status is None or status in RETRYABLE_STATUS or status >= 500
+
+
+@dataclass(frozen=True)
+class GovernorConfig:
+    requests_per_minute: float = 30
+    tokens_per_minute: float = 12000
+    max_retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    max_wait: float = 30.0  # Longest single limiter or retry wait before giving up
+    breaker_failures: int = 5
+    breaker_cooldown: float = 30.0
+    max_breaker_cooldown: float = 300.0
+
+    @classmethod
+    def from_env(cls) -> "GovernorConfig":
+        return cls(
+            requests_per_minute=float(os.getenv(RPM_ENV) or cls.requests_per_minute),
+            tokens_per_minute=float(os.getenv(TPM_ENV) or cls.tokens_per_minute),
+            max_retries=int(os.getenv(RETRIES_ENV) or cls.max_retries),
+            breaker_failures=int(os.getenv(BREAKER_FAILURES_ENV) or cls.breaker_failures),
+            breaker_cooldown=float(os.getenv(BREAKER_COOLDOWN_ENV) or cls.breaker_cooldown),
+        )
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` tokens a minute up to `per_minute`. `reserve` always
+    takes the tokens and returns how long the caller must wait for them, so
+    concurrent callers queue up in order instead of racing.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self._tokens = per_minute
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) tokens once the real cost is known."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` failed calls in a row. While open every call is
+    refused; once the cooldown has passed one probe call is let through. A
+    failed probe reopens the breaker with twice the cooldown.
+    """
+
+    def __init__(
+        self,
+        failures: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "LLM",
+    ):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.consecutive_failures = 0
+        self.opened = 0
+        self._open_until: float | None = None
+        self._current_cooldown = cooldown
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._open_until is None:
+            return "closed"
+        return "open" if self.clock() < self._open_until or self._probing else "half_open"
+
+    def remaining(self) -> float:
+        """Seconds until a probe call is allowed; 0 when calls may go through."""
+        if self._open_until is None:
+            return 0.0
+        return max(0.0, self._open_until - self.clock())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if self._probing or self.clock() < self._open_until:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """Hand back a probe that was allowed but never made, so the next call may probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self._open_until = None
+            self._probing = False
+            self._current_cooldown = self.cooldown
+
+    def record_failure(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._probing:
+                self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+            elif self.consecutive_failures < self.failures:
+                return
+            self._probing = False
+            cooldown = max(self._current_cooldown, retry_after or 0.0)
+            self._open_until = self.clock() + cooldown
+            self.opened += 1
+        warning(f"{self.name} circuit breaker open for {cooldown:.0f}s after {self.consecutive_failures} failed calls")
+
+
+class UsageTracker:
+    """Request and token totals per model, from each response's `usage` field."""
+
+    def __init__(self):
+        self.models: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, usage: dict[str, Any] | None) -> None:
+        with self._lock:
+            totals = self.models.setdefault(
+                model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            )
+            totals["requests"] += 1
+            for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                totals[field] += int((usage or {}).get(field) or 0)
+
+    def total(self, field: str = "total_tokens") -> int:
+        return sum(totals[field] for totals in self.models.values())
+
+
+class Governor:
+    """Rate limits, retry policy, circuit breakers and usage, per model, shared by every LLM call."""
+
+    def __init__(
+        self,
+        config: GovernorConfig | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: random.Random | None = None,
+    ):
+        self.config = config or GovernorConfig()
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.usage = UsageTracker()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.refused = 0
+
+    @classmethod
+    def from_env(cls) -> "Governor | None":
+        if os.getenv(GOVERNOR_ENV) == "0":
+            return None
+        return cls(GovernorConfig.from_env())
+
+    def buckets(self, model: str) -> tuple[TokenBucket, TokenBucket]:
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                buckets = self._buckets[model] = (
+                    TokenBucket(self.config.requests_per_minute, self.clock),
+                    TokenBucket(self.config.tokens_per_minute, self.clock),
+                )
+            return buckets
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                config = self.config
+                breaker = self._breakers[model] = CircuitBreaker(
+                    config.breaker_failures, config.breaker_cooldown, config.max_breaker_cooldown, self.clock, f"`{model}`"
+                )
+            return breaker
+
+    def idle_seconds(self) -> float:
+        """How long the bot should stay idle because every model is unhealthy (degraded mode)."""
+        remaining = [breaker.remaining() for breaker in list(self._breakers.values())]
+        if not remaining or not all(remaining):
+            return 0.0
+        return min(remaining)
+
+    def admit(self, model: str, estimated_tokens: int) -> float:
+        """
+        Check the model's breaker and reserve rate-limit budget; returns the
+        wait before calling. A wait longer than `max_wait` is refused instead.
+        """
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            self.refused += 1
+            remaining = breaker.remaining()
+            raise CircuitOpenError(
+                f"Circuit breaker for `{model}` open for another {remaining:.0f}s", retry_after=remaining
+            )
+        requests, tokens = self.buckets(model)
+        wait = max(requests.reserve(1), tokens.reserve(estimated_tokens))
+        if wait > self.config.max_wait:
+            requests.adjust(-1)
+            tokens.adjust(-estimated_tokens)
+            breaker.release()
+            self.refused += 1
+            raise ThrottledError(f"Rate limit for `{model}` needs a {wait:.0f}s wait", status_code=429, retry_after=wait)
+        if wait > 0:
+            self.throttled_seconds += wait
+            debug(f"Rate limit for `{model}`: waiting {wait:.2f}s")
+        return wait
+
+    def settle(self, model: str, estimated_tokens: int, response: dict | None) -> None:
+        """Record a successful call and correct the TPM charge with the reported usage."""
+        self.breaker(model).record_success()
+        usage = (response or {}).get("usage")
+        self.usage.record(model, usage)
+        if usage and usage.get("total_tokens"):
+            self.buckets(model)[1].adjust(int(usage["total_tokens"]) - estimated_tokens)
+
+    def retry_delay(self, model: str, attempt: int, exc: Exception) -> float | None:
+        """Backoff before retry `attempt` (0-based), or None when the call should not be retried."""
+        config = self.config
+        if not is_retryable(exc) or attempt >= config.max_retries or self.breaker(model).state != "closed":
+            return None
+        delay = self.rng.uniform(0, min(config.max_delay, config.base_delay * 2**attempt))
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay if delay <= config.max_wait else None
+
+    def failed(self, model: str, exc: Exception) -> None:
+        if is_retryable(exc):
+            self.breaker(model).record_failure(getattr(exc, "retry_after", None))
+        elif not isinstance(exc, (CircuitOpenError, ThrottledError)):
+            self.breaker(model).record_success()  # The API answered; the request itself was bad
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "breakers": {model: breaker.state for model, breaker in self._breakers.items()},
+            "breaker_opened": sum(breaker.opened for breaker in self._breakers.values()),
+            "refused": self.refused,
+            "retries": self.retries,
+            "throttled_s": round(self.throttled_seconds, 2),
+            "tokens": self.usage.total(),
+            "usage": {model: dict(totals) for model, totals in self.usage.models.items()},
+        }
+
+
+class GovernedBackend(ChatBackend):
+    """Runs every call on `inner` through a `Governor`."""
+
+    name = "governed"
+
+    def __init__(self, inner: ChatBackend, governor: Governor):
+        self.inner = inner
+        self.governor = governor
+
+    @property
+    def config(self):
+        return self.inner.config
+
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        governor = self.governor
+        estimated = estimate_tokens(messages, options.get("max_tokens"))
+        attempt = 0
+        while True:
+            self._pause(governor.admit(model, estimated))
+            try:
+                response = self.inner.complete(model, messages, **options)
+            except Exception as exc:
+                delay = self._on_failure(model, attempt, exc)
+                self._pause(delay)
+                attempt += 1
+                continue
+            governor.settle(model, estimated, response)
+            return response
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        # Only retried before the first delta; a half-typed reply cannot be taken back.
+        governor = self.governor
+        estimated = estimate_tokens(messages, options.get("max_tokens"))
+        attempt = 0
+        while True:
+            self._pause(governor.admit(model, estimated))
+            started = False
+            try:
+                for delta in self.inner.stream(model, messages, **options):
+                    if not started:
+                        started = True
+                        governor.breaker(model).record_success()
+                    yield delta
+            except Exception as exc:
+                if started:
+                    governor.failed(model, exc)
+                    raise
+                delay = self._on_failure(model, attempt, exc)
+                self._pause(delay)
+                attempt += 1
+                continue
+            if not started:
+                governor.breaker(model).record_success()  # An empty reply is still an answer
+            governor.usage.record(model, None)
+            return
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        governor = self.governor
+        estimated = estimate_tokens(messages, options.get("max_tokens"))
+        attempt = 0
+        while True:
+            wait = governor.admit(model, estimated)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.inner.acomplete(model, messages, **options)
+            except Exception as exc:
+                delay = self._on_failure(model, attempt, exc)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            governor.settle(model, estimated, response)
+            return response
+
+    def _on_failure(self, model: str, attempt: int, exc: Exception) -> float:
+        """Backoff before the next attempt; re-raises `exc` once it should not be retried."""
+        delay = self.governor.retry_delay(model, attempt, exc)
+        if delay is None:
+            self.governor.failed(model, exc)
+            raise exc
+        self.governor.retries += 1
+        warning(f"LLM call to `{model}` failed ({exc}); retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def _pause(self, seconds: float) -> None:
+        if seconds > 0:
+            self.governor.sleep(seconds)
+
+    def close(self) -> None:
+        self.inner.close()
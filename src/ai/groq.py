@@ -1,12 +1,22 @@
+from __future__ import annotations
+
 import os
-import requests
-from ..log import log
-from groq import Groq
-import base64
+from ..log import debug, error, log, warning
 from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Iterator
 from ..env_loader import load_env_file
-from ..heartopia.chat_preprocess import prepare_chat_message_list
-from ..heartopia.side_inference import correct_message_sides
+from .backends import BackendConfig, ChatBackend, create_backend
+from .metrics import LatencyStats
+from .router import ModelRouter
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+    from ..chat.models import ChatFrame, ChatMessage
+    from ..heartopia.change_detection import FrameChangeCache
+    from ..heartopia.scroll_tracking import ScrollTranscript
+    from .image_encoding import EncodedImage, EncodeSettings
 
 """
 Website: https://github.com/novadevvvv
@@ -15,42 +25,116 @@ Path: "src/ai/"
 """
 
 apiEnv = "heartopiaChatAPI"
-load_env_file()
-apiKey = os.getenv(apiEnv)
+LOCAL_BUBBLES_ENV = "HEARTOPIA_LOCAL_BUBBLES"
+TEXT_ONLY_ENV = "HEARTOPIA_VISION_TEXT_ONLY"
+VISION_STREAM_ENV = "HEARTOPIA_VISION_STREAM"
+
+first_token_stats = LatencyStats()
+
+# Built on first use so importing this module has no side effects.
+_backend: ChatBackend | None = None
+_router: ModelRouter | None = None
+frame_cache: FrameChangeCache | None = None
+transcript: ScrollTranscript | None = None
+last_upload: EncodedImage | None = None  # Size and encode time of the latest vision upload
+
+
+def get_backend() -> ChatBackend:
+    """Create the LLM backend on first use from `.env` / environment settings."""
+    global _backend
+    if _backend is None:
+        load_env_file()
+        apiKey = os.getenv(apiEnv)
+        if not apiKey:
+            error("Invalid API Key")
+            raise RuntimeError(f"Environment variable '{apiEnv}' not set")
+
+        log(f"Got API Key Starting With {apiKey[:10]}")
+        _backend = create_backend(BackendConfig.from_env(apiKey))
+        log(f"Using `{_backend.name}` LLM backend at {_backend.config.base_url}")
+    return _backend
+
+
+def set_backend(backend: ChatBackend | None) -> None:
+    """Swap the backend used by every call, e.g. for a stand-in during replay."""
+    global _backend
+    _backend = backend
+
+
+def get_router() -> ModelRouter:
+    """Create the model router on first use from environment settings."""
+    global _router
+    if _router is None:
+        _router = ModelRouter.from_env()
+    return _router
+
 
-if apiKey is None:
-    log("Invalid API Key")
-    exit()
+def set_router(router: ModelRouter | None) -> None:
+    global _router
+    _router = router
 
-log(f"Got API Key Starting With {apiKey[:10]}")
 
-client = Groq(api_key=apiKey)
+def _vision_history() -> tuple[FrameChangeCache, ScrollTranscript]:
+    global frame_cache, transcript
+    if frame_cache is None or transcript is None:
+        from ..heartopia.change_detection import FrameChangeCache
+        from ..heartopia.scroll_tracking import ScrollTranscript
 
-import base64
-from PIL import Image
-from io import BytesIO
+        frame_cache = FrameChangeCache()
+        transcript = ScrollTranscript()
+    return frame_cache, transcript
 
-def encode_image(image) -> str:
+
+def reset_vision_history() -> None:
+    """Forget the previous frame, so the next `imageToText` does a full read."""
+    global frame_cache, transcript
+    frame_cache = None
+    transcript = None
+
+
+def encode_image(image, settings: EncodeSettings | None = None) -> str:
     """
     Accepts either:
     - file path (str)
     - PIL Image object
-    Returns base64 string
+    Returns base64 string, encoded with `settings` (env-configured vision defaults when omitted)
     """
+    return _encode_upload(image, settings).base64
+
+
+def _encode_upload(image, settings: EncodeSettings | None = None) -> EncodedImage:
+    global last_upload
+    from PIL import Image
+
+    from .image_encoding import EncodeSettings, encode_for_vision
+
     if isinstance(image, str):
-        with open(image, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
-    elif isinstance(image, Image.Image):
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
-    else:
+        with Image.open(image) as opened:
+            image = opened.copy()
+    elif not isinstance(image, Image.Image):
         raise TypeError("encode_image expects a file path or PIL Image")
 
-if not apiKey:
-    raise RuntimeError(f"Environment variable '{apiEnv}' not set")
+    encoded = encode_for_vision(image, settings or EncodeSettings.from_env())
+    last_upload = encoded
+    debug(
+        f"Encoded {encoded.width}x{encoded.height} {encoded.mime_type} upload: "
+        f"{encoded.num_bytes} bytes in {encoded.encode_ms:.1f} ms"
+    )
+    return encoded
+
+
+def _build_chat_messages(
+    prompt: str,
+    context: str,
+    conversation_messages: list[dict[str, str]] | None,
+) -> list[dict[str, str]]:
+    messages = [{"role": "system", "content": context}]
+    if conversation_messages:
+        messages.extend(conversation_messages)
+    else:
+        messages.append({"role": "user", "content": prompt})
+    return messages
 
-URL = "https://api.groq.com/openai/v1/chat/completions"
 
 def getResponse(
     prompt: str,
@@ -58,74 +142,308 @@ def getResponse(
     conversation_messages: list[dict[str, str]] | None = None,
 ) -> dict:
 
-    model = "llama-3.3-70b-versatile"
+    router = get_router()
+    messages = _build_chat_messages(prompt, context, conversation_messages)
 
-    log(f"Creating Payload For `{model}`")
+    def complete(model: str) -> dict:
+        debug(f"Creating Payload For `{model}`")
+        return get_backend().complete(model, messages)
 
-    messages = [{"role": "system", "content": context}]
-    if conversation_messages:
-        messages.extend(conversation_messages)
-    else:
-        messages.append({"role": "user", "content": prompt})
+    response = router.run(router.chat_models(prompt, conversation_messages), complete)
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages
-    )
+    debug(f"Recieved Response Of `{len(response)}` Objects.")
+
+    return response
+
+
+async def getResponseAsync(
+    prompt: str,
+    context: str,
+    conversation_messages: list[dict[str, str]] | None = None,
+) -> dict:
+    """`getResponse` on the backend's async client, for use inside an event loop."""
+    router = get_router()
+    messages = _build_chat_messages(prompt, context, conversation_messages)
+
+    async def acomplete(model: str) -> dict:
+        debug(f"Creating Async Payload For `{model}`")
+        return await get_backend().acomplete(model, messages)
+
+    return await router.arun(router.chat_models(prompt, conversation_messages), acomplete)
+
+
+def streamResponse(
+    prompt: str,
+    context: str,
+    conversation_messages: list[dict[str, str]] | None = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of `getResponse` that yields content deltas as they
+    arrive. Time to first token is recorded in `first_token_stats`.
+    """
+    router = get_router()
+    messages = _build_chat_messages(prompt, context, conversation_messages)
+    models = router.chat_models(prompt, conversation_messages)
 
-    log(f"Recieved Response Of `{len(response.model_dump())}` Objects.")
+    for index, model in enumerate(models):
+        debug(f"Creating Streaming Payload For `{model}`")
+        started = perf_counter()
+        first_token = True
+        try:
+            for delta in get_backend().stream(model, messages):
+                if first_token:
+                    first_token = False
+                    first_token_stats.record((perf_counter() - started) * 1000)
+                    router.record(model, first_token_stats.last_ms, ok=True)
+                    debug(f"First token from `{model}` after {first_token_stats.last_ms:.0f} ms.")
+                yield delta
+        except Exception as exc:
+            # Fail over only before anything was yielded; typed packets cannot be taken back.
+            if first_token and router.fail_over(model, exc, len(models) - index - 1):
+                continue
+            raise
+        return
 
-    return response.model_dump()
 
-def imageToText(image: str) -> str:
-    model = "meta-llama/llama-4-scout-17b-16e-instruct"
-    log(f"Creating Payload For `{model}`")
+def imageToText(
+    image: str | Image.Image,
+    use_history: bool = True,
+    on_message: Callable[[ChatMessage], None] | None = None,
+) -> str:
+    """`read_chat_frame` as a JSON payload, for callers that want the read as text."""
+    return read_chat_frame(image, use_history, on_message).to_json()
+
+
+def read_chat_frame(
+    image: str | Image.Image,
+    use_history: bool = True,
+    on_message: Callable[[ChatMessage], None] | None = None,
+) -> ChatFrame:
+    """
+    Read the chat panel in `image` and return a side-corrected frame. The
+    vision response is decoded once; placement, side correction and scroll
+    merging work on the frame's message objects.
+
+    With `use_history` the previous frame is reused: an unchanged crop skips
+    the vision call, and a scrolled crop only sends the newly revealed strip.
+    Bubble geometry and sides come from local segmentation when it finds the
+    same bubbles the model read. A reused frame is shared, so callers must
+    not modify it.
+
+    With `on_message` the vision call is streamed and each message is passed
+    to it as soon as the model has finished writing it, top to bottom, with
+    the matching segmented bubble's side and geometry when there is one.
+    These early messages are uncorrected; the returned frame is final.
+    """
+    from ..chat.models import ChatFrame
+    from ..heartopia.bubbles import segment_bubbles
+    from ..heartopia.chat_preprocess import prepare_chat_message_list
+
     cropped_image, classifier_hints = prepare_chat_message_list(image)
     _maybe_dump_debug_crop(image, cropped_image)
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are extracting Heartopia chat from a cropped image that already contains only the chat history message-list area. "
-                    "Return strict JSON only (no markdown, no prose). "
-                    "Use exactly this schema: "
-                    "{\"chat_region_detected\": <true|false>, \"messages\": [{\"side\": \"left|right|unknown\", \"x_min\": <0.0-1.0>, \"x_max\": <0.0-1.0>, \"x_center\": <0.0-1.0>, \"y_center\": <0.0-1.0>, \"user\": \"<name or unknown>\", \"message\": \"<text>\"}]}. "
-                    "Rules: left side means other player, right side means current player (AI). "
-                    "Only include actual chat bubbles visible in this cropped message-list image. "
-                    "If a left chat bubble has an avatar/name and text, set user to the displayed name and message to bubble text. "
-                    "If a right chat bubble has no shown username, set user to \"unknown\" and message to bubble text. "
-                    "x_min and x_max are required for each bubble and must be normalized bubble bounds relative to cropped width. "
-                    "x_center is required and should match the bubble center position. "
-                    "y_center is required and should be normalized bubble center position relative to cropped height. "
-                    "Preserve visual top-to-bottom order for the bubbles in the message list only. "
-                    "If no chat bubbles are visible, return chat_region_detected=false and messages=[]. "
-                    "If text is unreadable, use an empty messages array."
-                )
-            },
-            {
-                "role": "user",
-                "content": "What's in this image?"
-            },
-            {
-                "role": "user",
-                "content": [
-                    {  # wrap the image in a list
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{encode_image(cropped_image)}"
-                        }
-                    }
-                ]
-            }
-        ]
-    )
+    if use_history:
+        # Checked before segmenting: an unchanged crop needs neither.
+        frame_cache, transcript = _vision_history()
+        cached_frame = frame_cache.lookup(cropped_image)
+        if cached_frame is not None:
+            log(f"Chat frame unchanged; reusing last payload ({frame_cache.saved_calls} calls saved).")
+            return cached_frame
+
+    bubbles = segment_bubbles(cropped_image, classifier_hints) if os.getenv(LOCAL_BUBBLES_ENV) != "0" else []
+    streamed = _StreamedRead(on_message, bubbles, *cropped_image.size) if on_message else None
+
+    if not use_history:
+        frame = _read_full_crop(cropped_image, bubbles, streamed)
+        return _place_frame(frame, cropped_image, classifier_hints, bubbles)
+
+    plan = transcript.plan(cropped_image)
+    frame = None
+    if plan is not None:
+        if plan.needs_read:
+            strip = cropped_image.crop((0, plan.strip_top, cropped_image.width, cropped_image.height))
+            log(f"Chat scrolled {plan.scroll_offset}px; reading {plan.strip_height}px strip only.")
+            strip_frame = ChatFrame.decode(_request_vision_payload(strip, streamed=streamed, full_crop=False))
+        else:
+            strip_frame = ChatFrame([], False)
+        frame = transcript.merge(plan, strip_frame)
+        if frame is None:
+            warning("Strip read was not valid JSON; falling back to a full read.")
+            plan = None
+    if frame is None:
+        frame = _read_full_crop(cropped_image, bubbles, streamed)
+
+    frame = _place_frame(frame, cropped_image, classifier_hints, bubbles)
+    frame_cache.store(frame)
+    transcript.commit(cropped_image, frame, plan)
+    return frame
+
+
+class _StreamedRead:
+    """
+    The streamed messages of one `read_chat_frame` call. Every vision
+    attempt (a failover, or a fallback from the strip or text-only read to
+    the full read) starts placing at the first bubble again, and a message
+    already passed to `on_message` by an earlier attempt is not passed again.
+    """
+
+    def __init__(self, on_message: Callable[[ChatMessage], None], bubbles: list, width: int, height: int):
+        self.on_message = on_message
+        self.bubbles = bubbles
+        self.size = (width, height)
+        self.delivered: set[tuple[str, str]] = set()
+
+    def attempt(self, full_crop: bool = True) -> Callable[[ChatMessage], None]:
+        """Callback for one vision attempt; on a full-crop read the n-th message goes on the n-th bubble."""
+        index = 0
+
+        def deliver(message: ChatMessage) -> None:
+            nonlocal index
+            if full_crop and index < len(self.bubbles):
+                self.bubbles[index].place(message, *self.size)
+            index += 1
+            key = (message.user, message.message)
+            if key not in self.delivered:
+                self.delivered.add(key)
+                self.on_message(message)
+
+        return deliver
 
-    log(f"Received Response With {len(response.choices)} Choices.")
-    raw_payload = response.choices[0].message.content
-    return correct_message_sides(raw_payload, cropped_image, classifier_hints=classifier_hints)
+
+def _read_full_crop(cropped_image: Image.Image, bubbles: list, streamed: _StreamedRead | None = None) -> ChatFrame:
+    """
+    Read of the whole crop. With a glyph atlas configured
+    (`HEARTOPIA_OCR_ATLAS`) the bubbles are read locally first and the vision
+    model is only called when that read is not confident. With
+    `HEARTOPIA_VISION_TEXT_ONLY=1` and bubbles found locally, the model is
+    asked for names and text only; if it reads a different number of
+    bubbles, the full-geometry read is used.
+    """
+    from ..chat.models import ChatFrame
+    from ..heartopia.bubbles import place_on_bubbles
+    from ..heartopia.ocr import get_atlas, min_confidence_from_env, read_bubbles
+
+    atlas = get_atlas() if bubbles else None
+    if atlas is not None:
+        started = perf_counter()
+        local_frame = read_bubbles(cropped_image, bubbles, atlas, min_confidence_from_env())
+        elapsed_ms = (perf_counter() - started) * 1000
+        if local_frame is not None:
+            log(f"Read {len(bubbles)} bubbles with local OCR in {elapsed_ms:.0f}ms; skipping the vision call.")
+            return local_frame
+        debug(f"Local OCR below confidence after {elapsed_ms:.0f}ms; asking the vision model.")
+
+    if bubbles and os.getenv(TEXT_ONLY_ENV) == "1":
+        text_frame = ChatFrame.decode(_request_vision_payload(cropped_image, text_only=True, streamed=streamed))
+        if text_frame is not None and place_on_bubbles(text_frame, bubbles, *cropped_image.size) is not None:
+            return text_frame
+        warning("Text-only read did not match the segmented bubbles; reading geometry too.")
+    return ChatFrame.from_text(_request_vision_payload(cropped_image, streamed=streamed))
+
+
+def _place_frame(
+    frame: ChatFrame,
+    cropped_image: Image.Image,
+    classifier_hints: dict[str, float] | None,
+    bubbles: list,
+) -> ChatFrame:
+    from ..heartopia.bubbles import place_on_bubbles
+    from ..heartopia.side_inference import correct_frame_sides
+
+    placed = place_on_bubbles(frame, bubbles, *cropped_image.size) if bubbles else None
+    if placed is not None:
+        return placed
+    return correct_frame_sides(frame, cropped_image, classifier_hints=classifier_hints)
+
+
+def _request_vision_payload(
+    image: Image.Image, text_only: bool = False, streamed: _StreamedRead | None = None, full_crop: bool = True
+) -> str:
+    router = get_router()
+    messages = _vision_messages(image, TEXT_ONLY_PROMPT if text_only else VISION_PROMPT)
+    if streamed is not None and os.getenv(VISION_STREAM_ENV) != "0":
+        return router.run(router.vision_models(), _vision_stream(messages, streamed, full_crop))
+
+    def complete(model: str) -> dict:
+        debug(f"Creating Payload For `{model}`")
+        return get_backend().complete(model, messages)
+
+    response = router.run(router.vision_models(), complete)
+
+    debug(f"Received Response With {len(response['choices'])} Choices.")
+    return response["choices"][0]["message"]["content"]
+
+
+def _vision_stream(messages: list[dict], streamed: _StreamedRead, full_crop: bool = True) -> Callable[[str], str]:
+    """
+    Streamed vision call for `ModelRouter.run`: decoded message objects go to
+    `streamed` as they complete and the full text is returned. After a
+    failover, messages an earlier attempt already delivered are not repeated.
+    """
+    from ..chat.parsing import MessageStreamDecoder
+
+    def stream(model: str) -> str:
+        debug(f"Creating Streaming Payload For `{model}`")
+        decoder = MessageStreamDecoder()
+        deliver = streamed.attempt(full_crop)
+        for delta in get_backend().stream(model, messages):
+            for message in decoder.feed(delta):
+                deliver(message)
+        return decoder.text
+
+    return stream
+
+
+VISION_PROMPT = (
+    "You are extracting Heartopia chat from a cropped image that already contains only the chat history message-list area. "
+    "Return strict JSON only (no markdown, no prose). "
+    "Use exactly this schema: "
+    "{\"chat_region_detected\": <true|false>, \"messages\": [{\"side\": \"left|right|unknown\", \"x_min\": <0.0-1.0>, \"x_max\": <0.0-1.0>, \"x_center\": <0.0-1.0>, \"y_center\": <0.0-1.0>, \"user\": \"<name or unknown>\", \"message\": \"<text>\"}]}. "
+    "Rules: left side means other player, right side means current player (AI). "
+    "Only include actual chat bubbles visible in this cropped message-list image. "
+    "If a left chat bubble has an avatar/name and text, set user to the displayed name and message to bubble text. "
+    "If a right chat bubble has no shown username, set user to \"unknown\" and message to bubble text. "
+    "x_min and x_max are required for each bubble and must be normalized bubble bounds relative to cropped width. "
+    "x_center is required and should match the bubble center position. "
+    "y_center is required and should be normalized bubble center position relative to cropped height. "
+    "Preserve visual top-to-bottom order for the bubbles in the message list only. "
+    "If no chat bubbles are visible, return chat_region_detected=false and messages=[]. "
+    "If text is unreadable, use an empty messages array."
+)
+
+TEXT_ONLY_PROMPT = (
+    "You are reading Heartopia chat from a cropped image that contains only the chat history message-list area. "
+    "Return strict JSON only (no markdown, no prose). "
+    "Use exactly this schema: "
+    "{\"chat_region_detected\": <true|false>, \"messages\": [{\"user\": \"<name or unknown>\", \"message\": \"<text>\"}]}. "
+    "Give one entry per chat bubble, in visual top-to-bottom order; skip bubbles whose text is cut off. "
+    "Set user to the name shown above a bubble, or \"unknown\" when no name is shown. "
+    "If no chat bubbles are visible, return chat_region_detected=false and messages=[]."
+)
+
+
+def _vision_messages(image: Image.Image, prompt: str = VISION_PROMPT) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": prompt
+        },
+        {
+            "role": "user",
+            "content": "What's in this image?"
+        },
+        {
+            "role": "user",
+            "content": [
+                {  # wrap the image in a list
+                    "type": "image_url",
+                    "image_url": {
+                        "url": _encode_upload(image).data_url
+                    }
+                }
+            ]
+        }
+    ]
 
 
 def _maybe_dump_debug_crop(image: str | Image.Image, cropped_image: Image.Image) -> None:
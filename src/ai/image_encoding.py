@@ -0,0 +1,113 @@
+import base64
+import math
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image, ImageOps
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: None
+Path: "src/ai/"
+"""
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@dataclass(frozen=True)
+class EncodeSettings:
+    """
+    How a chat crop is turned into a vision upload. `max_pixels` caps
+    width * height (downscaled with aspect ratio kept); `autocontrast`
+    stretches the histogram so pale bubble text stays legible after
+    compression.
+    """
+
+    format: str = "JPEG"
+    quality: int = 85
+    max_pixels: int | None = None
+    grayscale: bool = False
+    autocontrast: bool = False
+
+    @classmethod
+    def from_env(cls) -> "EncodeSettings":
+        max_pixels = os.getenv("HEARTOPIA_VISION_MAX_PIXELS")
+        return cls(
+            format=(os.getenv("HEARTOPIA_VISION_FORMAT") or cls.format).upper(),
+            quality=int(os.getenv("HEARTOPIA_VISION_QUALITY") or cls.quality),
+            max_pixels=int(max_pixels) if max_pixels else None,
+            grayscale=os.getenv("HEARTOPIA_VISION_GRAYSCALE") == "1",
+            autocontrast=os.getenv("HEARTOPIA_VISION_AUTOCONTRAST") == "1",
+        )
+
+    def label(self) -> str:
+        parts = [self.format.lower()]
+        if self.format != "PNG":
+            parts.append(f"q{self.quality}")
+        if self.max_pixels:
+            parts.append(f"{self.max_pixels // 1000}kpx")
+        if self.grayscale:
+            parts.append("gray")
+        if self.autocontrast:
+            parts.append("contrast")
+        return "-".join(parts)
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    encode_ms: float
+
+    @property
+    def num_bytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+
+def prepare_for_upload(image: Image.Image, settings: EncodeSettings) -> Image.Image:
+    prepared = image.convert("L") if settings.grayscale else image.convert("RGB")
+
+    if settings.max_pixels and prepared.width * prepared.height > settings.max_pixels:
+        scale = math.sqrt(settings.max_pixels / (prepared.width * prepared.height))
+        size = (max(1, int(prepared.width * scale)), max(1, int(prepared.height * scale)))
+        prepared = prepared.resize(size, Image.Resampling.LANCZOS)
+
+    if settings.autocontrast:
+        prepared = ImageOps.autocontrast(prepared, cutoff=1)
+    return prepared
+
+
+def encode_for_vision(image: Image.Image, settings: EncodeSettings | None = None) -> EncodedImage:
+    settings = settings or EncodeSettings()
+    fmt = settings.format.upper()
+    if fmt not in MIME_TYPES:
+        raise ValueError(f"Unsupported vision image format '{settings.format}'")
+
+    started = perf_counter()
+    prepared = prepare_for_upload(image, settings)
+    buffer = BytesIO()
+    if fmt == "PNG":
+        prepared.save(buffer, format=fmt, optimize=False)
+    else:
+        prepared.save(buffer, format=fmt, quality=settings.quality)
+    encode_ms = (perf_counter() - started) * 1000
+
+    return EncodedImage(
+        data=buffer.getvalue(),
+        mime_type=MIME_TYPES[fmt],
+        width=prepared.width,
+        height=prepared.height,
+        encode_ms=encode_ms,
+    )
@@ -0,0 +1,28 @@
+from collections import deque
+from statistics import median
+
+
+class LatencyStats:
+    """Rolling window of per-call latencies in milliseconds."""
+
+    def __init__(self, window: int = 200):
+        self.calls = 0
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, latency_ms: float) -> None:
+        self.calls += 1
+        self._samples.append(latency_ms)
+
+    @property
+    def last_ms(self) -> float | None:
+        return self._samples[-1] if self._samples else None
+
+    def summary(self) -> dict[str, float | int | None]:
+        if not self._samples:
+            return {"calls": self.calls, "last_ms": None, "p50_ms": None, "max_ms": None}
+        return {
+            "calls": self.calls,
+            "last_ms": round(self._samples[-1], 1),
+            "p50_ms": round(median(self._samples), 1),
+            "max_ms": round(max(self._samples), 1),
+        }
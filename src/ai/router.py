@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Awaitable, Callable, TypeVar
+
+from ..log import debug, warning
+from .governor import CircuitOpenError, ThrottledError
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "ai/governor.py"
+Path: "src/ai/"
+
+Latency-aware model routing. Short, simple chat messages ("hi", "lol",
+"nice fit") go to a small, fast model; longer or question-like messages go
+to the large one. Every call updates an exponential moving average of that
+model's latency and error rate, and a model whose average degrades past the
+policy limits is skipped in favour of the next candidate until it has had
+`recovery_seconds` to recover. A failed call fails over to the next
+candidate straight away.
+
+Environment:
+- HEARTOPIA_ROUTER=0: always use the large chat model and the first vision model
+- HEARTOPIA_SMALL_MODEL / HEARTOPIA_LARGE_MODEL: chat models
+- HEARTOPIA_VISION_MODELS: comma-separated vision models, preferred first
+- HEARTOPIA_ROUTER_SMALL_CHARS: longest message sent to the small model (default 40)
+- HEARTOPIA_ROUTER_MAX_LATENCY_MS: average latency that marks a model degraded (default 4000)
+"""
+
+ROUTER_ENV = "HEARTOPIA_ROUTER"
+SMALL_MODEL_ENV = "HEARTOPIA_SMALL_MODEL"
+LARGE_MODEL_ENV = "HEARTOPIA_LARGE_MODEL"
+VISION_MODELS_ENV = "HEARTOPIA_VISION_MODELS"
+SMALL_CHARS_ENV = "HEARTOPIA_ROUTER_SMALL_CHARS"
+MAX_LATENCY_ENV = "HEARTOPIA_ROUTER_MAX_LATENCY_MS"
+
+SMALL_CHAT_MODEL = "llama-3.1-8b-instant"
+LARGE_CHAT_MODEL = "llama-3.3-70b-versatile"
+VISION_MODELS = ("meta-llama/llama-4-scout-17b-16e-instruct", "meta-llama/llama-4-maverick-17b-128e-instruct")
+
+QUESTION_PATTERN = re.compile(
+    r"\?|^\s*(what|why|how|when|where|who|which|can|could|would|should|do|does|did|is|are|will)\b",
+    re.IGNORECASE,
+)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RouterPolicy:
+    small_model: str = SMALL_CHAT_MODEL
+    large_model: str = LARGE_CHAT_MODEL
+    vision_models: tuple[str, ...] = VISION_MODELS
+    max_small_chars: int = 40
+    alpha: float = 0.2  # Weight of the newest call in the moving averages
+    max_latency_ms: float = 4000.0
+    max_error_rate: float = 0.5
+    min_samples: int = 3
+    recovery_seconds: float = 60.0
+    enabled: bool = True
+
+    @classmethod
+    def from_env(cls) -> "RouterPolicy":
+        vision = tuple(m.strip() for m in (os.getenv(VISION_MODELS_ENV) or "").split(",") if m.strip())
+        return cls(
+            small_model=os.getenv(SMALL_MODEL_ENV) or cls.small_model,
+            large_model=os.getenv(LARGE_MODEL_ENV) or cls.large_model,
+            vision_models=vision or cls.vision_models,
+            max_small_chars=int(os.getenv(SMALL_CHARS_ENV) or cls.max_small_chars),
+            max_latency_ms=float(os.getenv(MAX_LATENCY_ENV) or cls.max_latency_ms),
+            enabled=os.getenv(ROUTER_ENV) != "0",
+        )
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    at: float
+    kind: str  # "chat" or "vision"
+    model: str
+    reason: str
+
+
+class ModelHealth:
+    """Moving averages of one model's latency and error rate."""
+
+    __slots__ = ("latency_ms", "error_rate", "samples", "last_at")
+
+    def __init__(self):
+        self.latency_ms: float | None = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_at: float | None = None
+
+    def record(self, latency_ms: float | None, ok: bool, alpha: float, at: float) -> None:
+        self.samples += 1
+        self.last_at = at
+        self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and latency_ms is not None:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += alpha * (latency_ms - self.latency_ms)
+
+    def degraded(self, policy: RouterPolicy, now: float) -> bool:
+        if self.samples < policy.min_samples or self.last_at is None:
+            return False
+        if now - self.last_at >= policy.recovery_seconds:
+            return False  # Give it another try
+        slow = self.latency_ms is not None and self.latency_ms > policy.max_latency_ms
+        return slow or self.error_rate > policy.max_error_rate
+
+
+def is_simple_message(text: str, max_chars: int) -> bool:
+    text = text.strip()
+    return len(text) <= max_chars and not QUESTION_PATTERN.search(text)
+
+
+def latest_user_text(prompt: str, conversation_messages: list[dict[str, Any]] | None) -> str:
+    for message in reversed(conversation_messages or []):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return prompt
+
+
+class ModelRouter:
+    """
+    `chat_models` / `vision_models` return candidates in the order to try
+    them; `run` / `arun` call them with failover and record each outcome.
+    """
+
+    def __init__(self, policy: RouterPolicy | None = None, clock: Callable[[], float] = time.monotonic):
+        self.policy = policy or RouterPolicy()
+        self.clock = clock
+        self.health: dict[str, ModelHealth] = {}
+        self.decisions: deque[RouteDecision] = deque(maxlen=200)
+        self.counts: dict[str, int] = {}
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        return cls(RouterPolicy.from_env())
+
+    def _health(self, model: str) -> ModelHealth:
+        health = self.health.get(model)
+        if health is None:
+            health = self.health[model] = ModelHealth()
+        return health
+
+    def _order(self, kind: str, preferred: list[str], reason: str) -> list[str]:
+        now = self.clock()
+        with self._lock:
+            healthy = [m for m in preferred if not self._health(m).degraded(self.policy, now)]
+            candidates = healthy + [m for m in preferred if m not in healthy]
+            if candidates[0] != preferred[0]:
+                reason = f"{reason}; {preferred[0]} degraded"
+            self.decisions.append(RouteDecision(now, kind, candidates[0], reason))
+            self.counts[candidates[0]] = self.counts.get(candidates[0], 0) + 1
+        debug(f"Routing {kind} call to `{candidates[0]}` ({reason})")
+        return candidates
+
+    def chat_models(self, prompt: str, conversation_messages: list[dict[str, Any]] | None = None) -> list[str]:
+        policy = self.policy
+        if not policy.enabled:
+            return [policy.large_model]
+        text = latest_user_text(prompt, conversation_messages)
+        if is_simple_message(text, policy.max_small_chars):
+            return self._order("chat", [policy.small_model, policy.large_model], f"simple, {len(text)} chars")
+        reason = "question" if QUESTION_PATTERN.search(text) else f"long, {len(text)} chars"
+        return self._order("chat", [policy.large_model, policy.small_model], reason)
+
+    def vision_models(self) -> list[str]:
+        if not self.policy.enabled:
+            return [self.policy.vision_models[0]]
+        return self._order("vision", list(self.policy.vision_models), "vision")
+
+    def record(self, model: str, latency_ms: float | None, ok: bool) -> None:
+        with self._lock:
+            self._health(model).record(latency_ms, ok, self.policy.alpha, self.clock())
+
+    def fail_over(self, model: str, exc: Exception, remaining: int) -> bool:
+        """Record a failed call; True when the next candidate should be tried."""
+        if isinstance(exc, (CircuitOpenError, ThrottledError)):
+            # Refused by the governor before any call: skip it without touching its health.
+            if remaining:
+                debug(f"`{model}` unavailable ({exc}); trying the next model")
+            return bool(remaining)
+        self.record(model, None, ok=False)
+        if not remaining:
+            return False
+        self.failovers += 1
+        warning(f"`{model}` failed ({exc}); failing over")
+        return True
+
+    def run(self, models: list[str], call: Callable[[str], T]) -> T:
+        for index, model in enumerate(models):
+            started = perf_counter()
+            try:
+                result = call(model)
+            except Exception as exc:
+                if self.fail_over(model, exc, len(models) - index - 1):
+                    continue
+                raise
+            self.record(model, (perf_counter() - started) * 1000, ok=True)
+            return result
+        raise ValueError("No models to route to")
+
+    async def arun(self, models: list[str], call: Callable[[str], Awaitable[T]]) -> T:
+        for index, model in enumerate(models):
+            started = perf_counter()
+            try:
+                result = await call(model)
+            except Exception as exc:
+                if self.fail_over(model, exc, len(models) - index - 1):
+                    continue
+                raise
+            self.record(model, (perf_counter() - started) * 1000, ok=True)
+            return result
+        raise ValueError("No models to route to")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "routed": dict(self.counts),
+            "failovers": self.failovers,
+            "models": {
+                model: {
+                    "latency_ms": round(health.latency_ms, 1) if health.latency_ms is not None else None,
+                    "error_rate": round(health.error_rate, 3),
+                    "calls": health.samples,
+                }
+                for model, health in self.health.items()
+            },
+        }
@@ -0,0 +1,201 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: None
+Path: "src/ai/"
+
+Local stand-in for an OpenAI-compatible `/chat/completions` endpoint, so the
+bot can be run and benchmarked offline. Point the bot at it with:
+    HEARTOPIA_LLM_BASE_URL=http://127.0.0.1:8808/v1
+"""
+
+EMPTY_CHAT = {"chat_region_detected": False, "messages": []}
+
+
+class StubSettings:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_status: int = 500,
+        vision_payload: dict[str, Any] | None = None,
+        seed: int | None = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.vision_payload = vision_payload or EMPTY_CHAT
+        self.random = random.Random(seed)
+
+
+def _is_vision_request(messages: list[dict[str, Any]]) -> bool:
+    return any(isinstance(m.get("content"), list) for m in messages)
+
+
+def _stub_reply(messages: list[dict[str, Any]], settings: StubSettings) -> str:
+    if _is_vision_request(messages):
+        return json.dumps(settings.vision_payload)
+    last_user = next(
+        (m.get("content") for m in reversed(messages) if m.get("role") == "user" and isinstance(m.get("content"), str)),
+        "",
+    )
+    return f"stub reply to: {last_user}"[:60]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        settings = self.server.settings
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        with self.server.lock:
+            self.server.requests += 1
+            delay = settings.latency_ms + settings.random.uniform(0, settings.jitter_ms)
+            fail = settings.random.random() < settings.failure_rate
+        time.sleep(delay / 1000)
+
+        if fail:
+            self._send_json(settings.failure_status, {"error": {"message": "injected failure"}})
+            return
+
+        model = request.get("model", "stub")
+        content = _stub_reply(request.get("messages") or [], settings)
+        if request.get("stream"):
+            self._stream(model, content)
+            return
+
+        self._send_json(
+            200,
+            {
+                "id": f"stub-{self.server.requests}",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+                "usage": {
+                    "prompt_tokens": length // 4,
+                    "completion_tokens": max(1, len(content) // 4),
+                    "total_tokens": length // 4 + max(1, len(content) // 4),
+                },
+            },
+        )
+
+    def _stream(self, model: str, content: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(text: str) -> None:
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+        for start in range(0, len(content), 8):
+            delta = {"model": model, "choices": [{"index": 0, "delta": {"content": content[start:start + 8]}}]}
+            write_chunk(f"data: {json.dumps(delta)}\n\n")
+        write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: StubSettings | None = None):
+        super().__init__((host, port), StubHandler)
+        self.settings = settings or StubSettings()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for an OpenAI-compatible chat API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay added to every request.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra uniform random delay.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1).")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status used for injected failures.")
+    parser.add_argument("--vision-file", help="JSON file returned as the answer to image requests.")
+    args = parser.parse_args()
+
+    vision_payload = None
+    if args.vision_file:
+        with open(args.vision_file, "r", encoding="utf-8") as f:
+            vision_payload = json.load(f)
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        vision_payload=vision_payload,
+    )
+    server = StubServer(args.host, args.port, settings)
+    print(f"Stub LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
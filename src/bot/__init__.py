@@ -0,0 +1,42 @@
+from .loop import (
+    PERSONA_CONTEXT,
+    BotState,
+    claim_message,
+    claim_streamed_message,
+    conversation_for,
+    extract_reply,
+    generate_reply,
+    open_reply_stream,
+    remember_packets,
+    remember_reply,
+    run_cycle,
+    run_serial,
+    select_new_messages,
+    start_reply,
+)
+from .pipeline import BotPipeline, run_pipeline
+from .reply_cache import ReplyCache
+from .scheduler import PollDecision, PollScheduler, SchedulerConfig
+
+__all__ = [
+    "PERSONA_CONTEXT",
+    "BotState",
+    "BotPipeline",
+    "claim_message",
+    "claim_streamed_message",
+    "conversation_for",
+    "extract_reply",
+    "generate_reply",
+    "open_reply_stream",
+    "PollDecision",
+    "PollScheduler",
+    "remember_packets",
+    "remember_reply",
+    "ReplyCache",
+    "run_cycle",
+    "run_pipeline",
+    "run_serial",
+    "SchedulerConfig",
+    "select_new_messages",
+    "start_reply",
+]
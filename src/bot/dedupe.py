@@ -0,0 +1,264 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator, MutableSet
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable
+
+from ..chat.similarity import (
+    allowed_edits,
+    bounded_edit_distance,
+    fuzzy_form,
+    min_shared_shingles,
+    shingles,
+    substring_edit_distance,
+    tokens_compatible,
+)
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "chat/similarity.py"
+Path: "src/bot/"
+
+Bounded set used for the bot's dedupe state. Entries live in insertion /
+last-seen order, so both evictions only ever look at the oldest entry:
+- LRU: adding past `capacity` drops the least recently seen key,
+- TTL: keys not seen for `ttl` seconds are dropped on the next access.
+A lookup that hits refreshes the key, so a message that stays on screen
+never expires. Times are wall-clock so snapshots stay valid across restarts.
+"""
+
+SNAPSHOT_VERSION = 1
+
+
+class DedupeStore(MutableSet):
+    def __init__(
+        self,
+        capacity: int = 5000,
+        ttl: float | None = 6 * 60 * 60,
+        clock: Callable[[], float] = time.time,
+    ):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[Hashable, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+        self.dirty = False
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is None:
+            return
+        cutoff = now - self.ttl
+        entries = self._entries
+        while entries:
+            key, seen = next(iter(entries.items()))
+            if seen > cutoff:
+                break
+            del entries[key]
+            self._forget(key)
+            self.ttl_evictions += 1
+            self.dirty = True
+
+    def __contains__(self, key: object) -> bool:
+        now = self.clock()
+        self._expire(now)
+        if key not in self._entries:
+            self.misses += 1
+            return False
+        self.hits += 1
+        self._touch(key, now)
+        return True
+
+    def _touch(self, key: Hashable, now: float) -> None:
+        self._entries[key] = now
+        self._entries.move_to_end(key)
+
+    def _remember(self, key: Hashable) -> None:
+        """Hook for subclasses that index keys; called when a new key is added."""
+
+    def _forget(self, key: Hashable) -> None:
+        """Hook for subclasses that index keys; called when a key is removed."""
+
+    def __iter__(self) -> Iterator[Hashable]:
+        self._expire(self.clock())
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        self._expire(self.clock())
+        return len(self._entries)
+
+    def add(self, key: Hashable) -> None:
+        now = self.clock()
+        self._expire(now)
+        if key not in self._entries:
+            self._remember(key)
+        self._touch(key, now)
+        self.dirty = True
+        while len(self._entries) > self.capacity:
+            evicted, _ = self._entries.popitem(last=False)
+            self._forget(evicted)
+            self.lru_evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        if self._entries.pop(key, None) is not None:
+            self._forget(key)
+            self.dirty = True
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_evictions": self.lru_evictions,
+            "ttl_evictions": self.ttl_evictions,
+        }
+
+    def to_snapshot(self) -> list[list[Any]]:
+        # JSON has no tuples; keys are stored as lists and restored as tuples.
+        return [[list(key) if isinstance(key, tuple) else key, seen] for key, seen in self._entries.items()]
+
+    def load_snapshot(self, entries: list[list[Any]]) -> None:
+        for key in list(self._entries):
+            self.discard(key)
+        for key, seen in sorted(entries, key=lambda entry: entry[1])[-self.capacity :]:
+            key = tuple(key) if isinstance(key, list) else key
+            if key not in self._entries:
+                self._remember(key)
+            self._entries[key] = seen
+        self._expire(self.clock())
+        self.dirty = False
+
+
+class FuzzyDedupeStore(DedupeStore):
+    """
+    `DedupeStore` that can also answer "seen something like this before?"
+    through `match`. Keys are strings or tuples of strings; in a tuple the
+    last item is the text and the others (e.g. the user) must match exactly.
+    Each key's q-grams are kept in an inverted index, so a lookup only
+    verifies keys that share enough q-grams with the query. The edit budget
+    comes from the text alone, and a fuzzy match never bridges different
+    digits or short words.
+
+    With `containment`, a query also matches when it is (nearly) a substring
+    of one of the `containment_window` most recently seen keys (all keys
+    when None), e.g. one wrapped chat bubble of a longer sent reply. Queries
+    shorter than `min_containment_chars` must match a whole key.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 5000,
+        ttl: float | None = 6 * 60 * 60,
+        clock: Callable[[], float] = time.time,
+        containment: bool = False,
+        min_containment_chars: int = 8,
+        containment_window: int | None = None,
+    ):
+        super().__init__(capacity, ttl, clock)
+        self.containment = containment
+        self.min_containment_chars = min_containment_chars
+        self.containment_window = containment_window
+        self._forms: dict[Hashable, str] = {}
+        self._postings: dict[str, set[Hashable]] = {}
+        self.fuzzy_hits = 0
+
+    @staticmethod
+    def _split(key: Hashable) -> tuple[tuple, str]:
+        if isinstance(key, tuple):
+            return key[:-1], str(key[-1]) if key else ""
+        return (), str(key)
+
+    def _remember(self, key: Hashable) -> None:
+        form = fuzzy_form(self._split(key)[1])
+        self._forms[key] = form
+        for gram in shingles(form):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _forget(self, key: Hashable) -> None:
+        form = self._forms.pop(key, "")
+        for gram in shingles(form):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _recent(self) -> set[Hashable] | None:
+        if self.containment_window is None:
+            return None
+        return set(islice(reversed(self._entries), self.containment_window))
+
+    def match(self, key: Hashable) -> Hashable | None:
+        """The stored key equal or nearly equal to `key` (now refreshed), else None."""
+        if key in self:
+            return key
+        scope, text = self._split(key)
+        form = fuzzy_form(text)
+        grams = shingles(form)
+        if not grams:
+            return None
+        edits = allowed_edits(len(form))
+        contained = self.containment and len(form) >= self.min_containment_chars
+        if not edits and not contained:
+            return None
+
+        needed = max(1, min_shared_shingles(len(grams), edits))
+        shared: dict[Hashable, int] = {}
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        recent = self._recent() if contained else None
+        for candidate, count in sorted(shared.items(), key=lambda item: -item[1]):
+            if count < needed:
+                break
+            candidate_scope, candidate_text = self._split(candidate)
+            if candidate_scope != scope:
+                continue
+            stored = self._forms[candidate]
+            if bounded_edit_distance(form, stored, edits) <= edits:
+                matched = tokens_compatible(text, candidate_text)
+            elif contained and (recent is None or candidate in recent):
+                matched = substring_edit_distance(form, stored, edits) <= edits and tokens_compatible(
+                    text, candidate_text, contained=True
+                )
+            else:
+                matched = False
+            if matched:
+                self.fuzzy_hits += 1
+                self._touch(candidate, self.clock())
+                return candidate
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {**super().stats(), "fuzzy_hits": self.fuzzy_hits}
+
+
+def write_snapshot(path: str | Path, stores: dict[str, DedupeStore]) -> None:
+    """Write the stores to `path` atomically (temp file + rename)."""
+    path = Path(path)
+    data = {"version": SNAPSHOT_VERSION, "stores": {name: store.to_snapshot() for name, store in stores.items()}}
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    for store in stores.values():
+        store.dirty = False
+
+
+def read_snapshot(path: str | Path) -> dict[str, list[list[Any]]]:
+    """Stored entries by store name; empty when the file is missing or unreadable."""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        return {}
+    return data.get("stores") or {}
@@ -0,0 +1,389 @@
+import os
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import chain
+from pathlib import Path
+from time import sleep as wait
+from typing import Callable, Iterable, Iterator
+
+from ..ai.governor import Governor
+from ..chat.packets import packetize, split_packets
+from ..chat.memory import ConversationMemory
+from ..chat.models import ChatFrame, ChatMessage
+from ..chat.parsing import (
+    inbound_messages,
+    inbound_player_message,
+    normalize_text_for_history,
+    parse_chat_frame,
+)
+from ..heartopia.capture import CaptureExhausted
+from ..log import error, log, warning
+from .dedupe import DedupeStore, FuzzyDedupeStore, read_snapshot, write_snapshot
+from .scheduler import PollScheduler
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "ai/governor.py", "chat/models.py", "chat/parsing.py", "chat/memory.py", "bot/dedupe.py", "heartopia/capture.py"
+Path: "src/bot/"
+"""
+
+DEDUPE_FILE_ENV = "HEARTOPIA_DEDUPE_FILE"
+DEDUPE_TTL_ENV = "HEARTOPIA_DEDUPE_TTL"
+DEDUPE_SIZE_ENV = "HEARTOPIA_DEDUPE_SIZE"
+DEFAULT_DEDUPE_FILE = "dedupe_state.json"
+PROMPT_TOKENS_ENV = "HEARTOPIA_PROMPT_TOKENS"
+# Fewest own-reply keys a bubble may be a wrapped piece of: the last whole reply,
+# which is stored after its packets, and the one packet before it. The window
+# grows to cover every reply sent since the read before last.
+OWN_REPLY_WINDOW = 2
+
+PERSONA_CONTEXT = (
+    "Roleplay as a casual 15-year-old girl playing Heartopia; "
+    "reply in short (0–60 character) in-game chat style with light slang and occasional emojis, "
+    "no narration, no meta commentary, never mention being an AI, stay in character."
+)
+
+ReadChat = Callable[..., str | ChatFrame]  # With `stream_vision`, called as read_chat(on_message=...)
+Respond = Callable[..., dict]
+SendChat = Callable[[str], None]
+StreamRespond = Callable[..., Iterable[str]]
+SendPackets = Callable[[Iterable[str]], list[str]]
+
+
+class BotState:
+    """
+    Dedupe state shared by every loop mode. Both stores are bounded (LRU and
+    time-window eviction) and match near-duplicates, so a misread character
+    or a bubble wrapped differently from the sent reply is still recognized.
+    With a `snapshot_path` they are restored on start and written back at
+    most every `snapshot_interval` seconds. `memory` holds each player's
+    recent turns; prompts built from it stay within `token_budget`.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 5000,
+        ttl: float | None = 6 * 60 * 60,
+        snapshot_path: str | Path | None = None,
+        snapshot_interval: float = 60.0,
+        clock=time.time,
+        token_budget: int = 512,
+    ):
+        # Track only unique (user, text) player messages
+        self.player_context = FuzzyDedupeStore(capacity, ttl, clock)
+        # Track what the bot has sent (whole replies and packets) to avoid self-replies
+        self.ai_message_history = FuzzyDedupeStore(
+            capacity, ttl, clock, containment=True, containment_window=OWN_REPLY_WINDOW
+        )
+        # Own-reply keys stored since the read before last, and since the last read.
+        self._own_keys = [0, 0]
+        self.memory = ConversationMemory(token_budget)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self._last_snapshot = clock()
+        if self.snapshot_path is not None:
+            self.restore()
+
+    @classmethod
+    def from_env(cls) -> "BotState":
+        ttl = float(os.getenv(DEDUPE_TTL_ENV) or 6 * 60 * 60)
+        return cls(
+            capacity=int(os.getenv(DEDUPE_SIZE_ENV) or 5000),
+            ttl=ttl if ttl > 0 else None,
+            snapshot_path=os.getenv(DEDUPE_FILE_ENV, DEFAULT_DEDUPE_FILE) or None,
+            token_budget=int(os.getenv(PROMPT_TOKENS_ENV) or 512),
+        )
+
+    @property
+    def _stores(self) -> dict[str, DedupeStore]:
+        return {"player_context": self.player_context, "ai_message_history": self.ai_message_history}
+
+    def restore(self) -> None:
+        snapshot = read_snapshot(self.snapshot_path)
+        for name, store in self._stores.items():
+            store.load_snapshot(snapshot.get(name, []))
+        if snapshot:
+            log(f"Restored dedupe state from {self.snapshot_path}: {len(self.player_context)} player messages")
+
+    def save(self) -> None:
+        if self.snapshot_path is None:
+            return
+        try:
+            write_snapshot(self.snapshot_path, self._stores)
+        except OSError as e:
+            warning(f"Could not write dedupe snapshot to {self.snapshot_path}: {e}")
+        self._last_snapshot = self.clock()
+
+    def checkpoint(self) -> None:
+        """Snapshot if anything changed and `snapshot_interval` has passed."""
+        if self.snapshot_path is None or self.clock() - self._last_snapshot < self.snapshot_interval:
+            return
+        if any(store.dirty for store in self._stores.values()):
+            self.save()
+
+    def remember_own(self, texts: Iterable[str]) -> None:
+        """Store the bot's own sent `texts`, keeping them in the containment window."""
+        for text in dict.fromkeys(texts):  # A one-packet reply is a single key
+            if text:
+                self.ai_message_history.add(text)
+                self._own_keys[-1] += 1
+        self._size_own_window()
+
+    def end_read(self) -> None:
+        """A chat read finished; replies sent before the previous one leave the window."""
+        self._own_keys = [self._own_keys[-1], 0]
+        self._size_own_window()
+
+    def _size_own_window(self) -> None:
+        # Replies generated concurrently all land in one cycle, so a bubble may
+        # belong to any of them, not just the last.
+        self.ai_message_history.containment_window = max(OWN_REPLY_WINDOW, sum(self._own_keys))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {**{name: store.stats() for name, store in self._stores.items()}, "memory": self.memory.stats()}
+
+
+def claim_message(msg_obj: ChatMessage, state: BotState) -> bool:
+    """
+    Claim one inbound message for a reply, adding it to its player's
+    conversation memory. Returns False for the bot's own replies and for
+    messages already claimed, possibly as a slightly different read.
+    """
+    user = msg_obj.user
+    msg_text = msg_obj.message
+    if state.ai_message_history.match(normalize_text_for_history(msg_text)) is not None:
+        return False
+
+    # Use a tuple of (user, text) to avoid duplicates
+    msg_id = (user, msg_text)
+    if state.player_context.match(msg_id) is not None:
+        return False  # Already responded, possibly to a slightly different read of it
+
+    state.player_context.add(msg_id)
+    state.memory.add_user(user, msg_text)
+    log(f"New player message detected from {user}: {msg_text}")
+    return True
+
+
+def claim_streamed_message(message: ChatMessage | dict, state: BotState) -> ChatMessage | None:
+    """`claim_message` for one raw message decoded from a streaming vision read."""
+    msg_obj = inbound_player_message(message)
+    if msg_obj is None or not claim_message(msg_obj, state):
+        return None
+    return msg_obj
+
+
+def select_new_messages(raw_chat: str | ChatFrame, state: BotState) -> list[ChatMessage] | None:
+    """
+    Parse one vision read (a frame, or a JSON payload) and claim the inbound
+    messages not seen before. Returns the new messages, or None when no chat
+    was detected.
+    """
+    parsed_chat = parse_chat_frame(raw_chat)
+    if not parsed_chat.detected:
+        log("No chat region detected in OCR output; skipping this cycle.")
+        return None
+
+    new_messages = [msg_obj for msg_obj in inbound_messages(parsed_chat) if claim_message(msg_obj, state)]
+    state.end_read()
+    return new_messages
+
+
+def conversation_for(state: BotState, msg_obj: ChatMessage) -> list[dict[str, str]]:
+    """Token-budgeted conversation with the sender of `msg_obj`, ending with it."""
+    return state.memory.prompt_messages(msg_obj.user, until=msg_obj.message)
+
+
+def extract_reply(ai_response: dict) -> str:
+    return ai_response["choices"][0]["message"]["content"].strip()
+
+
+def generate_reply(respond: Respond, msg_obj: ChatMessage, role_messages: list[dict[str, str]]) -> str:
+    ai_response = respond(
+        msg_obj.message,
+        PERSONA_CONTEXT,
+        conversation_messages=role_messages,
+    )
+    return extract_reply(ai_response)
+
+
+def open_reply_stream(
+    stream_respond: StreamRespond, msg_obj: ChatMessage, role_messages: list[dict[str, str]]
+) -> Iterator[str]:
+    """
+    Start a streamed reply and block until its first packet is ready, so the
+    caller only takes over the UI once there is something to type.
+    """
+    packets = packetize(
+        stream_respond(
+            msg_obj.message,
+            PERSONA_CONTEXT,
+            conversation_messages=role_messages,
+        )
+    )
+    first = next(packets, None)
+    if first is None:
+        return iter(())
+    return chain([first], packets)
+
+
+def remember_packets(state: BotState, packets: Iterable[str], player: str | None = None) -> None:
+    packets = list(packets)
+    remember_reply(state, " ".join(packets), player, packets)
+
+
+def remember_reply(
+    state: BotState, reply_content: str, player: str | None = None, packets: list[str] | None = None
+) -> None:
+    # Each packet is its own chat bubble; the whole reply catches bubbles the
+    # game wrapped, as substrings of one of the last few sends.
+    normalized = normalize_text_for_history(reply_content)
+    if not normalized:
+        return
+    packets = split_packets(reply_content) if packets is None else packets
+    state.remember_own([*map(normalize_text_for_history, packets), normalized])
+    if player is not None:
+        state.memory.add_reply(player, reply_content)
+
+
+def start_reply(
+    state: BotState,
+    msg_obj: ChatMessage,
+    respond: Respond,
+    stream_respond: StreamRespond | None = None,
+    pool: Executor | None = None,
+) -> Future | partial:
+    """Reply job for `msg_obj`: already running on `pool` if given, else a call to make when sending."""
+    conversation = conversation_for(state, msg_obj)
+    if stream_respond is not None:
+        job = partial(open_reply_stream, stream_respond, msg_obj, conversation)
+    else:
+        job = partial(generate_reply, respond, msg_obj, conversation)
+    return pool.submit(job) if pool is not None else job
+
+
+def run_cycle(
+    raw_chat: str | ChatFrame | None,
+    respond: Respond,
+    send_chat: SendChat,
+    state: BotState,
+    stream_respond: StreamRespond | None = None,
+    send_packets: SendPackets | None = None,
+    pool: Executor | None = None,
+    started: list[tuple[ChatMessage, Future | partial]] | None = None,
+) -> list[str]:
+    """
+    Reply to every new message in one vision payload; returns the replies sent.
+    This is the body of `run_serial`, split out so replays can drive it directly.
+
+    With a `pool` and more than one new message, all replies are generated at
+    once on it; sends still go out one at a time in the order the messages
+    appeared in chat. `started` holds messages claimed from a streaming read
+    with their reply jobs; they are sent first. A `raw_chat` of None (the
+    read failed) sends only those.
+    """
+    started = list(started or ())
+    new_messages = (select_new_messages(raw_chat, state) if raw_chat is not None else None) or []
+    if not started and not new_messages:
+        state.checkpoint()
+        return []
+
+    streaming = stream_respond is not None and send_packets is not None
+    parallel = pool if len(started) + len(new_messages) > 1 else None
+    for msg_obj in new_messages:
+        started.append((msg_obj, start_reply(state, msg_obj, respond, stream_respond if streaming else None, parallel)))
+
+    replies = []
+    for msg_obj, job in started:
+        player = msg_obj.user
+        try:
+            reply = job.result() if isinstance(job, Future) else job()
+            if streaming:
+                sent = send_packets(reply)
+                remember_packets(state, sent, player)
+                reply_content = " ".join(sent)
+            else:
+                reply_content = reply
+                send_chat(reply_content)
+                remember_reply(state, reply_content, player)
+            log(f"Sent AI reply: {reply_content}")
+            replies.append(reply_content)
+        except Exception as e:
+            error(f"Failed to generate/send AI response: {e}")
+    state.checkpoint()
+    return replies
+
+
+def pacing_delay(delay: float, governor: Governor | None) -> float:
+    """`delay`, stretched to cover the time the governor's circuit breaker stays open."""
+    idle = governor.idle_seconds() if governor is not None else 0.0
+    if idle > delay:
+        warning(f"LLM API unhealthy; idling {idle:.0f}s before the next capture")
+        return idle
+    return delay
+
+
+def run_serial(
+    read_chat: ReadChat,
+    respond: Respond,
+    send_chat: SendChat,
+    state: BotState | None = None,
+    interval: float = 2.0,
+    max_cycles: int | None = None,
+    stream_respond: StreamRespond | None = None,
+    send_packets: SendPackets | None = None,
+    scheduler: PollScheduler | None = None,
+    reply_concurrency: int = 4,
+    governor: Governor | None = None,
+    stream_vision: bool = False,
+) -> BotState:
+    """
+    The original one-thing-at-a-time loop: capture, read, then reply to each
+    message. With `stream_respond` and `send_packets` the first packet of a
+    reply is typed while the rest is still being generated. A `scheduler`
+    replaces the fixed `interval` with an adaptive delay. Up to
+    `reply_concurrency` replies for one capture are generated at once. While
+    the `governor` reports the API as unhealthy the loop idles instead of
+    capturing. With `stream_vision`, `read_chat` is given an `on_message`
+    callback and each inbound message starts generating its reply as soon
+    as the vision model has read it. The loop stops once a replay capture
+    runs out of frames.
+    """
+    state = state or BotState()
+    if reply_concurrency > 1:
+        pool_context = ThreadPoolExecutor(max_workers=reply_concurrency, thread_name_prefix="heartopia-reply")
+    else:
+        pool_context = nullcontext(None)
+    reply_stream = stream_respond if send_packets is not None else None
+    cycles = 0
+    with pool_context as pool:
+        while max_cycles is None or cycles < max_cycles:
+            cycles += 1
+            wait(pacing_delay(scheduler.next_delay() if scheduler else interval, governor))
+            started: list[tuple[ChatMessage, Future | partial]] = []
+
+            def on_message(message: ChatMessage) -> None:
+                msg_obj = claim_streamed_message(message, state)
+                if msg_obj is not None:
+                    started.append((msg_obj, start_reply(state, msg_obj, respond, reply_stream, pool)))
+
+            try:
+                raw_chat = read_chat(on_message=on_message) if stream_vision else read_chat()
+            except CaptureExhausted as e:
+                log(f"Stopping: {e}")
+                if started:
+                    run_cycle(None, respond, send_chat, state, stream_respond, send_packets, pool, started)
+                break
+            except Exception as e:
+                error(f"Failed to read chat: {e}")
+                if started:
+                    # Replies already started for messages read before the failure still go out.
+                    run_cycle(None, respond, send_chat, state, stream_respond, send_packets, pool, started)
+                continue
+            replies = run_cycle(raw_chat, respond, send_chat, state, stream_respond, send_packets, pool, started)
+            if scheduler:
+                scheduler.observe(raw_chat, len(replies))
+    return state
@@ -0,0 +1,245 @@
+import asyncio
+import concurrent.futures
+from typing import Any, Callable
+
+from ..ai.governor import Governor
+from ..chat.models import ChatFrame, ChatMessage
+from ..heartopia.capture import CaptureExhausted
+from ..log import error, log
+from .loop import (
+    PERSONA_CONTEXT,
+    BotState,
+    Respond,
+    SendChat,
+    SendPackets,
+    StreamRespond,
+    claim_streamed_message,
+    conversation_for,
+    extract_reply,
+    generate_reply,
+    open_reply_stream,
+    pacing_delay,
+    remember_packets,
+    remember_reply,
+    select_new_messages,
+)
+from .scheduler import PollScheduler
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "ai/governor.py", "chat/models.py", "bot/loop.py", "heartopia/capture.py"
+Path: "src/bot/"
+"""
+
+CaptureFrame = Callable[[], Any]
+ReadFrame = Callable[..., str | ChatFrame]  # With `stream_vision`, called as read_frame(frame, on_message=...)
+
+_STOP = object()
+
+
+class BotPipeline:
+    """
+    Asyncio variant of the bot loop. Capture, vision parse, reply generation
+    and UI send run as separate stages joined by bounded queues, so the next
+    frame is captured and read while earlier replies are generated or typed.
+
+    The blocking stage callables run in worker threads. One lock keeps screen
+    capture and UI input from overlapping, since both drive the game window.
+    With `stream_respond` and `send_packets`, the generation stage waits only
+    for the first packet and the send stage types the rest as it streams in.
+    An async `respond` is awaited on the event loop instead of a thread.
+    A `scheduler` replaces the fixed capture `interval` with an adaptive delay.
+
+    Up to `reply_concurrency` replies are generated at once; the send stage
+    still types them one by one, in the order the messages were read.
+    While the `governor` reports the API as unhealthy, capture idles.
+    With `stream_vision`, `read_frame` gets an `on_message` callback and each
+    inbound message is queued for generation as soon as the vision model has
+    read it, before the rest of the panel. The pipeline drains and stops
+    once a replay capture runs out of frames.
+    """
+
+    def __init__(
+        self,
+        capture_frame: CaptureFrame,
+        read_frame: ReadFrame,
+        respond: Respond,
+        send_chat: SendChat,
+        state: BotState | None = None,
+        interval: float = 2.0,
+        queue_size: int = 4,
+        stream_respond: StreamRespond | None = None,
+        send_packets: SendPackets | None = None,
+        scheduler: PollScheduler | None = None,
+        reply_concurrency: int = 4,
+        governor: Governor | None = None,
+        stream_vision: bool = False,
+    ):
+        self.capture_frame = capture_frame
+        self.read_frame = read_frame
+        self.respond = respond
+        self.send_chat = send_chat
+        self.state = state or BotState()
+        self.interval = interval
+        self.queue_size = queue_size
+        self.stream_respond = stream_respond
+        self.send_packets = send_packets
+        self.scheduler = scheduler
+        self.reply_concurrency = max(1, reply_concurrency)
+        self.governor = governor
+        self.stream_vision = stream_vision
+
+    @property
+    def streaming(self) -> bool:
+        return self.stream_respond is not None and self.send_packets is not None
+
+    async def run(self, max_frames: int | None = None) -> BotState:
+        ui_lock = asyncio.Lock()
+        frames: asyncio.Queue = asyncio.Queue(maxsize=1)
+        requests: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        replies: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        await asyncio.gather(
+            self._capture_stage(ui_lock, frames, max_frames),
+            self._vision_stage(frames, requests),
+            self._generation_stage(requests, replies),
+            self._send_stage(ui_lock, replies),
+        )
+        return self.state
+
+    async def _capture_stage(self, ui_lock: asyncio.Lock, frames: asyncio.Queue, max_frames: int | None) -> None:
+        captured = 0
+        while max_frames is None or captured < max_frames:
+            delay = self.scheduler.next_delay() if self.scheduler else self.interval
+            await asyncio.sleep(pacing_delay(delay, self.governor))
+            try:
+                async with ui_lock:
+                    frame = await asyncio.to_thread(self.capture_frame)
+            except CaptureExhausted as e:
+                log(f"Stopping capture: {e}")
+                break
+            except Exception as e:
+                error(f"Failed to capture chat frame: {e}")
+                continue
+            captured += 1
+            await frames.put(frame)
+        await frames.put(_STOP)
+
+    async def _vision_stage(self, frames: asyncio.Queue, requests: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while (frame := await frames.get()) is not _STOP:
+            # Messages decoded mid-read are claimed and queued on the event loop,
+            # in the order the read thread hands them over.
+            streamed: list[concurrent.futures.Future] = []
+
+            def on_message(message: ChatMessage) -> None:
+                streamed.append(asyncio.run_coroutine_threadsafe(self._queue_streamed(message, requests), loop))
+
+            try:
+                if self.stream_vision:
+                    raw_chat = await asyncio.to_thread(self.read_frame, frame, on_message=on_message)
+                else:
+                    raw_chat = await asyncio.to_thread(self.read_frame, frame)
+            except Exception as e:
+                error(f"Failed to read chat frame: {e}")
+                raw_chat = None
+            early = sum([await asyncio.wrap_future(future) for future in streamed])
+            if raw_chat is None:
+                continue
+            new_messages = select_new_messages(raw_chat, self.state)
+            self.state.checkpoint()
+            if self.scheduler:
+                self.scheduler.observe(raw_chat, early + len(new_messages or ()))
+            for msg_obj in new_messages or ():
+                await requests.put(msg_obj)
+        await requests.put(_STOP)
+
+    async def _queue_streamed(self, message: ChatMessage, requests: asyncio.Queue) -> int:
+        msg_obj = claim_streamed_message(message, self.state)
+        if msg_obj is None:
+            return 0
+        await requests.put(msg_obj)
+        return 1
+
+    async def _generation_stage(self, requests: asyncio.Queue, replies: asyncio.Queue) -> None:
+        # Each request becomes a task right away and the task itself goes on the
+        # replies queue, so the send stage awaits them in arrival order while
+        # the semaphore keeps at most `reply_concurrency` model calls in flight.
+        slots = asyncio.Semaphore(self.reply_concurrency)
+        while (msg_obj := await requests.get()) is not _STOP:
+            conversation = conversation_for(self.state, msg_obj)
+            task = asyncio.create_task(self._generate(slots, msg_obj, conversation))
+            await replies.put((msg_obj.user, task))
+        await replies.put(_STOP)
+
+    async def _generate(
+        self, slots: asyncio.Semaphore, msg_obj: ChatMessage, conversation: list[dict[str, str]]
+    ) -> Any:
+        async with slots:
+            try:
+                if self.streaming:
+                    return await asyncio.to_thread(open_reply_stream, self.stream_respond, msg_obj, conversation)
+                if asyncio.iscoroutinefunction(self.respond):
+                    ai_response = await self.respond(
+                        msg_obj.message,
+                        PERSONA_CONTEXT,
+                        conversation_messages=conversation,
+                    )
+                    return extract_reply(ai_response)
+                return await asyncio.to_thread(generate_reply, self.respond, msg_obj, conversation)
+            except Exception as e:
+                error(f"Failed to generate AI response: {e}")
+                return None
+
+    async def _send_stage(self, ui_lock: asyncio.Lock, replies: asyncio.Queue) -> None:
+        while (item := await replies.get()) is not _STOP:
+            player, task = item
+            reply = await task
+            if reply is None:
+                continue
+            try:
+                async with ui_lock:
+                    if isinstance(reply, str):
+                        reply_content = reply
+                        await asyncio.to_thread(self.send_chat, reply_content)
+                        remember_reply(self.state, reply_content, player)
+                    else:
+                        sent = await asyncio.to_thread(self.send_packets, reply)
+                        remember_packets(self.state, sent, player)
+                        reply_content = " ".join(sent)
+            except Exception as e:
+                error(f"Failed to send AI response: {e}")
+                continue
+            log(f"Sent AI reply: {reply_content}")
+            self.state.checkpoint()
+
+
+def run_pipeline(
+    capture_frame: CaptureFrame,
+    read_frame: ReadFrame,
+    respond: Respond,
+    send_chat: SendChat,
+    interval: float = 2.0,
+    stream_respond: StreamRespond | None = None,
+    send_packets: SendPackets | None = None,
+    scheduler: PollScheduler | None = None,
+    state: BotState | None = None,
+    reply_concurrency: int = 4,
+    governor: Governor | None = None,
+    stream_vision: bool = False,
+) -> BotState:
+    pipeline = BotPipeline(
+        capture_frame,
+        read_frame,
+        respond,
+        send_chat,
+        state=state,
+        interval=interval,
+        stream_respond=stream_respond,
+        send_packets=send_packets,
+        scheduler=scheduler,
+        reply_concurrency=reply_concurrency,
+        governor=governor,
+        stream_vision=stream_vision,
+    )
+    return asyncio.run(pipeline.run())
@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator
+
+from ..ai.backends import ChatBackend
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "ai/backends.py"
+Path: "src/bot/"
+
+Session recorder for live runs. Every captured frame is saved under
+`frames/` and every vision call, LLM call and send is appended to
+`events.jsonl`, tagged with the cycle (capture) it belongs to:
+
+    {"cycle": 3, "stage": "capture", "t": 1700000000.1, "ms": 12.4, "frame": "frames/000003.png"}
+    {"cycle": 3, "stage": "vision", "t": ..., "ms": 820.0, "model": "...", "key": "...", "content": "{...}"}
+    {"cycle": 3, "stage": "llm", "t": ..., "ms": 410.2, "model": "...", "key": "...", "content": "hii"}
+    {"cycle": 3, "stage": "send", "t": ..., "ms": 300.5, "text": "hii"}
+
+Replies served by the reply cache are recorded as "llm" events with the
+model "reply_cache", so replay attributes each send to the right reply.
+
+`src/bot/replay.py` plays a session directory back offline.
+"""
+
+EVENTS_FILE = "events.jsonl"
+FRAMES_DIR = "frames"
+
+# Cycle of the frame currently being read; vision calls made inside a wrapped
+# reader are tagged with it even when the pipeline has captured newer frames.
+_reading_cycle: ContextVar[int | None] = ContextVar("reading_cycle", default=None)
+
+
+def message_key(messages: list[dict[str, Any]]) -> str:
+    """
+    Stable key for a chat request, used to match replayed calls to recorded
+    responses. Images are left out so re-encoded uploads still match.
+    """
+    stripped = [
+        {"role": m.get("role"), "content": m.get("content") if isinstance(m.get("content"), str) else "<image>"}
+        for m in messages
+    ]
+    return json.dumps(stripped, ensure_ascii=False, sort_keys=True)
+
+
+def is_vision_request(messages: list[dict[str, Any]]) -> bool:
+    return any(not isinstance(m.get("content"), str) for m in messages)
+
+
+class SessionRecorder:
+    """Wraps the loop's stage callables and writes what they saw to `root`."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        (self.root / FRAMES_DIR).mkdir(parents=True, exist_ok=True)
+        self._events = open(self.root / EVENTS_FILE, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._frame_cycles: dict[int, int] = {}
+        self.cycle = 0
+
+    def record(self, stage: str, started: float, elapsed_ms: float, cycle: int | None = None, **fields: Any) -> None:
+        event = {
+            "cycle": self.cycle if cycle is None else cycle,
+            "stage": stage,
+            "t": round(started, 6),
+            "ms": round(elapsed_ms, 3),
+            **fields,
+        }
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._events.write(line + "\n")
+            self._events.flush()
+
+    def current_cycle(self) -> int:
+        reading = _reading_cycle.get()
+        return self.cycle if reading is None else reading
+
+    def capture(self, capture_frame: Callable[[], Any]) -> Callable[[], Any]:
+        def recorded_capture():
+            started, t0 = time.time(), perf_counter()
+            frame = capture_frame()
+            elapsed_ms = (perf_counter() - t0) * 1000
+            with self._lock:
+                self.cycle += 1
+                cycle = self.cycle
+                self._frame_cycles[id(frame)] = cycle
+            name = f"{FRAMES_DIR}/{cycle:06d}.png"
+            frame.save(self.root / name, compress_level=1)
+            self.record("capture", started, elapsed_ms, cycle=cycle, frame=name)
+            return frame
+
+        return recorded_capture
+
+    def read(self, read_frame: Callable[..., str]) -> Callable[..., str]:
+        def recorded_read(frame, **kwargs):
+            with self._lock:
+                cycle = self._frame_cycles.pop(id(frame), None)
+            token = _reading_cycle.set(cycle)
+            try:
+                return read_frame(frame, **kwargs)
+            finally:
+                _reading_cycle.reset(token)
+
+        return recorded_read
+
+    def send(self, send_chat: Callable[[str], None]) -> Callable[[str], None]:
+        def recorded_send(message: str) -> None:
+            started, t0 = time.time(), perf_counter()
+            send_chat(message)
+            self.record("send", started, (perf_counter() - t0) * 1000, text=message)
+
+        return recorded_send
+
+    def send_packets(self, send_packets: Callable[[Iterable[str]], list[str]]) -> Callable[[Iterable[str]], list[str]]:
+        def recorded_send_packets(packets: Iterable[str]) -> list[str]:
+            started, t0 = time.time(), perf_counter()
+            sent = send_packets(packets)
+            self.record("send", started, (perf_counter() - t0) * 1000, text=" ".join(sent), packets=sent)
+            return sent
+
+        return recorded_send_packets
+
+    def cache_hit(self, prompt: str, context: str, conversation: list[dict[str, str]] | None, reply: str) -> None:
+        """`ReplyCache.on_hit`: a served reply is recorded as the LLM call it stood in for."""
+        from ..ai.groq import _build_chat_messages
+
+        self.record(
+            "llm",
+            time.time(),
+            0.0,
+            cycle=self.current_cycle(),
+            model="reply_cache",
+            key=message_key(_build_chat_messages(prompt, context, conversation)),
+            content=reply,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._events.close()
+
+
+class RecordingBackend(ChatBackend):
+    """Passes calls through to `inner` and records each request and response."""
+
+    name = "recording"
+
+    def __init__(self, inner: ChatBackend, recorder: SessionRecorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    @property
+    def config(self):
+        return self.inner.config
+
+    def _record(self, model: str, messages: list[dict[str, Any]], started: float, t0: float, content: str) -> None:
+        self.recorder.record(
+            "vision" if is_vision_request(messages) else "llm",
+            started,
+            (perf_counter() - t0) * 1000,
+            cycle=self.recorder.current_cycle(),
+            model=model,
+            key=message_key(messages),
+            content=content,
+        )
+
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        started, t0 = time.time(), perf_counter()
+        response = self.inner.complete(model, messages, **options)
+        self._record(model, messages, started, t0, response["choices"][0]["message"]["content"])
+        return response
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        started, t0 = time.time(), perf_counter()
+        deltas = []
+        for delta in self.inner.stream(model, messages, **options):
+            deltas.append(delta)
+            yield delta
+        self._record(model, messages, started, t0, "".join(deltas))
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        started, t0 = time.time(), perf_counter()
+        response = await self.inner.acomplete(model, messages, **options)
+        self._record(model, messages, started, t0, response["choices"][0]["message"]["content"])
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
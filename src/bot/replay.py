@@ -0,0 +1,378 @@
+import argparse
+import difflib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+from statistics import fmean, median, quantiles
+from time import perf_counter
+from typing import Any, Iterator
+
+from ..ai.backends import ChatBackend
+from .loop import BotState, remember_reply, run_cycle
+from .recording import EVENTS_FILE, is_vision_request, message_key
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "bot/loop.py", "bot/recording.py", "ai/groq.py"
+Path: "src/bot/"
+
+Offline replay of a session recorded with `SessionRecorder`. Recorded frames
+go through the real vision path (crop, change detection, side correction)
+and the real loop (parsing, dedupe, reply), but the model answers from the
+recording and sends go to a list, so a session runs as fast as the CPU allows.
+
+Run from the repo root:
+    python -m src.bot.replay recordings/session-1 [--processes 4]
+"""
+
+STAGES = ("capture", "vision", "parse", "generate", "send", "cycle")
+NO_CHAT_PAYLOAD = '{"chat_region_detected": false, "messages": []}'
+
+
+@dataclass
+class RecordedCycle:
+    index: int
+    frame: Path
+    vision: list[str] = field(default_factory=list)
+    replies: list[tuple[str, str]] = field(default_factory=list)  # (message_key, content)
+    sends: list[str] = field(default_factory=list)
+
+
+def load_session(root: str | Path) -> list[RecordedCycle]:
+    """Group a session's events by cycle, in capture order."""
+    root = Path(root)
+    cycles: dict[int, RecordedCycle] = {}
+    orphans: list[dict[str, Any]] = []
+    with open(root / EVENTS_FILE, encoding="utf-8") as events:
+        for line in events:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["stage"] == "capture":
+                cycles[event["cycle"]] = RecordedCycle(event["cycle"], root / event["frame"])
+            else:
+                orphans.append(event)
+
+    for event in orphans:
+        cycle = cycles.get(event["cycle"])
+        if cycle is None:
+            continue
+        if event["stage"] == "vision":
+            cycle.vision.append(event["content"])
+        elif event["stage"] == "llm":
+            cycle.replies.append((event["key"], event["content"]))
+        elif event["stage"] == "send":
+            cycle.sends.append(event["text"])
+    return [cycles[index] for index in sorted(cycles)]
+
+
+def _completion(content: str) -> dict:
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+
+
+class ReplayBackend(ChatBackend):
+    """
+    Answers from a recording. Vision calls get the responses recorded for the
+    current cycle; chat calls get the recorded reply to the same messages, or
+    the next unused one when the replayed prompt no longer matches.
+    """
+
+    name = "replay"
+
+    def __init__(self, cycles: list[RecordedCycle]):
+        self._contents = [content for cycle in cycles for _, content in cycle.replies]
+        self._by_key: dict[str, deque[int]] = {}
+        keys = (key for cycle in cycles for key, _ in cycle.replies)
+        for position, key in enumerate(keys):
+            self._by_key.setdefault(key, deque()).append(position)
+        self._used: set[int] = set()
+        self._cursor = 0
+        self._vision: deque[str] = deque()
+        self._last_vision = NO_CHAT_PAYLOAD
+        self.vision_misses = 0
+        self.reply_misses = 0
+
+    def begin_cycle(self, cycle: RecordedCycle) -> None:
+        self._vision = deque(cycle.vision)
+
+    def complete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        if is_vision_request(messages):
+            if self._vision:
+                self._last_vision = self._vision.popleft()
+            else:
+                # The live run skipped this read (or made it in another cycle).
+                self.vision_misses += 1
+            return _completion(self._last_vision)
+
+        position = self._claim(self._by_key.get(message_key(messages)))
+        if position is None:
+            self.reply_misses += 1
+            position = self._next_unused()
+        return _completion("(no recorded reply)" if position is None else self._contents[position])
+
+    def _claim(self, positions: deque[int] | None) -> int | None:
+        while positions:
+            position = positions.popleft()
+            if position not in self._used:
+                self._used.add(position)
+                return position
+        return None
+
+    def _next_unused(self) -> int | None:
+        while self._cursor < len(self._contents):
+            position = self._cursor
+            self._cursor += 1
+            if position not in self._used:
+                self._used.add(position)
+                return position
+        return None
+
+    def stream(self, model: str, messages: list[dict[str, Any]], **options: Any) -> Iterator[str]:
+        yield self.complete(model, messages, **options)["choices"][0]["message"]["content"]
+
+    async def acomplete(self, model: str, messages: list[dict[str, Any]], **options: Any) -> dict:
+        return self.complete(model, messages, **options)
+
+
+@dataclass
+class ReplayReport:
+    cycles: int = 0
+    elapsed_s: float = 0.0
+    stage_ms: dict[str, list[float]] = field(default_factory=lambda: {stage: [] for stage in STAGES})
+    replies: list[str] = field(default_factory=list)
+    recorded_replies: list[str] = field(default_factory=list)
+    vision_misses: int = 0
+    reply_misses: int = 0
+    processes: int = 1
+
+    @property
+    def throughput(self) -> float:
+        """Cycles per second of wall time."""
+        return self.cycles / self.elapsed_s if self.elapsed_s else 0.0
+
+    def stage_summary(self) -> dict[str, dict[str, float | int]]:
+        summary = {}
+        for stage, samples in self.stage_ms.items():
+            if not samples:
+                summary[stage] = {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "total_ms": 0.0}
+                continue
+            p95 = quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+            summary[stage] = {
+                "count": len(samples),
+                "mean_ms": round(fmean(samples), 3),
+                "p50_ms": round(median(samples), 3),
+                "p95_ms": round(p95, 3),
+                "total_ms": round(sum(samples), 3),
+            }
+        return summary
+
+    def reply_diff(self) -> list[str]:
+        """Unified diff of sent replies, recorded vs replayed; empty when they match."""
+        return list(
+            difflib.unified_diff(self.recorded_replies, self.replies, "recorded", "replayed", lineterm="")
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "cycles": self.cycles,
+            "processes": self.processes,
+            "elapsed_s": round(self.elapsed_s, 4),
+            "cycles_per_s": round(self.throughput, 2),
+            "stages": self.stage_summary(),
+            "replies": len(self.replies),
+            "recorded_replies": len(self.recorded_replies),
+            "vision_misses": self.vision_misses,
+            "reply_misses": self.reply_misses,
+            "reply_diff": self.reply_diff(),
+        }
+
+    @classmethod
+    def merge(cls, reports: list["ReplayReport"], elapsed_s: float) -> "ReplayReport":
+        merged = cls(elapsed_s=elapsed_s, processes=len(reports))
+        for report in reports:
+            merged.cycles += report.cycles
+            for stage, samples in report.stage_ms.items():
+                merged.stage_ms.setdefault(stage, []).extend(samples)
+            merged.replies.extend(report.replies)
+            merged.recorded_replies.extend(report.recorded_replies)
+            merged.vision_misses += report.vision_misses
+            merged.reply_misses += report.reply_misses
+        return merged
+
+
+class _Timed:
+    """Wraps a stage callable and adds its run time to `ms`."""
+
+    def __init__(self, func):
+        self.func = func
+        self.ms = 0.0
+
+    def __call__(self, *args, **kwargs):
+        t0 = perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.ms += (perf_counter() - t0) * 1000
+
+
+def _warmup_respond(prompt, context, conversation_messages=None) -> dict:
+    return _completion("")
+
+
+def _discard(message: str) -> None:
+    pass
+
+
+def _load_frame(path: Path):
+    from PIL import Image
+
+    with Image.open(path) as frame:
+        return frame.convert("RGB")
+
+
+def replay_session(
+    root: str | Path,
+    start: int = 0,
+    stop: int | None = None,
+    warmup: int = 0,
+    use_history: bool = True,
+) -> ReplayReport:
+    """
+    Replay cycles `start:stop` of a recorded session in this process. The
+    `warmup` cycles before `start` are run to rebuild dedupe and frame history
+    but are left out of the report; they do not reply, and the bot's own
+    earlier sends are taken from the recording instead.
+    """
+    from ..ai import groq
+
+    cycles = load_session(root)
+    first = max(0, start - warmup)
+    selected = cycles[first:stop]
+    backend = ReplayBackend(cycles[start:stop])
+    previous_backend = groq._backend
+    groq.set_backend(backend)
+    groq.reset_vision_history()
+
+    state = BotState()
+    for cycle in cycles[:start]:
+        for text in cycle.sends:
+            remember_reply(state, text)
+    sent: list[str] = []
+    report = ReplayReport()
+    warmup_misses = 0
+    try:
+        for position, cycle in enumerate(selected, start=first):
+            respond = _Timed(groq.getResponse)
+            send = _Timed(sent.append)
+
+            t0 = perf_counter()
+            frame = _load_frame(cycle.frame)
+            t1 = perf_counter()
+            backend.begin_cycle(cycle)
+            raw_chat = groq.read_chat_frame(frame, use_history=use_history)
+            t2 = perf_counter()
+            if position < start:
+                run_cycle(raw_chat, _warmup_respond, _discard, state)
+                warmup_misses = backend.vision_misses
+                continue
+            replies = run_cycle(raw_chat, respond, send, state)
+            t3 = perf_counter()
+
+            report.cycles += 1
+            report.elapsed_s += t3 - t0
+            report.replies.extend(replies)
+            report.recorded_replies.extend(cycle.sends)
+            stage_ms = report.stage_ms
+            stage_ms["capture"].append((t1 - t0) * 1000)
+            stage_ms["vision"].append((t2 - t1) * 1000)
+            stage_ms["parse"].append((t3 - t2) * 1000 - respond.ms - send.ms)
+            stage_ms["generate"].append(respond.ms)
+            stage_ms["send"].append(send.ms)
+            stage_ms["cycle"].append((t3 - t0) * 1000)
+    finally:
+        groq.set_backend(previous_backend)
+        groq.reset_vision_history()
+
+    report.vision_misses = backend.vision_misses - warmup_misses
+    report.reply_misses = backend.reply_misses
+    return report
+
+
+def _replay_chunk(args: tuple[str, int, int, int, bool]) -> ReplayReport:
+    from ..log import WARNING, configure
+
+    configure(level=WARNING)
+    root, start, stop, warmup, use_history = args
+    return replay_session(root, start, stop, warmup, use_history)
+
+
+def replay_parallel(
+    root: str | Path,
+    processes: int | None = None,
+    warmup: int = 5,
+    use_history: bool = True,
+) -> ReplayReport:
+    """
+    Split a long session into one contiguous chunk per process. Each chunk
+    first replays `warmup` earlier cycles so dedupe state is close to what a
+    single run would have at that point.
+    """
+    total = len(load_session(root))
+    processes = max(1, min(processes or os.cpu_count() or 1, total))
+    bounds = [round(total * i / processes) for i in range(processes + 1)]
+    chunks = [(str(root), bounds[i], bounds[i + 1], warmup, use_history) for i in range(processes)]
+
+    t0 = perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+        reports = list(pool.map(_replay_chunk, chunks))
+    return ReplayReport.merge(reports, perf_counter() - t0)
+
+
+def format_report(report: ReplayReport) -> str:
+    lines = [
+        f"{report.cycles} cycles in {report.elapsed_s:.3f}s "
+        f"({report.throughput:.1f} cycles/s, {report.processes} process(es))",
+        f"replies: {len(report.replies)} replayed / {len(report.recorded_replies)} recorded; "
+        f"vision misses: {report.vision_misses}; reply misses: {report.reply_misses}",
+        f"{'stage':<10}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'total ms':>11}",
+    ]
+    for stage, stats in report.stage_summary().items():
+        lines.append(
+            f"{stage:<10}{stats['count']:>7}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}"
+            f"{stats['p95_ms']:>10.3f}{stats['total_ms']:>11.1f}"
+        )
+    diff = report.reply_diff()
+    lines.append("reply diff: none" if not diff else "reply diff:")
+    lines.extend(diff)
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded Heartopia session offline")
+    parser.add_argument("session", help="Session directory written by `main.py --record`.")
+    parser.add_argument("--processes", type=int, default=1, help="Split the session across this many processes.")
+    parser.add_argument("--warmup", type=int, default=5, help="Cycles replayed before each chunk to rebuild state.")
+    parser.add_argument("--no-history", action="store_true", help="Do a full vision read of every frame.")
+    parser.add_argument("--json", help="Also write the report as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    from ..log import WARNING, configure
+
+    configure(level=WARNING)
+    if args.processes > 1:
+        report = replay_parallel(args.session, args.processes, args.warmup, not args.no_history)
+    else:
+        report = replay_session(args.session, use_history=not args.no_history)
+
+    print(format_report(report))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report.to_dict(), indent=2), encoding="utf-8")
+    return 1 if report.reply_diff() else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
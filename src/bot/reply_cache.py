@@ -0,0 +1,253 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from ..ai.router import QUESTION_PATTERN
+from ..chat.similarity import fuzzy_form
+from ..log import debug, log, warning
+from .loop import PERSONA_CONTEXT, Respond, StreamRespond, extract_reply
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "ai/router.py", "chat/similarity.py", "bot/loop.py"
+Path: "src/bot/"
+
+Reply cache for short, high-frequency messages ("hi", "lol", "wyd", ...).
+Keys are the message in fuzzy form with stretched letters collapsed ("hiii"
+-> "hi", while "good" and "god" stay apart) plus a coarse context signature.
+A player's first message in memory shares pools with every other player's;
+later messages are pooled per player, and questions in an ongoing
+conversation are not cached at all, since their answer depends on it.
+
+Each key keeps a pool of up to `pool_size` different replies. Until the pool
+is full every request goes to the model and its reply joins the pool; after
+that replies are served from the pool, never the same one twice in a row.
+`on_hit` is called with (prompt, context, conversation, reply) for every
+reply served from a pool, e.g. to record it.
+
+Environment:
+- HEARTOPIA_REPLY_CACHE=0: disable the cache
+- HEARTOPIA_REPLY_CACHE_TTL: seconds a pool is kept (default 1800)
+- HEARTOPIA_REPLY_CACHE_PREWARM: JSON file of {"message": ["reply", ...]} loaded at startup
+"""
+
+CACHE_ENV = "HEARTOPIA_REPLY_CACHE"
+TTL_ENV = "HEARTOPIA_REPLY_CACHE_TTL"
+PREWARM_ENV = "HEARTOPIA_REPLY_CACHE_PREWARM"
+
+COMMON_OPENERS = ("hi", "hey", "hello", "lol", "wyd", "ty", "brb", "gn")
+REPEATED_CHARS = re.compile(r"(.)\1{2,}")  # Three or more; doubled letters are spelling
+
+
+def cache_text(message: str) -> str:
+    return REPEATED_CHARS.sub(r"\1", fuzzy_form(message))
+
+
+def context_signature(conversation: list[dict[str, str]] | None) -> str:
+    user_turns = sum(1 for m in conversation or () if m.get("role") == "user")
+    return "opener" if user_turns <= 1 else f"ongoing:{_sender_name(conversation)}"
+
+
+def _sender_name(conversation: list[dict[str, str]] | None) -> str:
+    for message in reversed(conversation or []):
+        if message.get("role") == "user":
+            return message.get("name", "")
+    return ""
+
+
+def _completion(content: str) -> dict:
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+
+
+class _Pool:
+    __slots__ = ("created", "replies", "last")
+
+    def __init__(self, created: float):
+        self.created = created
+        self.replies: list[str] = []
+        self.last: str | None = None
+
+
+class ReplyCache:
+    def __init__(
+        self,
+        capacity: int = 256,
+        ttl: float = 30 * 60,
+        pool_size: int = 3,
+        max_chars: int = 12,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random | None = None,
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.pool_size = pool_size
+        self.max_chars = max_chars
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._pools: OrderedDict[tuple[str, str], _Pool] = OrderedDict()
+        self._lock = threading.Lock()  # Replies for one capture may be generated on several threads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.on_hit: Callable[[str, str, list[dict[str, str]] | None, str], None] | None = None
+
+    @classmethod
+    def from_env(cls) -> "ReplyCache | None":
+        if os.getenv(CACHE_ENV) == "0":
+            return None
+        cache = cls(ttl=float(os.getenv(TTL_ENV) or 30 * 60))
+        prewarm_path = os.getenv(PREWARM_ENV)
+        if prewarm_path:
+            cache.load(prewarm_path)
+        return cache
+
+    def key(self, message: str, conversation: list[dict[str, str]] | None = None) -> tuple[str, str] | None:
+        """Cache key for `message`, or None when it is too long to be worth caching."""
+        text = cache_text(message)
+        if not text or len(text) > self.max_chars:
+            return None
+        signature = context_signature(conversation)
+        if signature != "opener" and QUESTION_PATTERN.search(message):
+            return None  # "wdym" mid-conversation depends on what was said
+        return text, signature
+
+    def _pool(self, key: tuple[str, str], create: bool = False) -> _Pool | None:
+        now = self.clock()
+        pool = self._pools.get(key)
+        if pool is not None and now - pool.created > self.ttl:
+            del self._pools[key]
+            self.evictions += 1
+            pool = None
+        if pool is None and create:
+            pool = self._pools[key] = _Pool(now)
+            while len(self._pools) > self.capacity:
+                self._pools.popitem(last=False)
+                self.evictions += 1
+        if pool is not None:
+            self._pools.move_to_end(key)
+        return pool
+
+    def get(self, message: str, conversation: list[dict[str, str]] | None = None) -> str | None:
+        key = self.key(message, conversation)
+        if key is None:
+            return None
+        with self._lock:
+            pool = self._pool(key)
+            if pool is None or len(pool.replies) < self.pool_size:
+                self.misses += 1
+                return None
+            choices = [reply for reply in pool.replies if reply != pool.last] or pool.replies
+            pool.last = self.rng.choice(choices)
+            self.hits += 1
+            return pool.last
+
+    def put(self, message: str, reply: str, conversation: list[dict[str, str]] | None = None) -> None:
+        key = self.key(message, conversation)
+        reply = reply.strip()
+        if key is None or not reply:
+            return
+        name = _sender_name(conversation)
+        if name and name.casefold() in reply.casefold():
+            return  # Addressed to this player; would be wrong for anyone else
+        with self._lock:
+            pool = self._pool(key, create=True)
+            if reply not in pool.replies and len(pool.replies) < self.pool_size:
+                pool.replies.append(reply)
+            pool.last = reply
+
+    def prewarm(self, respond: Respond, messages: Iterable[str] = COMMON_OPENERS) -> int:
+        """Fill the opener pools by asking the model; returns how many replies were cached."""
+        added = 0
+        for message in messages:
+            conversation = [{"role": "user", "content": message}]
+            for _ in range(self.pool_size):
+                try:
+                    reply = extract_reply(respond(message, PERSONA_CONTEXT, conversation_messages=conversation))
+                except Exception as e:
+                    warning(f"Reply cache pre-warm failed for {message!r}: {e}")
+                    return added
+                self.put(message, reply, conversation)
+                added += 1
+        return added
+
+    def load(self, path: str | Path) -> int:
+        """Pre-warm opener pools from a JSON file of {"message": ["reply", ...]}."""
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            warning(f"Could not load reply cache pre-warm file {path}: {e}")
+            return 0
+        added = 0
+        for message, replies in data.items():
+            conversation = [{"role": "user", "content": message}]
+            for reply in replies:
+                self.put(message, reply, conversation)
+                added += 1
+        log(f"Pre-warmed reply cache with {added} replies from {path}")
+        return added
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "size": len(self._pools),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "evictions": self.evictions,
+        }
+
+    def _served(self, prompt: str, context: str, conversation: list[dict[str, str]] | None, reply: str) -> None:
+        debug(f"Reply cache hit for {prompt!r}")
+        if self.on_hit is not None:
+            self.on_hit(prompt, context, conversation, reply)
+
+    def wrap(self, respond: Respond) -> Respond:
+        def cached_respond(prompt: str, context: str, conversation_messages: list[dict[str, str]] | None = None):
+            reply = self.get(prompt, conversation_messages)
+            if reply is not None:
+                self._served(prompt, context, conversation_messages, reply)
+                return _completion(reply)
+            response = respond(prompt, context, conversation_messages=conversation_messages)
+            self.put(prompt, extract_reply(response), conversation_messages)
+            return response
+
+        return cached_respond
+
+    def wrap_async(self, respond: Callable[..., Any]) -> Callable[..., Any]:
+        async def cached_respond(prompt: str, context: str, conversation_messages: list[dict[str, str]] | None = None):
+            reply = self.get(prompt, conversation_messages)
+            if reply is not None:
+                self._served(prompt, context, conversation_messages, reply)
+                return _completion(reply)
+            response = await respond(prompt, context, conversation_messages=conversation_messages)
+            self.put(prompt, extract_reply(response), conversation_messages)
+            return response
+
+        return cached_respond
+
+    def wrap_stream(self, stream_respond: StreamRespond) -> StreamRespond:
+        def cached_stream(
+            prompt: str, context: str, conversation_messages: list[dict[str, str]] | None = None
+        ) -> Iterator[str]:
+            reply = self.get(prompt, conversation_messages)
+            if reply is not None:
+                self._served(prompt, context, conversation_messages, reply)
+                yield reply
+                return
+            deltas = []
+            for delta in stream_respond(prompt, context, conversation_messages=conversation_messages):
+                deltas.append(delta)
+                yield delta
+            self.put(prompt, "".join(deltas), conversation_messages)
+
+        return cached_stream
@@ -0,0 +1,133 @@
+import os
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable
+
+from ..chat.models import ChatFrame
+from ..log import debug
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "chat/models.py"
+Path: "src/bot/"
+
+Adaptive delay between chat polls. While a conversation is active the bot
+polls at the latency target (minus the time a cycle itself takes); once the
+chat has been quiet for `active_window` seconds the delay doubles on every
+idle poll up to `max_interval`. A sliding one-minute window caps how many
+polls, and so vision calls, can happen per minute.
+
+Environment:
+- HEARTOPIA_POLL_TARGET: seconds from a message appearing to it being read (default 1.0)
+- HEARTOPIA_POLL_MAX: longest idle delay in seconds (default 16)
+- HEARTOPIA_VISION_PER_MINUTE: poll / vision call cap (default 40)
+"""
+
+TARGET_ENV = "HEARTOPIA_POLL_TARGET"
+MAX_ENV = "HEARTOPIA_POLL_MAX"
+RATE_ENV = "HEARTOPIA_VISION_PER_MINUTE"
+
+RATE_WINDOW = 60.0
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    latency_target: float = 1.0
+    min_interval: float = 0.25
+    max_interval: float = 16.0
+    backoff: float = 2.0
+    active_window: float = 15.0
+    max_vision_per_minute: int = 40
+
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        return cls(
+            latency_target=float(os.getenv(TARGET_ENV) or cls.latency_target),
+            max_interval=float(os.getenv(MAX_ENV) or cls.max_interval),
+            max_vision_per_minute=int(os.getenv(RATE_ENV) or cls.max_vision_per_minute),
+        )
+
+
+@dataclass(frozen=True)
+class PollDecision:
+    at: float
+    delay: float
+    reason: str  # "active", "idle" or "throttled"
+
+
+class PollScheduler:
+    """
+    Call `next_delay()` before each capture and `observe()` with what the
+    capture produced. Every poll counts against the vision cap, since any
+    poll may need a vision call.
+    """
+
+    def __init__(self, config: SchedulerConfig | None = None, clock: Callable[[], float] = monotonic):
+        self.config = config or SchedulerConfig()
+        self.clock = clock
+        self._last_activity: float | None = None
+        self._last_payload: str | ChatFrame | None = None
+        self._idle_delay = self.config.latency_target
+        self._poll_at: float | None = None
+        self._polls: deque[float] = deque()
+        self._cycle_seconds = 0.0
+        self.decisions: deque[PollDecision] = deque(maxlen=200)
+        self.counts = {"active": 0, "idle": 0, "throttled": 0}
+
+    def is_active(self, now: float | None = None) -> bool:
+        if self._last_activity is None:
+            return False
+        now = self.clock() if now is None else now
+        return now - self._last_activity < self.config.active_window
+
+    def next_delay(self) -> float:
+        config = self.config
+        now = self.clock()
+        if self.is_active(now):
+            delay, reason = config.latency_target - self._cycle_seconds, "active"
+        else:
+            delay, reason = self._idle_delay, "idle"
+        delay = min(max(delay, config.min_interval), config.max_interval)
+
+        while self._polls and self._polls[0] <= now + delay - RATE_WINDOW:
+            self._polls.popleft()
+        if len(self._polls) >= config.max_vision_per_minute:
+            allowed_at = self._polls[len(self._polls) - config.max_vision_per_minute] + RATE_WINDOW
+            if allowed_at - now > delay:
+                delay, reason = allowed_at - now, "throttled"
+
+        self._poll_at = now + delay
+        self._polls.append(self._poll_at)
+        self.counts[reason] += 1
+        self.decisions.append(PollDecision(now, delay, reason))
+        debug(f"Next poll in {delay:.2f}s ({reason})")
+        return delay
+
+    def observe(self, raw_chat: str | ChatFrame | None, new_messages: int) -> None:
+        """Feed back one poll: the vision read and how many new messages it had."""
+        now = self.clock()
+        if self._poll_at is not None and now > self._poll_at:
+            # Smoothed time spent capturing, reading and replying per cycle.
+            self._cycle_seconds = 0.7 * self._cycle_seconds + 0.3 * (now - self._poll_at)
+
+        changed = self._last_payload is not None and raw_chat != self._last_payload
+        self._last_payload = raw_chat
+        if new_messages or changed:
+            self._last_activity = now
+            self._idle_delay = self.config.latency_target
+        elif not self.is_active(now):
+            self._idle_delay = min(self._idle_delay * self.config.backoff, self.config.max_interval)
+
+    def stats(self) -> dict[str, float | int | bool]:
+        polls = sum(self.counts.values())
+        recent = [d.delay for d in self.decisions]
+        return {
+            "polls": polls,
+            **{f"{reason}_polls": count for reason, count in self.counts.items()},
+            "active": self.is_active(),
+            "last_delay_s": round(recent[-1], 3) if recent else 0.0,
+            "mean_delay_s": round(sum(recent) / len(recent), 3) if recent else 0.0,
+            "polls_last_minute": len(self._polls),
+            "cycle_s": round(self._cycle_seconds, 3),
+        }
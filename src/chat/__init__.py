@@ -1,15 +1,22 @@
+from .models import ChatFrame, ChatMessage
 from .parsing import (
     build_llm_role_messages,
     get_inbound_player_messages,
     get_messages_not_from_ai_history,
+    inbound_messages,
     normalize_text_for_history,
+    parse_chat_frame,
     parse_chat_payload,
 )
 
 __all__ = [
+    "ChatFrame",
+    "ChatMessage",
+    "parse_chat_frame",
     "parse_chat_payload",
     "build_llm_role_messages",
     "get_inbound_player_messages",
     "get_messages_not_from_ai_history",
+    "inbound_messages",
     "normalize_text_for_history",
 ]
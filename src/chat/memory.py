@@ -0,0 +1,143 @@
+"""
+Rolling per-player conversation memory with prompt size kept under a token
+budget. Tokens are estimated locally (no tokenizer download): roughly one per
+four characters of each word, one per punctuation mark or emoji, and a few
+per message for the chat template.
+"""
+
+import re
+from collections import OrderedDict, deque
+
+from .parsing import _normalize_role_name
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_SHARE = 0.2  # Part of the budget that older, trimmed turns may use as a summary
+SUMMARY_TURN_CHARS = 60
+
+
+def count_tokens(text: str) -> int:
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
+
+
+def message_tokens(message: dict[str, str]) -> int:
+    return count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationMemory:
+    """
+    Keeps the last `max_turns` turns with each of the last `max_players`
+    players, so context survives messages scrolling out of the chat panel.
+    `prompt_messages` returns the newest turns that fit in `token_budget`;
+    older turns are folded into one short system summary line.
+    `trimmed_turns` counts each turn once, when it first falls out of a prompt.
+    """
+
+    def __init__(self, token_budget: int = 512, max_turns: int = 40, max_players: int = 200):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_players = max_players
+        self._players: OrderedDict[str, deque[dict[str, str]]] = OrderedDict()
+        # Per player: turns ever added, and how many of those have been trimmed.
+        self._added: dict[str, int] = {}
+        self._trimmed_until: dict[str, int] = {}
+        self.last_prompt_tokens = 0
+        self.trimmed_turns = 0
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def _turns(self, player: str) -> deque[dict[str, str]]:
+        turns = self._players.get(player)
+        if turns is None:
+            turns = self._players[player] = deque(maxlen=self.max_turns)
+            while len(self._players) > self.max_players:
+                evicted, _ = self._players.popitem(last=False)
+                self._added.pop(evicted, None)
+                self._trimmed_until.pop(evicted, None)
+        self._players.move_to_end(player)
+        return turns
+
+    def add_user(self, player: str, text: str) -> None:
+        message = {"role": "user", "content": text}
+        name = _normalize_role_name(player)
+        if name and name not in {"player", "unknown"}:
+            message["name"] = name
+        self._append(player, message)
+
+    def add_reply(self, player: str, text: str) -> None:
+        self._append(player, {"role": "assistant", "content": text})
+
+    def _append(self, player: str, message: dict[str, str]) -> None:
+        self._turns(player).append(message)
+        self._added[player] = self._added.get(player, 0) + 1
+
+    def history(self, player: str) -> list[dict[str, str]]:
+        return list(self._players.get(player, ()))
+
+    def prompt_messages(self, player: str, until: str | None = None) -> list[dict[str, str]]:
+        """
+        Prompt for a reply to `player`. With `until`, turns after the player's
+        latest message with that text are left out, so a reply to an earlier
+        message is not prompted with later ones.
+        """
+        history = self.history(player)
+        turns = history
+        if until is not None:
+            for index in range(len(history) - 1, -1, -1):
+                if history[index]["role"] == "user" and history[index]["content"] == until:
+                    turns = history[: index + 1]
+                    break
+        summary_budget = int(self.token_budget * SUMMARY_SHARE)
+        kept: list[dict[str, str]] = []
+        used = 0
+        for index in range(len(turns) - 1, -1, -1):
+            cost = message_tokens(turns[index])
+            if kept and used + cost > self.token_budget - summary_budget:
+                break
+            kept.append(turns[index])
+            used += cost
+        kept.reverse()
+
+        older = turns[: len(turns) - len(kept)]
+        self._count_trimmed(player, len(history), len(older))
+        summary = self._summarize(player, older, summary_budget)
+        if summary is not None:
+            kept.insert(0, summary)
+            used += message_tokens(summary)
+        self.last_prompt_tokens = used
+        return kept
+
+    def _count_trimmed(self, player: str, held: int, trimmed: int) -> None:
+        first = self._added.get(player, 0) - held  # Turns before `first` already left the deque
+        end = first + trimmed
+        newly = end - max(first, self._trimmed_until.get(player, 0))
+        if newly > 0:
+            self.trimmed_turns += newly
+            self._trimmed_until[player] = end
+
+    @staticmethod
+    def _summarize(player: str, older: list[dict[str, str]], budget: int) -> dict[str, str] | None:
+        # Newest trimmed turns first, each clipped, until the summary budget is spent.
+        prefix = f"Earlier with {player}: "
+        used = count_tokens(prefix) + MESSAGE_OVERHEAD_TOKENS
+        parts: list[str] = []
+        for turn in reversed(older):
+            speaker = "you" if turn["role"] == "assistant" else player
+            part = f"{speaker}: {turn['content'][:SUMMARY_TURN_CHARS]}"
+            cost = count_tokens(part)
+            if used + cost > budget:
+                break
+            parts.append(part)
+            used += cost
+        if not parts:
+            return None
+        return {"role": "system", "content": prefix + " / ".join(reversed(parts))}
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "players": len(self._players),
+            "token_budget": self.token_budget,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "trimmed_turns": self.trimmed_turns,
+        }
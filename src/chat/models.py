@@ -0,0 +1,180 @@
+"""
+Typed chat frames. A vision read is decoded into a `ChatFrame` once, at the
+edge, and the same objects then flow through bubble placement, side
+correction, scroll merging and parsing; JSON is only written again for
+callers that want the payload as text.
+"""
+
+import json
+import re
+from typing import Any
+
+VALID_SIDES = {"left", "right", "unknown"}
+GEOMETRY_FIELDS = ("x_min", "x_max", "x_center", "y_center")
+
+
+def _normalize_side(value: Any) -> str:
+    if not isinstance(value, str):
+        return "unknown"
+    normalized = value.strip().lower()
+    if normalized in VALID_SIDES:
+        return normalized
+    return "unknown"
+
+
+def _coerce_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value.strip()
+    return ""
+
+
+def _coerce_norm_float(value: Any) -> float | None:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if 0.0 <= number <= 1.0:
+        return number
+    return None
+
+
+def _load_json_with_repair(raw_chat: str) -> Any:
+    try:
+        return json.loads(raw_chat)
+    except json.JSONDecodeError:
+        pass
+
+    # Repair common model issue: trailing commas before } or ].
+    repaired = re.sub(r",\s*([}\]])", r"\1", raw_chat)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError:
+        return None
+
+
+class ChatMessage:
+    """
+    One chat bubble. Text fields are stripped strings ("" when missing), the
+    side is one of `VALID_SIDES`, and geometry is normalized to 0..1 or None.
+    """
+
+    __slots__ = ("side", "user", "message", "x_min", "x_max", "x_center", "y_center")
+
+    def __init__(
+        self,
+        message: str,
+        user: str = "",
+        side: str = "unknown",
+        x_min: float | None = None,
+        x_max: float | None = None,
+        x_center: float | None = None,
+        y_center: float | None = None,
+    ):
+        self.side = side
+        self.user = user
+        self.message = message
+        self.x_min = x_min
+        self.x_max = x_max
+        self.x_center = x_center
+        self.y_center = y_center
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "ChatMessage | None":
+        if not isinstance(data, dict):
+            return None
+        return cls(
+            _coerce_text(data.get("message")),
+            _coerce_text(data.get("user")),
+            _normalize_side(data.get("side")),
+            *(_coerce_norm_float(data.get(field)) for field in GEOMETRY_FIELDS),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"side": self.side, "user": self.user, "message": self.message}
+        for field in GEOMETRY_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        return data
+
+    def copy(self, **changes: Any) -> "ChatMessage":
+        clone = ChatMessage.__new__(ChatMessage)
+        for field in self.__slots__:
+            setattr(clone, field, changes[field] if field in changes else getattr(self, field))
+        return clone
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChatMessage):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None  # Mutable
+
+    def __repr__(self) -> str:
+        return f"ChatMessage({self.side!r}, {self.user!r}, {self.message!r})"
+
+
+class ChatFrame:
+    """
+    The messages read from one chat crop, top to bottom. A
+    `chat_region_detected` of None means the payload did not say (a bare
+    message or list), and is taken as "any messages were read".
+    """
+
+    __slots__ = ("messages", "chat_region_detected")
+
+    def __init__(self, messages: list[ChatMessage] | None = None, chat_region_detected: bool | None = None):
+        self.messages = messages if messages is not None else []
+        self.chat_region_detected = chat_region_detected
+
+    @property
+    def detected(self) -> bool:
+        if self.chat_region_detected is None:
+            return bool(self.messages)
+        return self.chat_region_detected
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> "ChatFrame | None":
+        """Frame from decoded JSON: the messages schema, one bare message, or a list of them."""
+        if isinstance(payload, dict):
+            if "messages" in payload:
+                raw_messages = payload["messages"] if isinstance(payload["messages"], list) else []
+                return cls(_messages(raw_messages), bool(payload.get("chat_region_detected", False)))
+            return cls(_messages([payload]))
+        if isinstance(payload, list):
+            return cls(_messages(payload))
+        return None
+
+    @classmethod
+    def decode(cls, raw: str) -> "ChatFrame | None":
+        """Frame from a vision payload, tolerating trailing commas; None when it is not JSON."""
+        return cls.from_payload(_load_json_with_repair(raw))
+
+    @classmethod
+    def from_text(cls, raw: str) -> "ChatFrame":
+        """`decode`, or one message of unknown side per non-empty line when the model did not answer in JSON."""
+        frame = cls.decode(raw)
+        if frame is not None:
+            return frame
+        lines = [line.strip() for line in raw.splitlines() if line.strip()]
+        return cls([ChatMessage(line, "unknown") for line in lines])
+
+    def to_payload(self) -> dict[str, Any]:
+        return {"chat_region_detected": self.detected, "messages": [m.to_dict() for m in self.messages]}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_payload(), ensure_ascii=False)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChatFrame):
+            return NotImplemented
+        return self.detected == other.detected and self.messages == other.messages
+
+    __hash__ = None  # Mutable
+
+    def __repr__(self) -> str:
+        return f"ChatFrame({len(self.messages)} messages, detected={self.detected})"
+
+
+def _messages(raw_messages: list[Any]) -> list[ChatMessage]:
+    return [m for m in map(ChatMessage.from_dict, raw_messages) if m is not None]
@@ -0,0 +1,40 @@
+from typing import Iterable, Iterator
+
+
+PACKET_SIZE = 40
+
+
+def _split_point(buffer: str, size: int) -> int:
+    # Break after the last space that keeps the packet within `size`;
+    # a single word longer than a packet is hard-split.
+    cut = buffer.rfind(" ", 0, size + 1)
+    return cut if cut > 0 else size
+
+
+def packetize(chunks: Iterable[str], size: int = PACKET_SIZE) -> Iterator[str]:
+    """
+    Turn streamed text chunks into word-aware in-game packets of at most
+    `size` characters. A packet is yielded as soon as its boundary is known,
+    so the first one can be sent while the rest is still arriving.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if not buffer.strip():
+            buffer = ""
+            continue
+        buffer = buffer.lstrip()
+        while len(buffer) > size:
+            cut = _split_point(buffer, size)
+            packet = buffer[:cut].rstrip()
+            buffer = buffer[cut:].lstrip()
+            if packet:
+                yield packet
+
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+
+def split_packets(message: str, size: int = PACKET_SIZE) -> list[str]:
+    return list(packetize([message], size)) or [""]
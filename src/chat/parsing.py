@@ -1,26 +1,17 @@
-import json
 import re
 from typing import Any
 
+from .models import (
+    ChatFrame,
+    ChatMessage,
+    _coerce_text,
+    _load_json_with_repair,
+)
+
 
-VALID_SIDES = {"left", "right", "unknown"}
 UI_NOISE_MESSAGES = {"baboo!"}
 ROLE_NAME_PATTERN = re.compile(r"[^a-zA-Z0-9_-]+")
-
-
-def _normalize_side(value: Any) -> str:
-    if not isinstance(value, str):
-        return "unknown"
-    normalized = value.strip().lower()
-    if normalized in VALID_SIDES:
-        return normalized
-    return "unknown"
-
-
-def _coerce_text(value: Any) -> str:
-    if isinstance(value, str):
-        return value.strip()
-    return ""
+JSON_STRUCTURE_PATTERN = re.compile(r'["\\{}\[\]]')
 
 
 def normalize_text_for_history(text: str) -> str:
@@ -32,20 +23,10 @@ def _normalize_role_name(value: str) -> str:
     return compact[:64]
 
 
-def _coerce_norm_float(value: Any) -> float | None:
-    try:
-        number = float(value)
-    except (TypeError, ValueError):
-        return None
-    if 0.0 <= number <= 1.0:
-        return number
-    return None
-
-
-def _infer_side_from_geometry(message: dict[str, Any], fallback_side: str) -> str:
+def _infer_side_from_geometry(message: ChatMessage, fallback_side: str) -> str:
     # Prefer border-contact geometry over center. Long bubbles can skew centers.
-    x_min = _coerce_norm_float(message.get("x_min"))
-    x_max = _coerce_norm_float(message.get("x_max"))
+    x_min = message.x_min
+    x_max = message.x_max
     if x_min is not None and x_max is not None:
         left_touch = x_min
         right_touch = 1.0 - x_max
@@ -54,21 +35,17 @@ def _infer_side_from_geometry(message: dict[str, Any], fallback_side: str) -> st
         if left_touch <= 0.12 and left_touch < right_touch:
             return "left"
 
-    x_center = _coerce_norm_float(message.get("x_center"))
+    x_center = message.x_center
     if x_center is not None:
         return "right" if x_center >= 0.58 else "left"
 
     return fallback_side
 
 
-def _normalize_message(message: Any) -> dict[str, str] | None:
-    if not isinstance(message, dict):
-        return None
-
-    text = _coerce_text(message.get("message"))
-    side = _normalize_side(message.get("side"))
-    side = _infer_side_from_geometry(message, side)
-    raw_user = _coerce_text(message.get("user"))
+def _normalize_message(message: ChatMessage) -> ChatMessage | None:
+    text = message.message
+    side = _infer_side_from_geometry(message, message.side)
+    raw_user = message.user
 
     # OCR can misplace bubble text into `user` and leave `message` empty.
     if not text and raw_user and (" " in raw_user or len(raw_user) > 16):
@@ -83,31 +60,29 @@ def _normalize_message(message: Any) -> dict[str, str] | None:
     if text.lower() in UI_NOISE_MESSAGES and side == "right":
         return None
 
-    return {
-        "side": side,
-        "user": user,
-        "message": text,
-    }
+    return ChatMessage(text, user, side)
 
 
-def _from_messages_payload(payload: dict[str, Any]) -> dict[str, Any]:
-    raw_messages = payload.get("messages", [])
-    if not isinstance(raw_messages, list):
-        raw_messages = []
+def _as_frame(parsed_chat: dict[str, Any] | ChatFrame) -> ChatFrame:
+    if isinstance(parsed_chat, ChatFrame):
+        return parsed_chat
+    return ChatFrame.from_payload(parsed_chat) or ChatFrame()
 
-    messages = []
-    for message in raw_messages:
-        normalized = _normalize_message(message)
-        if normalized:
-            messages.append(normalized)
 
-    return {
-        "chat_region_detected": bool(payload.get("chat_region_detected", False)),
-        "messages": messages,
-    }
+def parse_chat_frame(raw_chat: str | ChatFrame) -> ChatFrame:
+    """
+    Normalized frame for a vision payload or an already decoded frame: every
+    message has text, a side (inferred from geometry when the model gave
+    bubble bounds) and a user, and UI noise is dropped. The input frame is
+    not modified.
+    """
+    frame = raw_chat if isinstance(raw_chat, ChatFrame) else ChatFrame.from_text(raw_chat)
+    messages = [m for m in map(_normalize_message, frame.messages) if m is not None]
+    detected = frame.chat_region_detected if frame.chat_region_detected is not None else bool(messages)
+    return ChatFrame(messages, detected)
 
 
-def parse_chat_payload(raw_chat: str) -> dict[str, Any]:
+def parse_chat_payload(raw_chat: str | ChatFrame) -> dict[str, Any]:
     """
     Parse OCR output into normalized chat structure.
 
@@ -119,117 +94,62 @@ def parse_chat_payload(raw_chat: str) -> dict[str, Any]:
       ]
     }
     """
-    parsed = _load_json_with_repair(raw_chat)
-
-    if isinstance(parsed, dict):
-        if "messages" in parsed:
-            return _from_messages_payload(parsed)
-
-        # Backward compatibility: single message object
-        single = _normalize_message(parsed)
-        return {
-            "chat_region_detected": bool(single),
-            "messages": [single] if single else [],
-        }
+    return parse_chat_frame(raw_chat).to_payload()
 
-    if isinstance(parsed, list):
-        normalized_messages = []
-        for item in parsed:
-            normalized = _normalize_message(item)
-            if normalized:
-                normalized_messages.append(normalized)
 
-        return {
-            "chat_region_detected": bool(normalized_messages),
-            "messages": normalized_messages,
-        }
+def inbound_player_message(message: ChatMessage | dict[str, Any]) -> ChatMessage | None:
+    """One raw vision message, normalized, if it is an inbound (left side) player message."""
+    if not isinstance(message, ChatMessage):
+        message = ChatMessage.from_dict(message)
+        if message is None:
+            return None
+    normalized = _normalize_message(message)
+    if normalized is None or normalized.side != "left":
+        return None
+    return normalized
 
-    fallback_lines = [line.strip() for line in raw_chat.splitlines() if line.strip()]
-    return {
-        "chat_region_detected": bool(fallback_lines),
-        "messages": [
-            {"side": "unknown", "user": "unknown", "message": line}
-            for line in fallback_lines
-        ],
-    }
 
+def inbound_messages(frame: ChatFrame) -> list[ChatMessage]:
+    """Left-side messages of a parsed frame, each with a user."""
+    return [m if m.user else m.copy(user="player") for m in frame.messages if m.side == "left" and m.message]
 
-def get_inbound_player_messages(parsed_chat: dict[str, Any]) -> list[dict[str, str]]:
-    messages = parsed_chat.get("messages", [])
-    if not isinstance(messages, list):
-        return []
 
-    inbound = []
-    for message in messages:
-        if not isinstance(message, dict):
-            continue
-        if message.get("side") != "left":
-            continue
-        text = _coerce_text(message.get("message"))
-        if not text:
-            continue
-        inbound.append(
-            {
-                "side": "left",
-                "user": _coerce_text(message.get("user")) or "player",
-                "message": text,
-            }
-        )
-    return inbound
+def get_inbound_player_messages(parsed_chat: dict[str, Any] | ChatFrame) -> list[dict[str, str]]:
+    return [
+        {"side": "left", "user": m.user, "message": m.message} for m in inbound_messages(_as_frame(parsed_chat))
+    ]
 
 
 def get_messages_not_from_ai_history(
-    parsed_chat: dict[str, Any], ai_message_history: set[str]
+    parsed_chat: dict[str, Any] | ChatFrame, ai_message_history: set[str]
 ) -> list[dict[str, str]]:
-    messages = parsed_chat.get("messages", [])
-    if not isinstance(messages, list):
-        return []
-
     inbound = []
-    for message in messages:
-        if not isinstance(message, dict):
-            continue
-        text = _coerce_text(message.get("message"))
-        if not text:
+    for message in _as_frame(parsed_chat).messages:
+        if not message.message:
             continue
 
-        if normalize_text_for_history(text) in ai_message_history:
+        if normalize_text_for_history(message.message) in ai_message_history:
             continue
 
-        inbound.append(
-            {
-                "side": _normalize_side(message.get("side")),
-                "user": _coerce_text(message.get("user")) or "player",
-                "message": text,
-            }
-        )
+        inbound.append({"side": message.side, "user": message.user or "player", "message": message.message})
 
     return inbound
 
 
-def build_llm_role_messages(parsed_chat: dict[str, Any]) -> list[dict[str, str]]:
-    messages = parsed_chat.get("messages", [])
-    if not isinstance(messages, list):
-        return []
-
+def build_llm_role_messages(parsed_chat: dict[str, Any] | ChatFrame) -> list[dict[str, str]]:
     role_messages: list[dict[str, str]] = []
-    for message in messages:
-        if not isinstance(message, dict):
+    for message in _as_frame(parsed_chat).messages:
+        if not message.message:
             continue
 
-        text = _coerce_text(message.get("message"))
-        if not text:
-            continue
-
-        side = _normalize_side(message.get("side"))
-        role = "assistant" if side == "right" else "user"
+        role = "assistant" if message.side == "right" else "user"
         role_message: dict[str, str] = {
             "role": role,
-            "content": text,
+            "content": message.message,
         }
 
         if role == "user":
-            user_name = _normalize_role_name(_coerce_text(message.get("user")))
+            user_name = _normalize_role_name(message.user)
             if user_name and user_name not in {"player", "unknown"}:
                 role_message["name"] = user_name
 
@@ -238,15 +158,78 @@ def build_llm_role_messages(parsed_chat: dict[str, Any]) -> list[dict[str, str]]
     return role_messages
 
 
-def _load_json_with_repair(raw_chat: str) -> Any:
-    try:
-        return json.loads(raw_chat)
-    except json.JSONDecodeError:
-        pass
+class MessageStreamDecoder:
+    """
+    Incremental decoder for a vision payload that arrives in chunks. `feed`
+    returns a `ChatMessage` for each object of the payload's `messages` array
+    (or of a bare top-level array) as soon as its closing brace arrives, so
+    callers can act on the top bubbles while the model is still describing
+    the rest.
+
+    Only JSON structure is tracked (strings, escapes and bracket depth);
+    each completed object is parsed with the same trailing-comma repair as
+    `parse_chat_payload`. The full text is kept in `text` for the final parse.
+    """
 
-    # Repair common model issue: trailing commas before } or ].
-    repaired = re.sub(r",\s*([}\]])", r"\1", raw_chat)
-    try:
-        return json.loads(repaired)
-    except json.JSONDecodeError:
+    def __init__(self):
+        self.text = ""
+        self._scanned = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._string_start = 0
+        self._skip_to = 0  # First position after an escape sequence
+        self._last_string = ""  # Most recent string in the top-level object, i.e. its current key
+        self._messages_depth: int | None = None
+        self._messages_closed = False
+        self._object_start: int | None = None
+
+    def feed(self, chunk: str) -> list[ChatMessage]:
+        self.text += chunk
+        decoded = []
+        for match in JSON_STRUCTURE_PATTERN.finditer(self.text, self._scanned):
+            i = match.start()
+            if i < self._skip_to:
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._skip_to = i + 2
+                elif char == '"':
+                    self._in_string = False
+                    if self._stack == ["{"]:
+                        self._last_string = self.text[self._string_start + 1 : i]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._open(char, i)
+            elif self._stack:
+                message = self._close(i)
+                if message is not None:
+                    decoded.append(message)
+        # An escape split across chunks resumes inside the next one.
+        self._scanned = max(len(self.text), self._skip_to)
+        return decoded
+
+    def _open(self, char: str, i: int) -> None:
+        depth = len(self._stack)
+        if char == "[" and self._messages_depth is None and not self._messages_closed:
+            if depth == 0 or (self._stack == ["{"] and self._last_string == "messages"):
+                self._messages_depth = depth + 1
+        elif char == "{" and self._messages_depth is not None and depth == self._messages_depth:
+            self._object_start = i
+        self._stack.append(char)
+
+    def _close(self, i: int) -> ChatMessage | None:
+        self._stack.pop()
+        depth = len(self._stack)
+        if self._messages_depth is None:
+            return None
+        if depth == self._messages_depth - 1:
+            self._messages_depth = None
+            self._messages_closed = True
+        elif depth == self._messages_depth and self._object_start is not None:
+            message = _load_json_with_repair(self.text[self._object_start : i + 1])
+            self._object_start = None
+            return ChatMessage.from_dict(message)
         return None
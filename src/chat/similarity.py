@@ -0,0 +1,91 @@
+"""
+Near-duplicate text matching for chat messages read by the vision model.
+
+Text is compared in a "fuzzy form" with case, whitespace and punctuation
+removed, so a bubble that wraps at a different point or loses a comma still
+matches. Candidates are found through a character q-gram filter and then
+checked with a bounded edit distance, allowing about one misread character
+per ten. A misread letter inside a longer word is tolerated, but a fuzzy
+match never bridges different digits or different short words ("meet me at
+5" is not "meet me at 6", "yes" is not "yep").
+"""
+
+Q = 3
+MAX_EDITS = 4
+SHORT_TOKEN_CHARS = 3
+
+
+def fuzzy_form(text: str) -> str:
+    return "".join(ch for ch in str(text).casefold() if ch.isalnum())
+
+
+def _digits(text: str) -> str:
+    return "".join(ch for ch in str(text) if ch.isdigit())
+
+
+def _short_tokens(text: str) -> list[str]:
+    forms = (fuzzy_form(token) for token in str(text).split())
+    return sorted(form for form in forms if 0 < len(form) <= SHORT_TOKEN_CHARS)
+
+
+def tokens_compatible(a: str, b: str, contained: bool = False) -> bool:
+    """
+    Whether a fuzzy match between `a` and `b` may stand: same digits and the
+    same short words. With `contained`, `a` is a piece of `b`, so its digits
+    only need to appear in `b`'s.
+    """
+    if contained:
+        return _digits(a) in _digits(b)
+    return _digits(a) == _digits(b) and _short_tokens(a) == _short_tokens(b)
+
+
+def shingles(form: str, q: int = Q) -> set[str]:
+    if len(form) <= q:
+        return {form} if form else set()
+    return {form[i : i + q] for i in range(len(form) - q + 1)}
+
+
+def allowed_edits(length: int) -> int:
+    return min(length // 10, MAX_EDITS)
+
+
+def min_shared_shingles(count: int, edits: int, q: int = Q) -> int:
+    """
+    q-gram filter: each edit touches at most `q` of a string's `count`
+    distinct q-grams, so anything within `edits` edits of it (or of a
+    substring of a longer text) still shares at least this many.
+    """
+    return count - edits * q
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or `limit + 1` as soon as it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def substring_edit_distance(pattern: str, text: str, limit: int) -> int:
+    """
+    Smallest edit distance between `pattern` and any substring of `text`
+    (Sellers' algorithm), or `limit + 1` when it exceeds `limit`.
+    """
+    if pattern in text:
+        return 0
+    previous = list(range(len(pattern) + 1))
+    best = previous[-1]
+    for ct in text:
+        current = [0]
+        for i, cp in enumerate(pattern, start=1):
+            current.append(min(previous[i] + 1, current[i - 1] + 1, previous[i - 1] + (cp != ct)))
+        best = min(best, current[-1])
+        previous = current
+    return min(best, limit + 1)
@@ -0,0 +1,204 @@
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from ..chat.models import ChatFrame, ChatMessage
+
+
+FILL_DELTA = 9  # Bubble fill is this much brighter (summed over RGB) than the panel background
+MIN_BUBBLE_WIDTH = 40
+MIN_BUBBLE_HEIGHT = 16
+MIN_FILL_RATIO = 0.5
+COLORFUL_SPREAD = 40  # max - min channel of avatar pixels (skin, scarf, hair)
+MIN_AVATAR_PIXELS = 30
+AVATAR_REACH = 50  # Pixels beside a bubble searched for its avatar
+
+
+@dataclass(frozen=True)
+class Bubble:
+    """One chat bubble in message-list crop pixels (x1 / y1 exclusive)."""
+
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    side: str
+    avatar: tuple[int, int, int, int] | None = None
+    clipped: bool = False  # Cut off by the top or bottom of the crop
+
+    @property
+    def box(self) -> tuple[int, int, int, int]:
+        return self.x0, self.y0, self.x1, self.y1
+
+    def geometry(self, width: int, height: int) -> dict[str, float]:
+        """Normalized bounds in the vision payload's message fields."""
+        x_scale = max(1, width - 1)
+        y_scale = max(1, height - 1)
+        return {
+            "x_min": round(self.x0 / x_scale, 4),
+            "x_max": round((self.x1 - 1) / x_scale, 4),
+            "x_center": round((self.x0 + self.x1 - 1) / 2 / x_scale, 4),
+            "y_center": round((self.y0 + self.y1 - 1) / 2 / y_scale, 4),
+        }
+
+    def place(self, message: ChatMessage, width: int, height: int) -> ChatMessage:
+        """Give `message` this bubble's geometry and side, in place."""
+        for field, value in self.geometry(width, height).items():
+            setattr(message, field, value)
+        message.side = self.side
+        return message
+
+    def crop(self, image: Image.Image) -> Image.Image:
+        return image.crop(self.box)
+
+
+def background_color(rgb: np.ndarray) -> np.ndarray:
+    """Most common colour of the crop, which is the panel background."""
+    flat = rgb.reshape(-1, 3)[::7]  # A sample is plenty; the background covers most of the crop
+    packed = (flat[:, 0].astype(np.int32) << 16) | (flat[:, 1].astype(np.int32) << 8) | flat[:, 2]
+    values, counts = np.unique(packed, return_counts=True)
+    mode = int(values[counts.argmax()])
+    return np.array([(mode >> 16) & 255, (mode >> 8) & 255, mode & 255], dtype=np.int32)
+
+
+def fill_mask(rgb: np.ndarray, background: np.ndarray | None = None) -> np.ndarray:
+    background = background_color(rgb) if background is None else background
+    brightness = rgb.sum(axis=2, dtype=np.int16)
+    return brightness >= int(background.sum()) + FILL_DELTA
+
+
+def connected_components(mask: np.ndarray) -> list[tuple[int, int, int, int, int]]:
+    """
+    4-connected components of `mask` as (x0, y0, x1, y1, area), labelled on
+    horizontal runs with a union-find, so the cost follows the run count
+    rather than the pixel count.
+    """
+    parent: list[int] = []
+
+    def find(label: int) -> int:
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    runs: list[tuple[int, int, int, int]] = []  # (y, start, end, label)
+    previous: list[tuple[int, int, int]] = []
+    padded = np.zeros(mask.shape[1] + 2, dtype=np.int8)
+    for y, row in enumerate(mask):
+        padded[1:-1] = row
+        edges = np.flatnonzero(np.diff(padded))
+        current = []
+        p = 0
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            label = len(parent)
+            parent.append(label)
+            while p < len(previous) and previous[p][1] <= start:
+                p += 1
+            q = p
+            while q < len(previous) and previous[q][0] < end:
+                root_a, root_b = find(previous[q][2]), find(label)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+                q += 1
+            current.append((start, end, label))
+            runs.append((y, start, end, label))
+        previous = current
+
+    boxes: dict[int, list[int]] = {}
+    for y, start, end, label in runs:
+        root = find(label)
+        box = boxes.get(root)
+        if box is None:
+            boxes[root] = [start, y, end, y + 1, end - start]
+        else:
+            box[0] = min(box[0], start)
+            box[2] = max(box[2], end)
+            box[3] = y + 1
+            box[4] += end - start
+    return [tuple(box) for box in boxes.values()]
+
+
+def _classify_side(x0: int, x1: int, width: int, split_norm: float | None) -> str:
+    left_gap, right_gap = x0, width - x1
+    if abs(left_gap - right_gap) > width * 0.1 or split_norm is None:
+        return "left" if left_gap < right_gap else "right"
+    # Wide bubbles reach both edges; fall back to the profile's lane split.
+    return "left" if (x0 + x1) / 2 < split_norm * width else "right"
+
+
+def _find_avatar(rgb: np.ndarray, x0: int, y0: int, side: str) -> tuple[int, int, int, int] | None:
+    height, width = rgb.shape[:2]
+    if side == "left":
+        wx0, wx1, wy0, wy1 = x0 - AVATAR_REACH, x0, y0 - AVATAR_REACH // 2, y0 + AVATAR_REACH // 2
+    else:
+        # Right-side avatars sit on the bubble's top-left corner.
+        wx0, wx1 = x0 - AVATAR_REACH // 4, x0 + AVATAR_REACH // 2
+        wy0, wy1 = y0 - AVATAR_REACH // 2, y0 + AVATAR_REACH // 4
+    wx0, wy0 = max(0, wx0), max(0, wy0)
+    wx1, wy1 = min(width, wx1), min(height, wy1)
+    if wx1 <= wx0 or wy1 <= wy0:
+        return None
+    patch = rgb[wy0:wy1, wx0:wx1]
+    window = patch.max(axis=2).astype(np.int16) - patch.min(axis=2) >= COLORFUL_SPREAD
+    if int(window.sum()) < MIN_AVATAR_PIXELS:
+        return None
+    ys, xs = np.nonzero(window)
+    return int(xs.min()) + wx0, int(ys.min()) + wy0, int(xs.max()) + wx0 + 1, int(ys.max()) + wy0 + 1
+
+
+def segment_bubbles(image: Image.Image, hints: dict[str, float] | None = None) -> list[Bubble]:
+    """
+    Find chat bubbles in a `prepare_chat_message_list` crop, top to bottom.
+
+    Bubble interiors are slightly brighter than the panel background, so a
+    brightness threshold against the crop's dominant colour gives one
+    connected component per bubble (text leaves holes but does not split
+    it). Components too small or too sparse to be a bubble are dropped.
+    """
+    rgb = np.asarray(image.convert("RGB"))
+    height, width = rgb.shape[:2]
+    mask = fill_mask(rgb)
+    split_norm = (hints or {}).get("split_norm")
+
+    bubbles = []
+    for x0, y0, x1, y1, area in connected_components(mask):
+        w, h = x1 - x0, y1 - y0
+        if w < MIN_BUBBLE_WIDTH or h < MIN_BUBBLE_HEIGHT or area < MIN_FILL_RATIO * w * h:
+            continue
+        side = _classify_side(x0, x1, width, split_norm)
+        bubbles.append(
+            Bubble(
+                x0,
+                y0,
+                x1,
+                y1,
+                side,
+                avatar=_find_avatar(rgb, x0, y0, side),
+                clipped=y0 == 0 or y1 == height,
+            )
+        )
+    bubbles.sort(key=lambda b: b.y0)
+    return bubbles
+
+
+def place_on_bubbles(frame: ChatFrame, bubbles: list[Bubble], width: int, height: int) -> ChatFrame | None:
+    """
+    Replace the vision model's guessed geometry and sides with the locally
+    segmented bubbles, in place. Messages are paired with bubbles in
+    top-to-bottom order, so this only applies when both agree on how many
+    there are; otherwise returns None and leaves `frame` untouched.
+    """
+    if not frame.messages or len(frame.messages) != len(bubbles):
+        return None
+    for message, bubble in zip(frame.messages, bubbles):
+        bubble.place(message, width, height)
+    frame.chat_region_detected = True
+    return frame
+
+
+def apply_bubble_geometry(raw_payload: str, bubbles: list[Bubble], width: int, height: int) -> str | None:
+    """`place_on_bubbles` for a JSON payload."""
+    frame = ChatFrame.decode(raw_payload)
+    placed = place_on_bubbles(frame, bubbles, width, height) if frame is not None else None
+    return placed.to_json() if placed is not None else None
@@ -0,0 +1,177 @@
+import io
+import os
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from time import monotonic
+
+from PIL import Image
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: None
+Path: "src/heartopia/"
+
+Screen capture backends. All of them return frames in memory; nothing is
+written to disk on the capture path.
+"""
+
+Region = tuple[int, int, int, int]  # (x, y, width, height)
+
+CAPTURE_ENV = "HEARTOPIA_CAPTURE_BACKEND"
+REPLAY_ENV = "HEARTOPIA_REPLAY_SOURCE"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+class CaptureExhausted(RuntimeError):
+    """A replay source has no frames left."""
+
+
+class CaptureBackend(ABC):
+    name = "base"
+    # Whether the game UI must be driven (chat opened) before a grab is meaningful.
+    needs_ui = True
+
+    @abstractmethod
+    def grab(self, region: Region) -> Image.Image:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """pyautogui screenshot of the region, kept in memory."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+
+        self._pyautogui = pyautogui
+
+    def grab(self, region: Region) -> Image.Image:
+        return self._pyautogui.screenshot(region=region)
+
+
+class MssCapture(CaptureBackend):
+    """
+    Native grab through `mss` (X11 shared memory, GDI BitBlt or CoreGraphics),
+    reusing one handle between frames. Needs `pip install mss`.
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+
+        self._sct = mss.mss()
+
+    def grab(self, region: Region) -> Image.Image:
+        x, y, width, height = region
+        shot = self._sct.grab({"left": x, "top": y, "width": width, "height": height})
+        return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX", 0, 1)
+
+    def close(self) -> None:
+        self._sct.close()
+
+
+class ReplayCapture(CaptureBackend):
+    """
+    Plays back previously captured frames from a directory or a .zip archive
+    in name order, ignoring the requested region.
+    """
+
+    name = "replay"
+    needs_ui = False
+
+    def __init__(self, source: str | Path, loop: bool = False):
+        self.source = Path(source)
+        self.loop = loop
+        self._archive: zipfile.ZipFile | None = None
+        if self.source.is_dir():
+            self._names = sorted(p.name for p in self.source.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        elif zipfile.is_zipfile(self.source):
+            self._archive = zipfile.ZipFile(self.source)
+            self._names = sorted(
+                n for n in self._archive.namelist() if Path(n).suffix.lower() in IMAGE_SUFFIXES
+            )
+        else:
+            raise ValueError(f"Replay source must be a directory or .zip archive: {self.source}")
+        if not self._names:
+            raise ValueError(f"No frames found in replay source: {self.source}")
+        self._index = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def grab(self, region: Region) -> Image.Image:
+        if self._index >= len(self._names):
+            if not self.loop:
+                raise CaptureExhausted(f"Replay source {self.source} is exhausted")
+            self._index = 0
+        name = self._names[self._index]
+        self._index += 1
+
+        if self._archive is not None:
+            data = self._archive.read(name)
+        else:
+            data = (self.source / name).read_bytes()
+        with Image.open(io.BytesIO(data)) as frame:
+            return frame.convert("RGB")
+
+    def close(self) -> None:
+        if self._archive is not None:
+            self._archive.close()
+
+
+class FrameRingBuffer:
+    """
+    Fixed number of slots holding the most recent captured frames with their
+    capture time. Slots are allocated once and overwritten in place.
+    """
+
+    def __init__(self, capacity: int = 8):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._frames: list[Image.Image | None] = [None] * capacity
+        self._times: list[float] = [0.0] * capacity
+        self._next = 0
+        self._count = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def push(self, frame: Image.Image, captured_at: float | None = None) -> None:
+        self._frames[self._next] = frame
+        self._times[self._next] = monotonic() if captured_at is None else captured_at
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.total += 1
+
+    def latest(self) -> Image.Image | None:
+        if not self._count:
+            return None
+        return self._frames[(self._next - 1) % self.capacity]
+
+    def frames(self) -> list[tuple[float, Image.Image]]:
+        """Buffered frames oldest first, as (captured_at, frame)."""
+        start = (self._next - self._count) % self.capacity
+        slots = [(start + i) % self.capacity for i in range(self._count)]
+        return [(self._times[i], self._frames[i]) for i in slots]
+
+
+def create_capture_backend(name: str | None = None) -> CaptureBackend:
+    name = (name or os.getenv(CAPTURE_ENV) or PyAutoGuiCapture.name).lower()
+    if name == PyAutoGuiCapture.name:
+        return PyAutoGuiCapture()
+    if name == MssCapture.name:
+        return MssCapture()
+    if name == ReplayCapture.name:
+        source = os.getenv(REPLAY_ENV)
+        if not source:
+            raise ValueError(f"Set {REPLAY_ENV} to a frame directory or .zip archive for replay capture")
+        return ReplayCapture(source)
+    raise ValueError(f"Unknown capture backend '{name}'. Choose from: pyautogui, mss, replay")
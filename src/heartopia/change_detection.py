@@ -0,0 +1,84 @@
+from typing import Any
+
+from PIL import Image, ImageChops
+
+
+THUMBNAIL_SIZE = (96, 72)
+PIXEL_DELTA = 12
+MIN_CHANGED_PIXELS = 4
+
+
+def thumbnail(image: Image.Image) -> Image.Image:
+    """Grayscale, downsampled copy of `image` for `frame_changed`."""
+    return image.convert("L").resize(THUMBNAIL_SIZE, Image.Resampling.BOX)
+
+
+def frame_changed(
+    previous: Image.Image,
+    current: Image.Image,
+    pixel_delta: int = PIXEL_DELTA,
+    min_changed_pixels: int = MIN_CHANGED_PIXELS,
+) -> bool:
+    """
+    Compare two grayscale thumbnails. A frame counts as changed when enough
+    thumbnail pixels moved by more than `pixel_delta` brightness levels.
+    """
+    if previous.size != current.size:
+        return True
+    histogram = ImageChops.difference(previous, current).histogram()
+    changed = sum(histogram[pixel_delta + 1:])
+    return changed >= min_changed_pixels
+
+
+class FrameChangeCache:
+    """
+    Remembers the last vision payload together with a downsampled thumbnail of
+    the crop it was produced from, so an unchanged chat panel can skip the
+    vision call entirely.
+    """
+
+    def __init__(self, pixel_delta: int = PIXEL_DELTA, min_changed_pixels: int = MIN_CHANGED_PIXELS):
+        self.pixel_delta = pixel_delta
+        self.min_changed_pixels = min_changed_pixels
+        self.hits = 0
+        self.misses = 0
+        self.saved_calls = 0
+        self._thumbnail: Image.Image | None = None
+        self._payload: Any = None
+        self._pending: Image.Image | None = None
+
+    def lookup(self, cropped_image: Image.Image) -> Any:
+        """Return the cached payload if the crop looks unchanged, else None."""
+        current = thumbnail(cropped_image)
+        self._pending = current
+        if self._thumbnail is None or frame_changed(
+            self._thumbnail, current, self.pixel_delta, self.min_changed_pixels
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self._payload is None:
+            return None
+        self.saved_calls += 1
+        return self._payload
+
+    def store(self, payload: Any) -> None:
+        """Attach `payload` to the crop passed to the most recent `lookup`."""
+        if self._pending is None:
+            return
+        self._thumbnail = self._pending
+        self._payload = payload
+        self._pending = None
+
+    def reset(self) -> None:
+        self._thumbnail = None
+        self._payload = None
+        self._pending = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_calls": self.saved_calls,
+        }
@@ -1,9 +1,12 @@
 import json
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 from PIL import Image
 
+from ..log import warning
+
 
 ANCHORS_PATH = Path("tools/anchor_editor/anchors.json")
 
@@ -24,31 +27,25 @@ def _clamp_rect(x: int, y: int, width: int, height: int, max_w: int, max_h: int)
     return x1, y1, x2, y2
 
 
-def _load_profiles(path: Path = ANCHORS_PATH) -> dict[str, Any]:
-    if not path.exists():
-        return {}
-    try:
-        payload = json.loads(path.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
-        return {}
-    if not isinstance(payload, dict):
-        return {}
-    profiles = payload.get("profiles", {})
-    if not isinstance(profiles, dict):
-        return {}
-    return profiles
+@dataclass(frozen=True)
+class CropProfile:
+    """An anchor profile compiled for one screenshot resolution."""
 
+    rect: tuple[int, int, int, int]
+    hints: dict[str, float] | None
 
-def _get_profile_for_resolution(width: int, height: int, path: Path = ANCHORS_PATH) -> dict[str, Any] | None:
-    key = f"{width}x{height}"
-    profile = _load_profiles(path).get(key)
-    if isinstance(profile, dict):
-        return profile
-    return None
 
+def _parse_resolution(key: str) -> tuple[int, int]:
+    width, sep, height = key.partition("x")
+    if not sep:
+        raise ValueError(f"Invalid profile key '{key}': expected WIDTHxHEIGHT")
+    return int(width), int(height)
 
-def _crop_from_profile(source: Image.Image, profile: dict[str, Any]) -> tuple[Image.Image, dict[str, float] | None]:
-    width, height = source.size
+
+def compile_profile(width: int, height: int, profile: Any) -> CropProfile:
+    """Validate a raw anchors.json profile and precompute its crop rectangle and hints."""
+    if not isinstance(profile, dict):
+        raise ValueError("Invalid profile: expected an object")
     msg_list = profile.get("message_list", {})
     if not isinstance(msg_list, dict):
         raise ValueError("Invalid profile: missing message_list")
@@ -61,12 +58,11 @@ def _crop_from_profile(source: Image.Image, profile: dict[str, Any]) -> tuple[Im
         raise ValueError("Invalid profile: empty message_list dimensions")
 
     x1, y1, x2, y2 = _clamp_rect(x, y, w, h, width, height)
-    cropped = source.crop((x1, y1, x2, y2))
 
     lanes = profile.get("lanes", {})
     classifier = profile.get("classifier", {})
     if not isinstance(lanes, dict):
-        return cropped, None
+        return CropProfile(rect=(x1, y1, x2, y2), hints=None)
     if not isinstance(classifier, dict):
         classifier = {}
 
@@ -79,11 +75,72 @@ def _crop_from_profile(source: Image.Image, profile: dict[str, Any]) -> tuple[Im
     split_x = int(classifier.get("split_x", (left_lane_x + right_lane_x) // 2))
     split_norm = max(0.0, min(1.0, (split_x - x1) / list_width))
 
-    return cropped, {
-        "left_lane_norm": left_norm,
-        "right_lane_norm": right_norm,
-        "split_norm": split_norm,
-    }
+    return CropProfile(
+        rect=(x1, y1, x2, y2),
+        hints={
+            "left_lane_norm": left_norm,
+            "right_lane_norm": right_norm,
+            "split_norm": split_norm,
+        },
+    )
+
+
+class AnchorProfileStore:
+    """
+    In-memory anchor profiles keyed by resolution. The file is parsed and
+    validated once, then re-read only when its mtime changes, so anchors can
+    be retuned while the bot is running.
+    """
+
+    def __init__(self, path: Path = ANCHORS_PATH):
+        self.path = Path(path)
+        self.reloads = 0
+        self._mtime_ns: int | None = None
+        self._profiles: dict[tuple[int, int], CropProfile] = {}
+
+    def get(self, width: int, height: int) -> CropProfile | None:
+        self._refresh()
+        return self._profiles.get((width, height))
+
+    def _refresh(self) -> None:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if self.reloads and mtime_ns == self._mtime_ns:
+            return
+        self._mtime_ns = mtime_ns
+        self._profiles = self._load() if mtime_ns is not None else {}
+        self.reloads += 1
+
+    def _load(self) -> dict[tuple[int, int], CropProfile]:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+            warning(f"Could not read anchor profiles from {self.path}: {exc}")
+            return {}
+        profiles = payload.get("profiles", {}) if isinstance(payload, dict) else {}
+        if not isinstance(profiles, dict):
+            return {}
+
+        compiled = {}
+        for key, profile in profiles.items():
+            try:
+                width, height = _parse_resolution(str(key))
+                compiled[(width, height)] = compile_profile(width, height, profile)
+            except (TypeError, ValueError) as exc:
+                warning(f"Skipping anchor profile '{key}': {exc}")
+        return compiled
+
+
+_stores: dict[Path, AnchorProfileStore] = {}
+
+
+def get_profile_store(path: Path = ANCHORS_PATH) -> AnchorProfileStore:
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = AnchorProfileStore(path)
+    return store
 
 
 def _crop_with_fallback(source: Image.Image) -> tuple[Image.Image, dict[str, float] | None]:
@@ -130,12 +187,10 @@ def prepare_chat_message_list(
 ) -> tuple[Image.Image, dict[str, float] | None]:
     source = _load_image(image).convert("RGB")
     width, height = source.size
-    profile = _get_profile_for_resolution(width, height, path=anchors_path)
+    profile = get_profile_store(Path(anchors_path)).get(width, height)
     if profile:
-        try:
-            return _crop_from_profile(source, profile)
-        except Exception:
-            return _crop_with_fallback(source)
+        hints = dict(profile.hints) if profile.hints is not None else None
+        return source.crop(profile.rect), hints
     return _crop_with_fallback(source)
 
 
@@ -0,0 +1,320 @@
+import os
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from statistics import quantiles
+from time import monotonic, sleep
+from typing import Callable, Iterable
+
+from PIL import Image
+
+from ..log import debug, log
+from .change_detection import frame_changed, thumbnail
+
+"""
+Website: https://github.com/novadevvvv
+Dependencies: "log.py", "heartopia/change_detection.py"
+Path: "src/heartopia/"
+
+Input dispatch for sending chat. A message is one action script: the text
+box is focused once, then every packet is pasted and sent. The dispatcher
+owns every delay (pyautogui's own pause is skipped on each call it makes),
+so a send costs only the delays in `InputTiming`. The defaults match the
+old `sendChat` timings. With a probe, each send is confirmed by watching
+the chat area change instead of sleeping blindly. After
+`calibration_sends` confirmed sends, the gap they measured replaces the
+default send gap and the dispatcher stops confirming.
+
+Environment:
+- HEARTOPIA_INPUT_BACKEND: pyautogui (default) or virtual
+- HEARTOPIA_INPUT_PAUSE: seconds after every input call (default 0.1)
+- HEARTOPIA_INPUT_SETTLE: seconds between moving the cursor and pressing (default 0.16)
+- HEARTOPIA_INPUT_SEND_GAP: seconds after a send before the next paste, when not confirming (default 0.47)
+- HEARTOPIA_INPUT_REFOCUS: 1 to click the text box before every packet (default 0)
+- HEARTOPIA_SEND_CONFIRM: 1 to wait for each packet to appear in the chat area (default 0)
+- HEARTOPIA_SEND_CONFIRM_TIMEOUT: longest wait for a packet to appear, in seconds (default 1.0)
+- HEARTOPIA_SEND_CALIBRATION: confirmed sends before the measured gap is used; 0 keeps confirming (default 5)
+"""
+
+INPUT_ENV = "HEARTOPIA_INPUT_BACKEND"
+PAUSE_ENV = "HEARTOPIA_INPUT_PAUSE"
+SETTLE_ENV = "HEARTOPIA_INPUT_SETTLE"
+SEND_GAP_ENV = "HEARTOPIA_INPUT_SEND_GAP"
+REFOCUS_ENV = "HEARTOPIA_INPUT_REFOCUS"
+CONFIRM_ENV = "HEARTOPIA_SEND_CONFIRM"
+CONFIRM_TIMEOUT_ENV = "HEARTOPIA_SEND_CONFIRM_TIMEOUT"
+CALIBRATION_ENV = "HEARTOPIA_SEND_CALIBRATION"
+
+Point = tuple[int, int]
+Probe = Callable[[], Image.Image]
+
+# Headroom over the slowest observed confirmation when suggesting a send gap.
+GAP_HEADROOM = 1.25
+
+
+class InputBackend(ABC):
+    name = "base"
+
+    def now(self) -> float:
+        return monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            sleep(seconds)
+
+    @abstractmethod
+    def move(self, x: int, y: int) -> None:
+        ...
+
+    @abstractmethod
+    def mouse_down(self) -> None:
+        ...
+
+    @abstractmethod
+    def mouse_up(self) -> None:
+        ...
+
+    @abstractmethod
+    def paste(self, text: str) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class PyAutoGuiInput(InputBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        import pyperclip
+
+        self._gui = pyautogui
+        self._clipboard = pyperclip
+
+    # `_pause=False` skips pyautogui.PAUSE for these calls only; the dispatcher
+    # sleeps exactly where it needs to, and other pyautogui callers keep theirs.
+    def move(self, x: int, y: int) -> None:
+        self._gui.moveTo(x, y, duration=0, _pause=False)
+
+    def mouse_down(self) -> None:
+        self._gui.mouseDown(_pause=False)
+
+    def mouse_up(self) -> None:
+        self._gui.mouseUp(_pause=False)
+
+    def paste(self, text: str) -> None:
+        self._clipboard.copy(text)
+        self._gui.hotkey("ctrl", "v", _pause=False)
+
+
+class VirtualInput(InputBackend):
+    """
+    Records every action against a virtual clock instead of touching the UI.
+    Sleeping advances the clock, so timing benchmarks and tests run instantly
+    and headless. `call_cost` models the time each real input call takes.
+    """
+
+    name = "virtual"
+
+    def __init__(self, call_cost: float = 0.0):
+        self.call_cost = call_cost
+        self.clock = 0.0
+        self.actions: list[tuple[float, str, object]] = []
+
+    def now(self) -> float:
+        return self.clock
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.clock += seconds
+
+    def _record(self, action: str, value: object = None) -> None:
+        self.actions.append((self.clock, action, value))
+        self.clock += self.call_cost
+
+    def move(self, x: int, y: int) -> None:
+        self._record("move", (x, y))
+
+    def mouse_down(self) -> None:
+        self._record("down")
+
+    def mouse_up(self) -> None:
+        self._record("up")
+
+    def paste(self, text: str) -> None:
+        self._record("paste", text)
+
+    def clicks(self) -> list[Point]:
+        """Cursor position at each press."""
+        position = None
+        pressed = []
+        for _, action, value in self.actions:
+            if action == "move":
+                position = value
+            elif action == "down":
+                pressed.append(position)
+        return pressed
+
+    def pasted(self) -> list[str]:
+        return [value for _, action, value in self.actions if action == "paste"]
+
+
+@dataclass(frozen=True)
+class InputTiming:
+    # The defaults keep the delays `sendChat` used before the dispatcher. Only
+    # the repeated text box click is gone; `send_gap` waits as long as it took.
+    settle: float = 0.16  # cursor moved -> button pressed
+    hold: float = 0.01  # button held down
+    after_paste: float = 0.0  # paste -> send click
+    send_gap: float = 0.47  # send click -> next paste of the same message, when not confirming
+    pause: float = 0.1  # after every input call, like pyautogui.PAUSE
+    jitter: int = 2  # cursor lands up to this many pixels off the target
+    refocus: bool = False  # click the text box before every packet
+    confirm: bool = False
+    confirm_timeout: float = 1.0
+    confirm_poll: float = 0.02
+    calibration_sends: int = 5  # confirmed sends before the measured gap is used; 0 keeps confirming
+
+    @classmethod
+    def from_env(cls) -> "InputTiming":
+        return cls(
+            pause=float(os.getenv(PAUSE_ENV) or cls.pause),
+            settle=float(os.getenv(SETTLE_ENV) or cls.settle),
+            send_gap=float(os.getenv(SEND_GAP_ENV) or cls.send_gap),
+            refocus=os.getenv(REFOCUS_ENV) == "1",
+            confirm=os.getenv(CONFIRM_ENV) == "1",
+            confirm_timeout=float(os.getenv(CONFIRM_TIMEOUT_ENV) or cls.confirm_timeout),
+            calibration_sends=int(os.getenv(CALIBRATION_ENV) or cls.calibration_sends),
+        )
+
+
+# The timings `sendChat` used before the dispatcher: pyautogui's 0.1 s pause
+# after each call, 0.06 s between move and press (plus the pause of a separate
+# jitter move), and the text box clicked again for every packet.
+LEGACY_TIMING = InputTiming(send_gap=0.0, refocus=True)
+
+
+class Dispatcher:
+    """
+    Runs action scripts on an input backend. `send_packets` pulls packets as
+    they become available (a streamed reply yields them while it is still
+    being generated); only the time spent sending counts towards the stats.
+    `send_gap` starts at the configured gap and drops to the measured one
+    once calibration has finished.
+    """
+
+    def __init__(
+        self,
+        backend: InputBackend,
+        timing: InputTiming | None = None,
+        probe: Probe | None = None,
+        rng: random.Random | None = None,
+    ):
+        self.backend = backend
+        self.timing = timing or InputTiming()
+        self.probe = probe
+        self.rng = rng or random.Random()
+        self.counts = {"messages": 0, "packets": 0, "clicks": 0, "confirmed": 0, "unconfirmed": 0}
+        self.send_seconds = 0.0
+        self.confirm_latencies: list[float] = []
+        self.send_gap = self.timing.send_gap
+        self.calibrated = False
+
+    def _call(self, action: Callable[..., None], *args) -> None:
+        action(*args)
+        self.backend.sleep(self.timing.pause)
+
+    def click(self, position: Point, hold: float | None = None) -> None:
+        dx, dy = (self.rng.randint(1, self.timing.jitter) for _ in range(2)) if self.timing.jitter else (0, 0)
+        self._call(self.backend.move, position[0] + dx, position[1] + dy)
+        self.backend.sleep(self.timing.settle)
+        self._call(self.backend.mouse_down)
+        self.backend.sleep(self.timing.hold if hold is None else hold)
+        self._call(self.backend.mouse_up)
+        self.counts["clicks"] += 1
+
+    def _await_change(self, before: Image.Image) -> bool:
+        started = self.backend.now()
+        deadline = started + self.timing.confirm_timeout
+        while self.backend.now() < deadline:
+            if frame_changed(before, thumbnail(self.probe())):
+                self.confirm_latencies.append(self.backend.now() - started)
+                return True
+            self.backend.sleep(self.timing.confirm_poll)
+        return False
+
+    @property
+    def confirming(self) -> bool:
+        return self.timing.confirm and self.probe is not None and not self.calibrated
+
+    def _calibrate(self) -> None:
+        needed = self.timing.calibration_sends
+        if not needed or self.counts["confirmed"] < needed or self.counts["unconfirmed"]:
+            return
+        # Only ever shortens the gap: a slow measurement keeps the configured one.
+        # A change seen on the first poll still gets one poll interval.
+        measured = max(self.suggested_send_gap(), self.timing.confirm_poll)
+        self.send_gap = min(measured, self.timing.send_gap)
+        self.calibrated = True
+        log(f"Send gap calibrated to {self.send_gap}s after {needed} confirmed sends")
+
+    def _send_packet(self, packet: str, text_box: Point, send_button: Point, first: bool) -> None:
+        if not first and not self.confirming:
+            # Waited before the next paste rather than after every send, so the
+            # last packet of a message does not hold up whatever comes next.
+            self.backend.sleep(self.send_gap)
+        if self.timing.refocus or first:
+            self.click(text_box)
+        self._call(self.backend.paste, packet)
+        self.backend.sleep(self.timing.after_paste)
+        before = thumbnail(self.probe()) if self.confirming else None
+        self.click(send_button)
+        if not self.confirming:
+            return
+        if self._await_change(before):
+            self.counts["confirmed"] += 1
+            self._calibrate()
+        else:
+            # Never resend: a packet that did appear late would be doubled.
+            self.counts["unconfirmed"] += 1
+            debug(f"No chat change within {self.timing.confirm_timeout}s of sending {packet!r}")
+
+    def send_packets(self, packets: Iterable[str], text_box: Point, send_button: Point) -> list[str]:
+        sent = []
+        for packet in packets:
+            started = self.backend.now()
+            self._send_packet(packet, text_box, send_button, first=not sent)
+            self.send_seconds += self.backend.now() - started
+            self.counts["packets"] += 1
+            sent.append(packet)
+        if sent:
+            self.counts["messages"] += 1
+        return sent
+
+    def suggested_send_gap(self) -> float | None:
+        """A blind send gap that would have covered every confirmed send so far."""
+        if not self.confirm_latencies:
+            return None
+        return round(max(self.confirm_latencies) * GAP_HEADROOM, 3)
+
+    def stats(self) -> dict[str, float | int | None]:
+        packets = self.counts["packets"]
+        stats: dict[str, float | int | None] = dict(self.counts)
+        stats["ms_per_packet"] = round(1000 * self.send_seconds / packets, 1) if packets else 0.0
+        if len(self.confirm_latencies) >= 2:
+            cuts = quantiles(self.confirm_latencies, n=10)
+            stats["confirm_p50_ms"] = round(1000 * cuts[4], 1)
+            stats["confirm_p90_ms"] = round(1000 * cuts[8], 1)
+        stats["suggested_send_gap"] = self.suggested_send_gap()
+        stats["send_gap"] = self.send_gap
+        return stats
+
+
+def create_input_backend(name: str | None = None) -> InputBackend:
+    name = (name or os.getenv(INPUT_ENV) or PyAutoGuiInput.name).lower()
+    if name == PyAutoGuiInput.name:
+        return PyAutoGuiInput()
+    if name == VirtualInput.name:
+        return VirtualInput()
+    raise ValueError(f"Unknown input backend '{name}'. Choose from: pyautogui, virtual")
@@ -1,15 +1,25 @@
 import json
 import os
-import pyautogui
 from time import sleep as wait
-import random
-import pyperclip
-from PIL import ImageOps, ImageEnhance
-from ..log import log
+from typing import Iterable
+from ..log import debug, flush, log
 from ..ai.groq import imageToText
+from ..chat.packets import split_packets
+from .capture import CaptureBackend, FrameRingBuffer, create_capture_backend
+from .dispatch import Dispatcher, InputTiming, create_input_backend
 
 CONFIG_PATH = "config.json"
+CHAT_SETTLE_SECONDS = 0.5  # Time for the chat panel to draw after it is opened
 chatOpen: bool = False
+positionsLoaded: bool = False
+
+# pyautogui touches the display on import, so it loads on first use.
+_pyautogui = None
+_captureBackend: CaptureBackend | None = None
+_dispatcher: Dispatcher | None = None
+
+# Most recent chat-area frames, for debugging and recording.
+frameBuffer = FrameRingBuffer()
 
 # Default positions and areas we need
 required_positions = {
@@ -20,8 +30,45 @@ required_positions = {
     "chat_area": None  # (x, y, width, height)
 }
 
+def _gui():
+    global _pyautogui
+    if _pyautogui is None:
+        import pyautogui
+
+        _pyautogui = pyautogui
+    return _pyautogui
+
+def getCaptureBackend() -> CaptureBackend:
+    global _captureBackend
+    if _captureBackend is None:
+        _captureBackend = create_capture_backend()
+        log(f"Using `{_captureBackend.name}` capture backend")
+    return _captureBackend
+
+def setCaptureBackend(backend: CaptureBackend | None) -> None:
+    global _captureBackend
+    _captureBackend = backend
+
+def _probeChatArea():
+    return getCaptureBackend().grab(tuple(required_positions["chat_area"]))
+
+def getDispatcher() -> Dispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        timing = InputTiming.from_env()
+        probe = _probeChatArea if timing.confirm and getCaptureBackend().needs_ui else None
+        _dispatcher = Dispatcher(create_input_backend(), timing, probe)
+        log(f"Using `{_dispatcher.backend.name}` input backend")
+    return _dispatcher
+
+def setDispatcher(dispatcher: Dispatcher | None) -> None:
+    global _dispatcher
+    _dispatcher = dispatcher
+
 def load_or_prompt_positions():
     """Load positions from config.json or prompt user to set them."""
+    global positionsLoaded
+    pyautogui = _gui()
     # Load existing config if it exists
     if os.path.exists(CONFIG_PATH):
         with open(CONFIG_PATH, "r") as f:
@@ -38,6 +85,7 @@ def load_or_prompt_positions():
                     "Please move your mouse to the TOP-LEFT of the chat area, press Enter, "
                     "then move to the BOTTOM-RIGHT of the chat area and press Enter again..."
                 )
+                flush()
                 input("Move to top-left and press Enter...")
                 top_left = pyautogui.position()
                 input("Move to bottom-right and press Enter...")
@@ -49,6 +97,7 @@ def load_or_prompt_positions():
                 required_positions[key] = (x, y, width, height)
             else:
                 log(f"Please move your mouse to the {key.replace('_', ' ')} and press Enter...")
+                flush()
                 input()
                 pos = pyautogui.position()
                 required_positions[key] = (pos.x, pos.y)
@@ -57,21 +106,22 @@ def load_or_prompt_positions():
     # Save back to config.json
     with open(CONFIG_PATH, "w") as f:
         json.dump(required_positions, f, indent=4)
+    positionsLoaded = True
+
+def ensure_positions() -> None:
+    """Calibrate on first use instead of on import."""
+    if not positionsLoaded:
+        load_or_prompt_positions()
 
 def click(position: tuple[int, int], duration: float = 0.01) -> None:
-    log(f"Clicking at {position}")
-    pyautogui.moveTo(position[0], position[1], duration=0)
-    wait(0.01)
-    pyautogui.moveRel(random.randint(1,2), random.randint(1,2), duration=0)
-    wait(0.05)
-    pyautogui.mouseDown()
-    wait(duration)
-    pyautogui.mouseUp()
+    debug(f"Clicking at {position}")
+    getDispatcher().click(position, hold=duration)
 
 def openChat() -> None:
     global chatOpen
     if chatOpen:
         return
+    ensure_positions()
     click(required_positions["chat_button"])
     click(required_positions["chat_bubble"])
     chatOpen = True
@@ -83,29 +133,30 @@ def closeChat() -> None:
     click(required_positions["chat_bubble"])
     chatOpen = False
 
-def sendChat(message: str) -> None:
+def sendPackets(packets: Iterable[str]) -> list[str]:
+    """Send packets as they become available; returns what was sent."""
     global chatOpen
     if not chatOpen:
         openChat()
+    return getDispatcher().send_packets(packets, required_positions["text_box"], required_positions["send_button"])
 
-    def sendPacket(packet: str):
-        click(required_positions["text_box"])
-        pyperclip.copy(packet)
-        pyautogui.hotkey("ctrl", "v")
-        click(required_positions["send_button"])
-
-    messages = [message[i:i+40] for i in range(0, len(message), 40)]
-    for packet in messages:
-        sendPacket(packet)
+def sendChat(message: str) -> None:
+    sendPackets(split_packets(message))
 
-def getChat() -> list:
+def captureChat():
     global chatOpen
-    if not chatOpen:
-        openChat()
-    wait(0.5)
-    x, y, width, height = required_positions["chat_area"]
-    screenshot = pyautogui.screenshot("chat.png", region=(x, y, width, height))
-    return imageToText(screenshot)
+    backend = getCaptureBackend()
+    if backend.needs_ui:
+        if not chatOpen:
+            openChat()
+            wait(CHAT_SETTLE_SECONDS)
+        region = required_positions["chat_area"]
+    else:
+        region = required_positions["chat_area"] or (0, 0, 0, 0)
+    frame = backend.grab(tuple(region))
+    frameBuffer.push(frame)
+    return frame
+
+def getChat(on_message=None) -> str:
+    return imageToText(captureChat(), on_message=on_message)
 
-# Initialize positions on import
-load_or_prompt_positions()
@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from PIL import Image
+
+from ..chat.models import ChatFrame, ChatMessage
+from ..log import log, warning
+from .bubbles import Bubble, background_color, segment_bubbles
+from .chat_preprocess import prepare_chat_message_list
+
+"""
+Offline OCR for the Heartopia chat font. Each bubble found by
+`segment_bubbles` is binarized against its fill colour, split into text
+lines by row projection and into glyphs by column projection, and every
+glyph, cut from a window anchored on its line's baseline, is matched
+against a glyph atlas with one normalized cross-correlation matrix
+product. A read below `min_confidence` returns None so the caller can fall
+back to the vision model.
+
+The atlas is built from captured screenshots with known text:
+
+    python -m src.heartopia.ocr build labels.json --out glyph_atlas.npz
+
+where labels.json maps screenshot paths to their bubbles, top to bottom:
+{"shot.png": [{"user": "Irin", "message": "hi"}, {"user": "unknown", "message": "hey"}]}
+"""
+
+ATLAS_ENV = "HEARTOPIA_OCR_ATLAS"
+CONFIDENCE_ENV = "HEARTOPIA_OCR_MIN_CONFIDENCE"
+
+GLYPH_ROWS = 20
+GLYPH_COLS = 14
+INK_DELTA = 150  # Summed RGB distance from the fill colour that counts as ink
+FILL_TOLERANCE = 30  # Summed RGB distance from the fill colour still counted as bubble fill
+BUBBLE_INSET = 2
+NAME_HEIGHT = 22  # Rows above a left bubble that hold the sender's name
+SPACE_RATIO = 0.28  # Gap between glyphs, relative to line height, read as a space
+WIDTH_PENALTY = 0.35
+MIN_CONFIDENCE = 0.8
+
+
+def ink_mask(rgb: np.ndarray, fill: np.ndarray) -> np.ndarray:
+    return np.abs(rgb.astype(np.int16) - fill.astype(np.int16)).sum(axis=2) >= INK_DELTA
+
+
+def text_lines(mask: np.ndarray) -> list[tuple[int, int]]:
+    """Row ranges [top, bottom) that contain ink, one per line of text."""
+    rows = mask.any(axis=1).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], rows, [0]))))
+    return [(int(top), int(bottom)) for top, bottom in zip(edges[::2], edges[1::2])]
+
+
+def segment_glyphs(line: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Column ranges [left, right) of the glyphs in one line. Ink columns are
+    grouped into runs, so parts of one glyph stacked vertically (the dot of
+    an i, the two halves of a colon) stay together.
+    """
+    cols = line.any(axis=0).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], cols, [0]))))
+    return [(int(left), int(right)) for left, right in zip(edges[::2], edges[1::2])]
+
+
+def _baseline(line: np.ndarray, glyphs: list[tuple[int, int]]) -> int:
+    """Row most glyphs in the line end on; descenders and punctuation are outvoted."""
+    bottoms = [int(np.flatnonzero(line[:, left:right].any(axis=1))[-1]) for left, right in glyphs]
+    return int(np.bincount(bottoms).argmax())
+
+
+def line_metrics(mask: np.ndarray) -> tuple[int, int]:
+    """Tallest ascent above and descent below the baseline over every line in `mask`, in pixels."""
+    ascent = descent = 0
+    for top, bottom in text_lines(mask):
+        line = mask[top:bottom]
+        glyphs = segment_glyphs(line)
+        baseline = _baseline(line, glyphs)
+        ascent = max(ascent, baseline + 1)
+        descent = max(descent, bottom - top - baseline - 1)
+    return ascent, descent
+
+
+def glyph_vector(line: np.ndarray, left: int, right: int, top: int, bottom: int) -> np.ndarray:
+    """
+    Glyph columns [left, right) and line rows [top, bottom), which may reach
+    past the line, resized into a fixed cell, zero-mean and unit length.
+    """
+    window = np.zeros((bottom - top, right - left), dtype=np.uint8)
+    src_top, src_bottom = max(top, 0), min(bottom, line.shape[0])
+    if src_bottom > src_top:
+        window[src_top - top : src_bottom - top] = line[src_top:src_bottom, left:right] * 255
+    cell = Image.fromarray(window).resize((GLYPH_COLS, GLYPH_ROWS), Image.Resampling.BILINEAR)
+    vector = np.asarray(cell, dtype=np.float32).ravel()
+    vector -= vector.mean()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _line_glyphs(mask: np.ndarray, ascent: int, descent: int) -> list[list[tuple[np.ndarray, float, bool]]]:
+    """
+    Per line, each glyph's vector, width relative to the font height and
+    whether a space precedes it. Every glyph cell spans `ascent` rows above
+    and `descent` rows below its line's baseline, so a glyph's size and
+    position against the baseline survive resizing whatever else is on the
+    line.
+    """
+    height = max(1, ascent + descent)
+    lines = []
+    for top, bottom in text_lines(mask):
+        line = mask[top:bottom]
+        runs = segment_glyphs(line)
+        baseline = _baseline(line, runs)
+        glyphs = []
+        previous_right = None
+        for left, right in runs:
+            spaced = previous_right is not None and left - previous_right >= SPACE_RATIO * height
+            vector = glyph_vector(line, left, right, baseline + 1 - ascent, baseline + 1 + descent)
+            glyphs.append((vector, (right - left) / height, spaced))
+            previous_right = right
+        lines.append(glyphs)
+    return lines
+
+
+class GlyphAtlas:
+    """
+    Reference glyphs: one row of `templates` and one relative width per
+    character sample, plus the font's ascent and descent in pixels.
+    """
+
+    def __init__(
+        self,
+        chars: list[str] | None = None,
+        templates: np.ndarray | None = None,
+        widths=None,
+        ascent: int = 0,
+        descent: int = 0,
+    ):
+        self.chars: list[str] = list(chars or [])
+        self.templates = (
+            templates if templates is not None else np.zeros((0, GLYPH_ROWS * GLYPH_COLS), dtype=np.float32)
+        )
+        self.widths = np.asarray(widths if widths is not None else [], dtype=np.float32)
+        self.ascent = ascent
+        self.descent = descent
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    def add(self, char: str, vector: np.ndarray, width: float) -> None:
+        self.chars.append(char)
+        self.templates = np.vstack([self.templates, vector[None, :]])
+        self.widths = np.append(self.widths, np.float32(width))
+
+    def match(self, vectors: np.ndarray, widths: np.ndarray) -> tuple[list[str], np.ndarray]:
+        """Best character and its score for every glyph, all glyphs in one matrix product."""
+        scores = vectors @ self.templates.T
+        scores -= WIDTH_PENALTY * np.abs(np.log(widths[:, None] / self.widths[None, :]))
+        best = scores.argmax(axis=1)
+        return [self.chars[i] for i in best], scores[np.arange(len(best)), best]
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(
+            path,
+            chars=np.array(self.chars),
+            templates=self.templates,
+            widths=self.widths,
+            metrics=np.array([self.ascent, self.descent]),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "GlyphAtlas":
+        with np.load(path) as data:
+            ascent, descent = (int(v) for v in data["metrics"])
+            return cls([str(c) for c in data["chars"]], data["templates"], data["widths"], ascent, descent)
+
+
+def read_text(mask: np.ndarray, atlas: GlyphAtlas) -> tuple[str, float]:
+    """Text in an ink mask and the lowest glyph score, or ("", 0.0) when nothing matched."""
+    lines = _line_glyphs(mask, atlas.ascent, atlas.descent)
+    glyphs = [glyph for line in lines for glyph in line]
+    if not glyphs or not len(atlas):
+        return "", 0.0
+    chars, scores = atlas.match(
+        np.stack([vector for vector, _, _ in glyphs]), np.array([width for _, width, _ in glyphs], dtype=np.float32)
+    )
+    parts = []
+    index = 0
+    for line in lines:
+        text = ""
+        for _, _, spaced in line:
+            text += (" " if spaced else "") + chars[index]
+            index += 1
+        parts.append(text)
+    return " ".join(parts), float(scores.min())
+
+
+def _enclosed(fill: np.ndarray) -> np.ndarray:
+    """Pixels with fill somewhere to their left, right, top and bottom."""
+    left = np.logical_or.accumulate(fill, axis=1)
+    right = np.logical_or.accumulate(fill[:, ::-1], axis=1)[:, ::-1]
+    top = np.logical_or.accumulate(fill, axis=0)
+    bottom = np.logical_or.accumulate(fill[::-1], axis=0)[::-1]
+    return left & right & top & bottom
+
+
+def _bubble_mask(rgb: np.ndarray, bubble: Bubble) -> np.ndarray:
+    """
+    Ink inside the bubble. Only ink enclosed by bubble fill counts, so the
+    outline and an avatar overlapping the bubble's edge are left out; an
+    avatar sitting on the bubble's corner is masked by its detected box.
+    """
+    x0, y0 = bubble.x0 + BUBBLE_INSET, bubble.y0 + BUBBLE_INSET
+    region = rgb[y0 : bubble.y1 - BUBBLE_INSET, x0 : bubble.x1 - BUBBLE_INSET]
+    if region.size == 0:
+        return np.zeros((0, 0), dtype=bool)
+    fill = background_color(region)
+    distance = np.abs(region.astype(np.int16) - fill.astype(np.int16)).sum(axis=2)
+    mask = (distance >= INK_DELTA) & _enclosed(distance < FILL_TOLERANCE)
+    if bubble.avatar is not None:
+        ax0, ay0, ax1, ay1 = bubble.avatar
+        mask[max(0, ay0 - y0) : max(0, ay1 - y0), max(0, ax0 - x0) : max(0, ax1 - x0)] = False
+    return mask
+
+
+def _name_mask(rgb: np.ndarray, bubble: Bubble, background: np.ndarray) -> np.ndarray | None:
+    """Ink of the sender name above a left bubble, without the avatar beside it."""
+    if bubble.side != "left":
+        return None
+    top = bubble.y0 - NAME_HEIGHT
+    if top < 0:
+        return None
+    mask = ink_mask(rgb[top : bubble.y0 - 3, bubble.x0 : bubble.x1], background)
+    runs = segment_glyphs(mask)
+    if runs and runs[0][0] == 0:
+        mask[:, : runs[0][1]] = False
+    return mask
+
+
+def read_bubbles(
+    image: Image.Image,
+    bubbles: list[Bubble],
+    atlas: GlyphAtlas,
+    min_confidence: float = MIN_CONFIDENCE,
+) -> ChatFrame | None:
+    """
+    Frame for `bubbles`, as the vision model would read them, or None when
+    any bubble or sender name cannot be read with at least `min_confidence`.
+    """
+    if not bubbles:
+        return None
+    rgb = np.asarray(image.convert("RGB"))
+    background = background_color(rgb)
+    width, height = image.size
+    messages = []
+    for bubble in bubbles:
+        text, confidence = read_text(_bubble_mask(rgb, bubble), atlas)
+        if not text or confidence < min_confidence:
+            return None
+        user = "unknown"
+        name_mask = _name_mask(rgb, bubble, background)
+        if name_mask is not None and name_mask.any():
+            user, confidence = read_text(name_mask, atlas)
+            if confidence < min_confidence:
+                return None
+        messages.append(bubble.place(ChatMessage(text, user), width, height))
+    return ChatFrame(messages, True)
+
+
+def add_samples(atlas: GlyphAtlas, mask: np.ndarray, text: str) -> bool:
+    """
+    Add each glyph in `mask` under its character in `text`. Returns False
+    (adding nothing) when the glyph count does not match the text, e.g.
+    because two letters touch.
+    """
+    glyphs = [glyph for line in _line_glyphs(mask, atlas.ascent, atlas.descent) for glyph in line]
+    chars = [c for c in text if not c.isspace()]
+    if len(glyphs) != len(chars):
+        return False
+    for char, (vector, width, _) in zip(chars, glyphs):
+        atlas.add(char, vector, width)
+    return True
+
+
+def build_atlas(labelled: Iterable[tuple[Image.Image, list[dict[str, str]]]]) -> GlyphAtlas:
+    """Atlas from message-list crops and their bubbles' known user and message text, top to bottom."""
+    samples: list[tuple[np.ndarray, str]] = []
+    skipped = 0
+    for image, labels in labelled:
+        rgb = np.asarray(image.convert("RGB"))
+        background = background_color(rgb)
+        bubbles = segment_bubbles(image)
+        if len(bubbles) != len(labels):
+            warning(f"Found {len(bubbles)} bubbles but {len(labels)} labels; skipping image")
+            skipped += 1
+            continue
+        for bubble, label in zip(bubbles, labels):
+            samples.append((_bubble_mask(rgb, bubble), label.get("message", "")))
+            name_mask = _name_mask(rgb, bubble, background)
+            if name_mask is not None and name_mask.any() and label.get("user", "unknown") != "unknown":
+                samples.append((name_mask, label["user"]))
+
+    # Metrics first, so every sample is cut from the same baseline-anchored window.
+    metrics = [line_metrics(mask) for mask, _ in samples if mask.any()]
+    atlas = GlyphAtlas(
+        ascent=max((a for a, _ in metrics), default=0),
+        descent=max((d for _, d in metrics), default=0),
+    )
+    for mask, text in samples:
+        skipped += not add_samples(atlas, mask, text)
+    log(f"Built glyph atlas with {len(atlas)} samples of {len(set(atlas.chars))} characters ({skipped} skipped)")
+    return atlas
+
+
+_atlases: dict[str, GlyphAtlas | None] = {}
+
+
+def get_atlas(path: str | None = None) -> GlyphAtlas | None:
+    """The atlas at `path` (or `HEARTOPIA_OCR_ATLAS`), loaded once; None when none is configured."""
+    path = path or os.getenv(ATLAS_ENV)
+    if not path:
+        return None
+    if path not in _atlases:
+        try:
+            _atlases[path] = GlyphAtlas.load(path)
+        except (OSError, ValueError, KeyError) as exc:
+            warning(f"Could not load glyph atlas from {path}: {exc}")
+            _atlases[path] = None
+    return _atlases[path]
+
+
+def min_confidence_from_env() -> float:
+    return float(os.getenv(CONFIDENCE_ENV) or MIN_CONFIDENCE)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build a glyph atlas for local chat OCR")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build an atlas from labelled screenshots")
+    build.add_argument("labels", help='JSON file of {"screenshot.png": [{"user": ..., "message": ...}, ...]}')
+    build.add_argument("--out", default="glyph_atlas.npz")
+    args = parser.parse_args(argv)
+
+    labels_path = Path(args.labels)
+    labels = json.loads(labels_path.read_text(encoding="utf-8"))
+    crops = (
+        (prepare_chat_message_list(str(labels_path.parent / name))[0], bubbles) for name, bubbles in labels.items()
+    )
+    atlas = build_atlas(crops)
+    atlas.save(args.out)
+    log(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
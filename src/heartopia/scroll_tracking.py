@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from ..chat.models import ChatFrame, ChatMessage
+
+
+PROFILE_BANDS = 16
+ROW_TOLERANCE = 6.0
+MIN_OVERLAP_ROWS = 48
+MAX_STRIP_RATIO = 0.8
+MIN_STRIP_ROWS = 8
+
+
+@dataclass(frozen=True)
+class StripPlan:
+    scroll_offset: int
+    strip_top: int
+    crop_height: int
+
+    @property
+    def strip_height(self) -> int:
+        return self.crop_height - self.strip_top
+
+    @property
+    def needs_read(self) -> bool:
+        return self.strip_height >= MIN_STRIP_ROWS
+
+
+def row_profile(image: Image.Image) -> np.ndarray:
+    """Per-row mean brightness across a few vertical bands, shape (height, bands)."""
+    gray = image.convert("L").resize((PROFILE_BANDS, image.height), Image.Resampling.BOX)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _row_mismatches(previous: np.ndarray, current: np.ndarray, offset: int) -> np.ndarray:
+    height = current.shape[0]
+    aligned_prev = previous[offset:]
+    aligned_curr = current[: height - offset]
+    return np.abs(aligned_prev - aligned_curr).max(axis=1) > ROW_TOLERANCE
+
+
+def _blank_rows(profile: np.ndarray) -> np.ndarray:
+    return (profile.max(axis=1) - profile.min(axis=1)) <= ROW_TOLERANCE
+
+
+def estimate_scroll_offset(previous: np.ndarray, current: np.ndarray) -> int | None:
+    """
+    Return how many pixels the message list scrolled up between two row
+    profiles, or None when the profiles cannot be compared.
+
+    Each candidate offset is charged for rows that disagree in the overlap
+    plus rows with content in the newly revealed tail, so a large offset
+    cannot win just by shrinking the overlap onto blank background.
+    """
+    if previous.shape != current.shape:
+        return None
+    height = current.shape[0]
+    if height <= MIN_OVERLAP_ROWS:
+        return None
+
+    content = ~_blank_rows(current)
+    # tail_content[d] = number of content rows in current[height - d:]
+    tail_content = np.concatenate(([0], np.cumsum(content[::-1])))
+
+    best_offset = 0
+    best_cost = None
+    for offset in range(0, height - MIN_OVERLAP_ROWS + 1):
+        cost = int(_row_mismatches(previous, current, offset).sum()) + int(tail_content[offset])
+        if best_cost is None or cost < best_cost:
+            best_offset = offset
+            best_cost = cost
+    return best_offset
+
+
+def plan_strip(previous: np.ndarray, current: np.ndarray) -> StripPlan | None:
+    """
+    Work out which bottom strip of `current` holds content that was not on
+    screen in `previous`. None means the whole crop should be read again.
+    """
+    offset = estimate_scroll_offset(previous, current)
+    if offset is None:
+        return None
+
+    height = current.shape[0]
+    mismatches = _row_mismatches(previous, current, offset)
+    changed_rows = np.flatnonzero(mismatches)
+    strip_top = int(changed_rows[0]) if changed_rows.size else height - offset
+
+    # Snap upward to a blank separator row so a bubble is never split in two.
+    blank = _blank_rows(current)
+    while 0 < strip_top < height and not blank[strip_top]:
+        strip_top -= 1
+
+    if height - strip_top > height * MAX_STRIP_RATIO:
+        return None
+    return StripPlan(scroll_offset=offset, strip_top=strip_top, crop_height=height)
+
+
+class ScrollTranscript:
+    """
+    Running transcript of the message-list crop. Between frames it tracks how
+    far the list scrolled so only the newly revealed strip has to be OCR'd;
+    earlier bubbles are carried over with their `y_center` shifted.
+    """
+
+    def __init__(self):
+        self._profile: np.ndarray | None = None
+        self._messages: list[ChatMessage] | None = None
+        self.strip_reads = 0
+        self.full_reads = 0
+
+    def plan(self, cropped_image: Image.Image) -> StripPlan | None:
+        if self._profile is None or self._messages is None:
+            return None
+        if any(m.y_center is None for m in self._messages):
+            return None
+        return plan_strip(self._profile, row_profile(cropped_image))
+
+    def merge(self, plan: StripPlan, strip: ChatFrame | str | None) -> ChatFrame | None:
+        """
+        Combine carried-over bubbles with the strip's bubbles into one frame
+        in full-crop coordinates. Returns None if the strip read is unusable.
+        """
+        if isinstance(strip, str):
+            strip = ChatFrame.decode(strip)
+        if strip is None or strip.chat_region_detected is None:
+            return None
+
+        scale = max(1, plan.crop_height - 1)
+        merged: list[ChatMessage] = []
+        for message in self._messages or []:
+            y_px = message.y_center * scale - plan.scroll_offset
+            if y_px < 0 or y_px >= plan.strip_top:
+                continue
+            merged.append(message.copy(y_center=y_px / scale))
+
+        strip_scale = max(1, plan.strip_height - 1)
+        for message in strip.messages:
+            if message.y_center is not None:
+                # The strip frame is this read's own, so its messages are moved rather than copied.
+                message.y_center = (plan.strip_top + message.y_center * strip_scale) / scale
+            merged.append(message)
+
+        return ChatFrame(merged, bool(merged))
+
+    def commit(self, cropped_image: Image.Image, corrected: ChatFrame | str | None, plan: StripPlan | None) -> None:
+        if isinstance(corrected, str):
+            corrected = ChatFrame.decode(corrected)
+        if corrected is None:
+            self.reset()
+            return
+
+        self._profile = row_profile(cropped_image)
+        self._messages = corrected.messages
+        if plan is None:
+            self.full_reads += 1
+        else:
+            self.strip_reads += 1
+
+    def reset(self) -> None:
+        self._profile = None
+        self._messages = None
@@ -1,8 +1,10 @@
-import json
 from typing import Any
 
+import numpy as np
 from PIL import Image
 
+from ..chat.models import ChatFrame, ChatMessage
+
 
 def _coerce_norm(value: Any) -> float | None:
     try:
@@ -14,82 +16,76 @@ def _coerce_norm(value: Any) -> float | None:
     return None
 
 
-def _is_dark(pixel: tuple[int, int, int]) -> bool:
-    r, g, b = pixel
-    return r < 120 and g < 120 and b < 120
-
+DARK_THRESHOLD = 120
+PROBE_HALF_HEIGHT = 10
+LANE_HALF_WIDTH = 6
 
-def _edge_scores(image: Image.Image, y_center_norm: float) -> tuple[int, int]:
-    img = image.convert("RGB")
-    width, height = img.size
-    px = img.load()
 
-    y_center = int(y_center_norm * (height - 1))
-    y0 = max(0, y_center - 10)
-    y1 = min(height - 1, y_center + 10)
+def _dark_integral(image: Image.Image) -> np.ndarray:
+    """
+    Summed-area table of the dark-pixel mask, padded with a leading zero row
+    and column so any box sum is four lookups.
+    """
+    rgb = np.asarray(image.convert("RGB"))
+    dark = (rgb.max(axis=2) < DARK_THRESHOLD).astype(np.int32)
+    integral = np.zeros((dark.shape[0] + 1, dark.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(dark, axis=0), axis=1, out=integral[1:, 1:])
+    return integral
 
-    left_score = 0
-    right_score = 0
 
-    left_x_end = min(width - 1, int(width * 0.07))
-    right_x_start = max(0, int(width * 0.93))
+def _box_sums(
+    integral: np.ndarray, x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray
+) -> np.ndarray:
+    """Dark pixel counts for inclusive boxes [x0, x1] x [y0, y1], one per row."""
+    return (
+        integral[y1 + 1, x1 + 1]
+        - integral[y0, x1 + 1]
+        - integral[y1 + 1, x0]
+        + integral[y0, x0]
+    )
 
-    for y in range(y0, y1 + 1):
-        for x in range(0, left_x_end + 1):
-            if _is_dark(px[x, y]):
-                left_score += 1
-        for x in range(right_x_start, width):
-            if _is_dark(px[x, y]):
-                right_score += 1
 
-    return left_score, right_score
+def _probe_rows(integral: np.ndarray, y_center_norms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    height = integral.shape[0] - 1
+    y_centers = (y_center_norms * (height - 1)).astype(np.int64)
+    y0 = np.maximum(0, y_centers - PROBE_HALF_HEIGHT)
+    y1 = np.minimum(height - 1, y_centers + PROBE_HALF_HEIGHT)
+    return y0, y1
 
 
-def _lane_scores(image: Image.Image, y_center_norm: float, left_lane_norm: float, right_lane_norm: float) -> tuple[int, int]:
-    img = image.convert("RGB")
-    width, height = img.size
-    px = img.load()
+def _edge_scores(integral: np.ndarray, y_center_norms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    width = integral.shape[1] - 1
+    y0, y1 = _probe_rows(integral, y_center_norms)
 
-    y_center = int(y_center_norm * (height - 1))
-    y0 = max(0, y_center - 10)
-    y1 = min(height - 1, y_center + 10)
-
-    left_x = max(0, min(width - 1, int(left_lane_norm * (width - 1))))
-    right_x = max(0, min(width - 1, int(right_lane_norm * (width - 1))))
-
-    left_score = 0
-    right_score = 0
-    x_band = 6
-    for y in range(y0, y1 + 1):
-        for x in range(max(0, left_x - x_band), min(width, left_x + x_band + 1)):
-            if _is_dark(px[x, y]):
-                left_score += 1
-        for x in range(max(0, right_x - x_band), min(width, right_x + x_band + 1)):
-            if _is_dark(px[x, y]):
-                right_score += 1
+    left_x_end = min(width - 1, int(width * 0.07))
+    right_x_start = max(0, int(width * 0.93))
+    zeros = np.zeros_like(y0)
 
-    return left_score, right_score
+    left = _box_sums(integral, zeros, y0, zeros + left_x_end, y1)
+    right = _box_sums(integral, zeros + right_x_start, y0, zeros + width - 1, y1)
+    return left, right
 
 
-def _normalize_side(side: Any) -> str:
-    if isinstance(side, str):
-        lowered = side.strip().lower()
-        if lowered in {"left", "right", "unknown"}:
-            return lowered
-    return "unknown"
+def _lane_scores(
+    integral: np.ndarray, y_center_norms: np.ndarray, left_lane_norm: float, right_lane_norm: float
+) -> tuple[np.ndarray, np.ndarray]:
+    width = integral.shape[1] - 1
+    y0, y1 = _probe_rows(integral, y_center_norms)
+    zeros = np.zeros_like(y0)
 
+    def lane(lane_norm: float) -> np.ndarray:
+        x = max(0, min(width - 1, int(lane_norm * (width - 1))))
+        x0 = max(0, x - LANE_HALF_WIDTH)
+        x1 = min(width - 1, x + LANE_HALF_WIDTH)
+        return _box_sums(integral, zeros + x0, y0, zeros + x1, y1)
 
-def _coerce_messages(payload: dict[str, Any]) -> list[dict[str, Any]]:
-    messages = payload.get("messages")
-    if not isinstance(messages, list):
-        return []
-    return [m for m in messages if isinstance(m, dict)]
+    return lane(left_lane_norm), lane(right_lane_norm)
 
 
-def _classify_with_split(message: dict[str, Any], split_norm: float) -> str | None:
-    x_min = _coerce_norm(message.get("x_min"))
-    x_max = _coerce_norm(message.get("x_max"))
-    x_center = _coerce_norm(message.get("x_center"))
+def _classify_with_split(message: ChatMessage, split_norm: float) -> str | None:
+    x_min = message.x_min
+    x_max = message.x_max
+    x_center = message.x_center
 
     if x_min is not None and x_max is not None:
         if x_max <= split_norm:
@@ -107,54 +103,57 @@ def _classify_with_split(message: dict[str, Any], split_norm: float) -> str | No
     return None
 
 
-def correct_message_sides(
-    raw_payload: str,
+def correct_frame_sides(
+    frame: ChatFrame,
     cropped_image: Image.Image,
     classifier_hints: dict[str, float] | None = None,
-) -> str:
-    try:
-        payload = json.loads(raw_payload)
-    except json.JSONDecodeError:
-        return raw_payload
-
-    if not isinstance(payload, dict):
-        return raw_payload
-
-    messages = _coerce_messages(payload)
+) -> ChatFrame:
+    """Set each message's side from the crop's lane split and dark-pixel evidence. Updates `frame` in place."""
+    messages = frame.messages
     if not messages:
-        return raw_payload
+        return frame
 
-    corrected = []
-    for message in messages:
-        side = _normalize_side(message.get("side"))
-        hints = classifier_hints or {}
+    hints = classifier_hints or {}
+    split_norm = _coerce_norm(hints.get("split_norm"))
+    left_lane_norm = _coerce_norm(hints.get("left_lane_norm"))
+    right_lane_norm = _coerce_norm(hints.get("right_lane_norm"))
 
-        split_norm = _coerce_norm(hints.get("split_norm"))
-        split_side = None
+    sides = []
+    for message in messages:
+        side = message.side
         if split_norm is not None:
-            split_side = _classify_with_split(message, split_norm)
-        if split_side:
-            side = split_side
-
-        y_center = _coerce_norm(message.get("y_center"))
-        if y_center is not None:
-            left_lane_norm = _coerce_norm(hints.get("left_lane_norm"))
-            right_lane_norm = _coerce_norm(hints.get("right_lane_norm"))
-            if left_lane_norm is not None and right_lane_norm is not None:
-                left_score, right_score = _lane_scores(cropped_image, y_center, left_lane_norm, right_lane_norm)
-            else:
-                left_score, right_score = _edge_scores(cropped_image, y_center)
-
+            side = _classify_with_split(message, split_norm) or side
+        sides.append(side)
+
+    # Score every message with a y_center in one pass over a shared integral image.
+    probed = [(idx, message.y_center) for idx, message in enumerate(messages) if message.y_center is not None]
+    if probed:
+        integral = _dark_integral(cropped_image)
+        y_centers = np.array([y for _, y in probed], dtype=np.float64)
+        if left_lane_norm is not None and right_lane_norm is not None:
+            left_scores, right_scores = _lane_scores(integral, y_centers, left_lane_norm, right_lane_norm)
+        else:
+            left_scores, right_scores = _edge_scores(integral, y_centers)
+
+        for (idx, _), left_score, right_score in zip(probed, left_scores.tolist(), right_scores.tolist()):
             # Strong visual evidence near lane anchors can override unreliable model geometry.
             if right_score > left_score * 1.25 and right_score > 12:
-                side = "right"
+                sides[idx] = "right"
             elif left_score > right_score * 1.25 and left_score > 12:
-                side = "left"
+                sides[idx] = "left"
+
+    for message, side in zip(messages, sides):
+        message.side = side
+    return frame
 
-        next_message = dict(message)
-        next_message["side"] = side
-        corrected.append(next_message)
 
-    next_payload = dict(payload)
-    next_payload["messages"] = corrected
-    return json.dumps(next_payload, ensure_ascii=False)
+def correct_message_sides(
+    raw_payload: str,
+    cropped_image: Image.Image,
+    classifier_hints: dict[str, float] | None = None,
+) -> str:
+    """`correct_frame_sides` for a JSON payload; text that is not a payload with messages is returned as is."""
+    frame = ChatFrame.decode(raw_payload)
+    if frame is None or not frame.messages:
+        return raw_payload
+    return correct_frame_sides(frame, cropped_image, classifier_hints).to_json()
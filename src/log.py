@@ -1,13 +1,184 @@
-import inspect
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import TextIO
 
 """
 Website: https://github.com/novadevvvv
 Dependencies: None
 Path: "src/"
+
+Levelled logging for the bot. Disabled levels return before touching the
+stack; enabled records grab the caller with `sys._getframe` and are handed to
+a background thread, so the hot path never waits on console or file I/O.
+
+Environment:
+- HEARTOPIA_LOG_LEVEL: DEBUG, INFO (default), WARNING or ERROR
+- HEARTOPIA_LOG_JSON=1: write JSON lines instead of `[ module ] : text`
+- HEARTOPIA_LOG_FILE: append to this file instead of stdout
 """
 
-def log(text: str):
-    caller_file = inspect.stack()[1].filename
-    file_name = Path(caller_file).stem
-    print(f"[ {file_name} ] : {text}")
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+_STOP = object()
+
+
+def _level_from_env() -> int:
+    name = (os.getenv("HEARTOPIA_LOG_LEVEL") or "INFO").strip().upper()
+    return _LEVELS_BY_NAME.get(name, INFO)
+
+
+_level = _level_from_env()
+_json_lines = os.getenv("HEARTOPIA_LOG_JSON") == "1"
+_stream: TextIO | None = None
+_log_file = os.getenv("HEARTOPIA_LOG_FILE")
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+_stems: dict[str, str] = {}
+
+
+def _format(record: tuple[float, int, str, int, str]) -> str:
+    created, level, module, line, text = record
+    if _json_lines:
+        return json.dumps(
+            {
+                "ts": round(created, 6),
+                "level": LEVEL_NAMES.get(level, str(level)),
+                "module": module,
+                "line": line,
+                "msg": text,
+            },
+            ensure_ascii=False,
+        )
+    return f"[ {module} ] : {text}"
+
+
+def _write_loop() -> None:
+    out = _stream
+    owned = None
+    if out is None and _log_file:
+        owned = out = open(_log_file, "a", encoding="utf-8")
+    while True:
+        record = _queue.get()
+        if record is _STOP:
+            break
+        if isinstance(record, threading.Event):
+            (out or sys.stdout).flush()
+            record.set()
+            continue
+        print(_format(record), file=out or sys.stdout)
+    if owned is not None:
+        owned.close()
+    else:
+        (out or sys.stdout).flush()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="heartopia-log", daemon=True)
+            _writer.start()
+
+
+def _caller_stem(filename: str) -> str:
+    stem = _stems.get(filename)
+    if stem is None:
+        stem = _stems[filename] = Path(filename).stem
+    return stem
+
+
+def _emit(level: int, text: str) -> None:
+    # Two frames up: past _emit and the public helper to the real caller.
+    frame = sys._getframe(2)
+    _ensure_writer()
+    _queue.put((time.time(), level, _caller_stem(frame.f_code.co_filename), frame.f_lineno, str(text)))
+
+
+def is_enabled(level: int) -> bool:
+    return level >= _level
+
+
+def log(text: str, level: int = INFO):
+    if level < _level:
+        return
+    _emit(level, text)
+
+
+def debug(text: str) -> None:
+    if DEBUG < _level:
+        return
+    _emit(DEBUG, text)
+
+
+def warning(text: str) -> None:
+    if WARNING < _level:
+        return
+    _emit(WARNING, text)
+
+
+def error(text: str) -> None:
+    if ERROR < _level:
+        return
+    _emit(ERROR, text)
+
+
+def flush(timeout: float = 2.0) -> None:
+    """Block until every record queued so far has been written."""
+    if _writer is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+_KEEP = object()
+
+
+def configure(
+    level: int | str | None = None,
+    json_lines: bool | None = None,
+    stream: TextIO | None = _KEEP,
+    log_file: str | None = _KEEP,
+) -> None:
+    """
+    Change logging settings at runtime; pending records are flushed first.
+    `stream=None` and `log_file=None` go back to stdout.
+    """
+    global _level, _json_lines, _stream, _log_file
+    shutdown()
+    if level is not None:
+        _level = _LEVELS_BY_NAME.get(level.upper(), INFO) if isinstance(level, str) else level
+    if json_lines is not None:
+        _json_lines = json_lines
+    if stream is not _KEEP:
+        _stream = stream
+    if log_file is not _KEEP:
+        _log_file = log_file
+
+
+def shutdown(timeout: float = 2.0) -> None:
+    global _writer
+    if _writer is None:
+        return
+    _queue.put(_STOP)
+    _writer.join(timeout)
+    _writer = None
+
+
+atexit.register(shutdown)
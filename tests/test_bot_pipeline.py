@@ -0,0 +1,283 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from src.bot import BotPipeline, BotState, run_serial
+from src.heartopia.capture import CaptureExhausted
+
+
+def _payload(*messages: tuple[str, str, str]) -> str:
+    return json.dumps(
+        {
+            "chat_region_detected": True,
+            "messages": [{"side": side, "user": user, "message": text} for side, user, text in messages],
+        }
+    )
+
+
+FRAMES = [
+    _payload(("left", "Irin", "hi")),
+    _payload(("left", "Irin", "hi"), ("right", "unknown", "re: hi")),
+    _payload(("left", "Irin", "hi"), ("right", "unknown", "re: hi"), ("left", "Bo", "wyd")),
+]
+
+
+def _respond(prompt, context, conversation_messages=None):
+    return {"choices": [{"message": {"content": f"re: {prompt}"}}]}
+
+
+def _stream_respond(prompt, context, conversation_messages=None):
+    yield "re:"
+    yield f" {prompt}"
+
+
+def _replay(frames, reads):
+    """A capture that runs out after `frames`, like a replay without looping."""
+    frames = iter(frames)
+
+    def capture():
+        reads.append(1)
+        try:
+            return next(frames)
+        except StopIteration:
+            raise CaptureExhausted("replay is exhausted") from None
+
+    return capture
+
+
+class TestBotLoops(unittest.TestCase):
+    def test_serial_loop_replies_once_per_new_message(self):
+        frames = iter(FRAMES)
+        sent = []
+
+        state = run_serial(lambda: next(frames), _respond, sent.append, interval=0, max_cycles=len(FRAMES))
+
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+        self.assertIn("re: hi", state.ai_message_history)
+
+    def test_pipeline_matches_serial_replies(self):
+        frames = iter(FRAMES)
+        sent = []
+        pipeline = BotPipeline(
+            capture_frame=lambda: next(frames),
+            read_frame=lambda frame: frame,
+            respond=_respond,
+            send_chat=sent.append,
+            interval=0,
+        )
+
+        state = asyncio.run(pipeline.run(max_frames=len(FRAMES)))
+
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+        self.assertEqual(state.player_context, {("Irin", "hi"), ("Bo", "wyd")})
+
+    def test_pipeline_never_overlaps_capture_and_send(self):
+        frames = iter(FRAMES * 3)
+        busy = threading.Lock()
+        overlaps = []
+
+        def exclusive(action):
+            def run(*args):
+                if not busy.acquire(blocking=False):
+                    overlaps.append(action)
+                    return action(*args)
+                try:
+                    time.sleep(0.005)
+                    return action(*args)
+                finally:
+                    busy.release()
+            return run
+
+        sent = []
+        pipeline = BotPipeline(
+            capture_frame=exclusive(lambda: next(frames)),
+            read_frame=lambda frame: frame,
+            respond=_respond,
+            send_chat=exclusive(sent.append),
+            interval=0,
+        )
+        asyncio.run(pipeline.run(max_frames=len(FRAMES) * 3))
+
+        self.assertEqual(overlaps, [])
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+
+    def test_pipeline_survives_generation_errors(self):
+        frames = iter(FRAMES)
+        sent = []
+
+        def flaky(prompt, context, conversation_messages=None):
+            if prompt == "hi":
+                raise RuntimeError("boom")
+            return _respond(prompt, context, conversation_messages)
+
+        pipeline = BotPipeline(lambda: next(frames), lambda f: f, flaky, sent.append, state=BotState(), interval=0)
+        asyncio.run(pipeline.run(max_frames=len(FRAMES)))
+
+        self.assertEqual(sent, ["re: wyd"])
+
+    def test_serial_loop_stops_when_the_replay_is_exhausted(self):
+        reads, sent = [], []
+
+        run_serial(_replay(FRAMES, reads), _respond, sent.append, interval=0, max_cycles=len(FRAMES) + 5)
+
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+        self.assertEqual(len(reads), len(FRAMES) + 1)
+
+    def test_pipeline_stops_when_the_replay_is_exhausted(self):
+        reads, sent = [], []
+        pipeline = BotPipeline(_replay(FRAMES, reads), lambda f: f, _respond, sent.append, interval=0)
+
+        asyncio.run(pipeline.run(max_frames=len(FRAMES) + 5))
+
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+        self.assertEqual(len(reads), len(FRAMES) + 1)
+
+    def test_serial_loop_streams_packets(self):
+        frames = iter(FRAMES)
+        sent_packets = []
+
+        def send_packets(packets):
+            sent = list(packets)
+            sent_packets.append(sent)
+            return sent
+
+        state = run_serial(
+            lambda: next(frames),
+            _respond,
+            lambda text: self.fail("send_chat should not be used when streaming"),
+            interval=0,
+            max_cycles=len(FRAMES),
+            stream_respond=_stream_respond,
+            send_packets=send_packets,
+        )
+
+        self.assertEqual(sent_packets, [["re: hi"], ["re: wyd"]])
+        self.assertIn("re: wyd", state.ai_message_history)
+
+    def test_pipeline_streams_packets(self):
+        frames = iter(FRAMES)
+        sent_packets = []
+
+        def send_packets(packets):
+            sent = list(packets)
+            sent_packets.append(sent)
+            return sent
+
+        pipeline = BotPipeline(
+            lambda: next(frames),
+            lambda f: f,
+            _respond,
+            lambda text: self.fail("send_chat should not be used when streaming"),
+            interval=0,
+            stream_respond=_stream_respond,
+            send_packets=send_packets,
+        )
+        asyncio.run(pipeline.run(max_frames=len(FRAMES)))
+
+        self.assertEqual(sent_packets, [["re: hi"], ["re: wyd"]])
+
+
+BURST = _payload(*[("left", f"Player{idx}", f"msg {idx}") for idx in range(6)])
+
+
+class SlowModel:
+    """Replies after a delay that shrinks with each message, so later calls finish first."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, prompt, context, conversation_messages=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.06 - 0.01 * int(prompt.split()[-1]))
+        with self.lock:
+            self.active -= 1
+        return _respond(prompt, context, conversation_messages)
+
+
+class TestConcurrentReplies(unittest.TestCase):
+    expected = [f"re: msg {idx}" for idx in range(6)]
+
+    def test_serial_loop_generates_concurrently_and_sends_in_chat_order(self):
+        model = SlowModel()
+        sent = []
+
+        started = time.perf_counter()
+        run_serial(lambda: BURST, model, sent.append, interval=0, max_cycles=1, reply_concurrency=3)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(sent, self.expected)
+        self.assertEqual(model.peak, 3)
+        self.assertLess(elapsed, 0.21)  # 0.21s one at a time
+
+    def test_serial_loop_without_concurrency_is_sequential(self):
+        model = SlowModel()
+        sent = []
+
+        run_serial(lambda: BURST, model, sent.append, interval=0, max_cycles=1, reply_concurrency=1)
+
+        self.assertEqual(sent, self.expected)
+        self.assertEqual(model.peak, 1)
+
+    def test_pipeline_bounds_concurrency_and_keeps_order(self):
+        model = SlowModel()
+        sent = []
+        pipeline = BotPipeline(
+            lambda: BURST, lambda f: f, model, sent.append, interval=0, queue_size=8, reply_concurrency=2
+        )
+
+        asyncio.run(pipeline.run(max_frames=1))
+
+        self.assertEqual(sent, self.expected)
+        self.assertEqual(model.peak, 2)
+
+
+class StreamingRead:
+    """
+    A vision read that hands over its first message, then waits for the reply
+    to it to be generated before it finishes, as a slow model reading the
+    rest of the panel would.
+    """
+
+    def __init__(self):
+        self.generating = threading.Event()
+
+    def respond(self, prompt, context, conversation_messages=None):
+        self.generating.set()
+        return _respond(prompt, context, conversation_messages)
+
+    def __call__(self, frame=None, on_message=None):
+        on_message({"side": "left", "user": "Irin", "message": "hi"})
+        on_message({"side": "right", "user": "unknown", "message": "hello"})
+        self.overlapped = self.generating.wait(timeout=2)
+        return _payload(("left", "Irin", "hi"), ("right", "unknown", "hello"), ("left", "Bo", "wyd"))
+
+
+class TestStreamedVision(unittest.TestCase):
+    def test_serial_loop_starts_replies_during_the_read(self):
+        read = StreamingRead()
+        sent = []
+
+        run_serial(read, read.respond, sent.append, interval=0, max_cycles=1, stream_vision=True)
+
+        self.assertTrue(read.overlapped)
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+
+    def test_pipeline_queues_messages_during_the_read(self):
+        read = StreamingRead()
+        sent = []
+        pipeline = BotPipeline(lambda: "frame", read, read.respond, sent.append, interval=0, stream_vision=True)
+
+        asyncio.run(pipeline.run(max_frames=1))
+
+        self.assertTrue(read.overlapped)
+        self.assertEqual(sent, ["re: hi", "re: wyd"])
+
+
+if __name__ == "__main__":
+    unittest.main()
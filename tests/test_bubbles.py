@@ -0,0 +1,215 @@
+import json
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.ai import groq
+from src.ai.backends import ChatBackend
+from src.heartopia.bubbles import apply_bubble_geometry, connected_components, segment_bubbles
+from src.heartopia.chat_preprocess import prepare_chat_message_list
+
+FIXTURE_DIR = Path("tests/fixtures/screenshots")
+BACKGROUND = (250, 247, 244)
+FILL = (255, 252, 247)
+
+
+def _mk_chat_image() -> Image.Image:
+    img = Image.new("RGB", (300, 200), BACKGROUND)
+    d = ImageDraw.Draw(img)
+    d.ellipse((4, 20, 24, 40), fill=(230, 140, 150))  # Avatar beside the left bubble
+    d.rounded_rectangle((30, 20, 180, 60), radius=8, fill=FILL, outline=(200, 196, 190))
+    d.text((40, 32), "hi there", fill=(230, 160, 90))
+    d.rounded_rectangle((160, 110, 295, 140), radius=8, fill=FILL, outline=(70, 66, 62))
+    d.text((170, 118), "hey", fill=(70, 66, 62))
+    return img
+
+
+class TestConnectedComponents(unittest.TestCase):
+    def test_labels_shapes_that_meet_lower_down(self):
+        mask = np.array(
+            [
+                [1, 0, 1, 0],
+                [1, 0, 1, 0],
+                [1, 1, 1, 0],
+                [0, 0, 0, 1],
+            ],
+            dtype=bool,
+        )
+        boxes = sorted(connected_components(mask))
+        self.assertEqual(boxes, [(0, 0, 3, 3, 7), (3, 3, 4, 4, 1)])
+
+
+class TestBubbleSegmentation(unittest.TestCase):
+    def test_finds_bubbles_sides_and_avatar(self):
+        bubbles = segment_bubbles(_mk_chat_image())
+
+        self.assertEqual([b.side for b in bubbles], ["left", "right"])
+        left, right = bubbles
+        self.assertLessEqual(abs(left.x0 - 31), 2)
+        self.assertLessEqual(abs(right.x1 - 295), 2)
+        self.assertIsNotNone(left.avatar)
+        self.assertIsNone(right.avatar)
+
+    def test_matches_fixture_bubble_counts_and_sides(self):
+        manifest = json.loads((FIXTURE_DIR / "manifest.json").read_text(encoding="utf-8"))
+        for case in manifest["cases"]:
+            with self.subTest(case=case["name"]):
+                cropped, hints = prepare_chat_message_list(str(FIXTURE_DIR / case["image"]))
+                bubbles = segment_bubbles(cropped, hints)
+                expected = case["expected"]
+                self.assertEqual(len(bubbles), expected["exact_message_count"])
+                self.assertEqual([b.side for b in bubbles], [m["side"] for m in expected["messages"]])
+
+    def test_geometry_replaces_model_guesses_only_when_counts_agree(self):
+        img = _mk_chat_image()
+        bubbles = segment_bubbles(img)
+        raw = json.dumps(
+            {
+                "chat_region_detected": True,
+                "messages": [
+                    {"user": "Irin", "message": "hi there", "side": "right", "x_center": 0.9},
+                    {"user": "unknown", "message": "hey"},
+                ],
+            }
+        )
+
+        placed = json.loads(apply_bubble_geometry(raw, bubbles, *img.size))
+
+        self.assertEqual([m["side"] for m in placed["messages"]], ["left", "right"])
+        self.assertLess(placed["messages"][0]["x_center"], 0.5)
+        self.assertAlmostEqual(placed["messages"][1]["y_center"], 124.5 / 199, places=1)
+        self.assertIsNone(apply_bubble_geometry(raw, bubbles[:1], *img.size))
+
+
+class TextOnlyBackend(ChatBackend):
+    def __init__(self):
+        self.prompts = []
+
+    def complete(self, model, messages, **options):
+        self.prompts.append(messages[0]["content"])
+        content = {"chat_region_detected": True, "messages": [{"user": "Irin", "message": "LOL DID U TRY"}] * 3}
+        return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+
+class TestTextOnlyVisionRead(unittest.TestCase):
+    def setUp(self):
+        self.backend = TextOnlyBackend()
+        groq.set_backend(self.backend)
+
+    def tearDown(self):
+        groq.set_backend(None)
+
+    def test_text_only_read_gets_local_geometry(self):
+        with mock.patch.dict("os.environ", {groq.TEXT_ONLY_ENV: "1"}):
+            payload = json.loads(groq.imageToText(str(FIXTURE_DIR / "image (2) (1).png"), use_history=False))
+
+        self.assertEqual(self.backend.prompts, [groq.TEXT_ONLY_PROMPT])
+        self.assertEqual([m["side"] for m in payload["messages"]], ["left"] * 3)
+        self.assertTrue(all("y_center" in m for m in payload["messages"]))
+
+    def test_unchanged_frame_is_not_segmented_again(self):
+        groq.reset_vision_history()
+        self.addCleanup(groq.reset_vision_history)
+        image = str(FIXTURE_DIR / "image (2) (1).png")
+        with mock.patch("src.heartopia.bubbles.segment_bubbles", wraps=segment_bubbles) as segment:
+            first = groq.read_chat_frame(image)
+            second = groq.read_chat_frame(image)
+
+        self.assertIs(second, first)
+        self.assertEqual(segment.call_count, 1)
+        self.assertEqual(len(self.backend.prompts), 1)
+
+
+class ChunkedVisionBackend(ChatBackend):
+    """Streams the vision payload a few characters at a time, noting how much was sent before the first message."""
+
+    def __init__(self, seen):
+        self.seen = seen
+        self.chunks_before_first_message = None
+        self.chunks = 0
+        self.calls = 0
+
+    def texts(self) -> tuple[str, ...]:
+        self.calls += 1
+        return ("a", "b", "c")
+
+    def check(self, sent: str) -> None:
+        pass
+
+    def complete(self, model, messages, **options):
+        return {"choices": [{"message": {"content": "".join(self.stream(model, messages, **options))}}]}
+
+    def stream(self, model, messages, **options):
+        content = json.dumps(
+            {"chat_region_detected": True, "messages": [{"user": "Irin", "message": text} for text in self.texts()]}
+        )
+        for index in range(0, len(content), 7):
+            self.check(content[:index])
+            if self.seen and self.chunks_before_first_message is None:
+                self.chunks_before_first_message = self.chunks
+            self.chunks += 1
+            yield content[index : index + 7]
+
+
+class FailingVisionBackend(ChunkedVisionBackend):
+    """The first stream dies after two messages; the second streams the whole payload."""
+
+    def check(self, sent: str) -> None:
+        if self.calls == 1 and sent.count("}") == 2:
+            raise ConnectionError("stream reset")
+
+
+class ShortTextOnlyBackend(ChunkedVisionBackend):
+    """The text-only read misses the last bubble, so the full read follows it."""
+
+    def texts(self) -> tuple[str, ...]:
+        self.calls += 1
+        return ("a", "b") if self.calls == 1 else ("a", "b", "c")
+
+
+class TestStreamedVisionRead(unittest.TestCase):
+    def setUp(self):
+        self.seen = []
+        self.backend = ChunkedVisionBackend(self.seen)
+        groq.set_backend(self.backend)
+
+    def tearDown(self):
+        groq.set_backend(None)
+
+    def test_messages_arrive_mid_stream_with_local_geometry(self):
+        payload = json.loads(
+            groq.imageToText(str(FIXTURE_DIR / "image (2) (1).png"), use_history=False, on_message=self.seen.append)
+        )
+
+        self.assertEqual([m.message for m in self.seen], ["a", "b", "c"])
+        self.assertEqual([m.side for m in self.seen], ["left"] * 3)
+        self.assertLess(self.backend.chunks_before_first_message, self.backend.chunks - 1)  # Before the end
+        self.assertEqual([m["y_center"] for m in payload["messages"]], [m.y_center for m in self.seen])
+
+    def _read_with(self, backend: ChunkedVisionBackend, **env) -> dict:
+        groq.set_backend(backend)
+        with mock.patch.dict("os.environ", env):
+            return json.loads(
+                groq.imageToText(str(FIXTURE_DIR / "image (2) (1).png"), use_history=False, on_message=self.seen.append)
+            )
+
+    def test_failover_after_a_broken_stream_delivers_each_message_once(self):
+        env = {"HEARTOPIA_VISION_MODELS": "vision-a,vision-b"}
+        with mock.patch.object(groq, "_router", None):
+            payload = self._read_with(FailingVisionBackend(self.seen), **env)
+
+        self.assertEqual([m.message for m in self.seen], ["a", "b", "c"])
+        self.assertEqual([m["y_center"] for m in payload["messages"]], [m.y_center for m in self.seen])
+
+    def test_full_read_after_text_only_read_delivers_each_message_once(self):
+        payload = self._read_with(ShortTextOnlyBackend(self.seen), HEARTOPIA_VISION_TEXT_ONLY="1")
+
+        self.assertEqual([m.message for m in self.seen], ["a", "b", "c"])
+        self.assertEqual([m["y_center"] for m in payload["messages"]], [m.y_center for m in self.seen])
+
+
+if __name__ == "__main__":
+    unittest.main()
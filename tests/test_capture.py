@@ -0,0 +1,105 @@
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from PIL import Image
+
+from src.heartopia import interfacing
+from src.heartopia.capture import (
+    CaptureBackend,
+    CaptureExhausted,
+    FrameRingBuffer,
+    ReplayCapture,
+    create_capture_backend,
+)
+
+
+def _write_frames(directory: Path, count: int) -> list[Path]:
+    paths = []
+    for idx in range(count):
+        path = directory / f"frame_{idx:03d}.png"
+        Image.new("RGB", (40, 30), (idx * 40, 0, 0)).save(path)
+        paths.append(path)
+    return paths
+
+
+class TestReplayCapture(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def test_replays_directory_in_name_order(self):
+        _write_frames(self.dir, 3)
+        capture = ReplayCapture(self.dir)
+
+        reds = [capture.grab((0, 0, 40, 30)).getpixel((0, 0))[0] for _ in range(3)]
+        self.assertEqual(reds, [0, 40, 80])
+        with self.assertRaises(CaptureExhausted):
+            capture.grab((0, 0, 40, 30))
+
+    def test_replays_zip_archive_and_loops(self):
+        frames = _write_frames(self.dir, 2)
+        archive = self.dir / "session.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            for path in frames:
+                zf.write(path, arcname=f"frames/{path.name}")
+
+        capture = ReplayCapture(archive, loop=True)
+        reds = [capture.grab((0, 0, 40, 30)).getpixel((0, 0))[0] for _ in range(3)]
+        capture.close()
+        self.assertEqual(reds, [0, 40, 0])
+
+    def test_rejects_empty_source(self):
+        with self.assertRaises(ValueError):
+            ReplayCapture(self.dir)
+
+    def test_unknown_backend_name(self):
+        with self.assertRaises(ValueError):
+            create_capture_backend("nope")
+
+    def test_backend_without_grab_fails_when_created(self):
+        class NoGrab(CaptureBackend):
+            name = "no-grab"
+
+        with self.assertRaises(TypeError):
+            NoGrab()
+
+
+class TestFrameRingBuffer(unittest.TestCase):
+    def test_keeps_latest_frames_oldest_first(self):
+        buffer = FrameRingBuffer(capacity=3)
+        frames = [Image.new("L", (1, 1), idx) for idx in range(5)]
+        for idx, frame in enumerate(frames):
+            buffer.push(frame, captured_at=float(idx))
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.total, 5)
+        self.assertIs(buffer.latest(), frames[-1])
+        self.assertEqual([t for t, _ in buffer.frames()], [2.0, 3.0, 4.0])
+
+    def test_empty_buffer(self):
+        buffer = FrameRingBuffer(capacity=2)
+        self.assertIsNone(buffer.latest())
+        self.assertEqual(buffer.frames(), [])
+
+
+class TestCaptureChatHeadless(unittest.TestCase):
+    def test_capture_chat_with_replay_needs_no_ui(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        _write_frames(Path(tmp.name), 2)
+
+        interfacing.setCaptureBackend(ReplayCapture(tmp.name))
+        self.addCleanup(interfacing.setCaptureBackend, None)
+
+        frame = interfacing.captureChat()
+
+        self.assertEqual(frame.size, (40, 30))
+        self.assertIs(interfacing.frameBuffer.latest(), frame)
+        self.assertFalse(interfacing.chatOpen)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from PIL import Image, ImageDraw
+
+from src.heartopia.change_detection import FrameChangeCache
+
+
+def _mk_chat_image(extra_bubble: bool = False) -> Image.Image:
+    img = Image.new("RGB", (460, 340), (236, 231, 226))
+    d = ImageDraw.Draw(img)
+    d.rounded_rectangle((20, 30, 220, 70), radius=8, fill=(255, 255, 255))
+    d.text((30, 42), "hey there", fill=(40, 40, 40))
+    if extra_bubble:
+        d.rounded_rectangle((240, 260, 440, 300), radius=8, fill=(255, 214, 120))
+        d.text((250, 272), "yo", fill=(40, 40, 40))
+    return img
+
+
+class TestFrameChangeCache(unittest.TestCase):
+    def test_first_frame_is_a_miss(self):
+        cache = FrameChangeCache()
+        self.assertIsNone(cache.lookup(_mk_chat_image()))
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "saved_calls": 0})
+
+    def test_unchanged_frame_reuses_payload(self):
+        cache = FrameChangeCache()
+        cache.lookup(_mk_chat_image())
+        cache.store('{"messages": []}')
+
+        self.assertEqual(cache.lookup(_mk_chat_image()), '{"messages": []}')
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "saved_calls": 1})
+
+    def test_sensor_noise_does_not_count_as_change(self):
+        cache = FrameChangeCache()
+        cache.lookup(_mk_chat_image())
+        cache.store("payload")
+
+        noisy = _mk_chat_image()
+        noisy.putpixel((100, 100), (0, 0, 0))
+        self.assertEqual(cache.lookup(noisy), "payload")
+
+    def test_new_bubble_invalidates_payload(self):
+        cache = FrameChangeCache()
+        cache.lookup(_mk_chat_image())
+        cache.store("payload")
+
+        self.assertIsNone(cache.lookup(_mk_chat_image(extra_bubble=True)))
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.saved_calls, 0)
+
+    def test_unchanged_frame_without_payload_is_not_saved(self):
+        cache = FrameChangeCache()
+        cache.lookup(_mk_chat_image())
+        cache.store(None)
+
+        self.assertIsNone(cache.lookup(_mk_chat_image()))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "saved_calls": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,15 @@
 import unittest
 
+from src.chat.models import ChatFrame, ChatMessage
 from src.chat.parsing import (
+    MessageStreamDecoder,
     build_llm_role_messages,
     get_inbound_player_messages,
     get_messages_not_from_ai_history,
+    inbound_messages,
+    inbound_player_message,
     normalize_text_for_history,
+    parse_chat_frame,
     parse_chat_payload,
 )
 
@@ -172,5 +177,69 @@ class TestChatParsing(unittest.TestCase):
         )
 
 
+class TestChatFrame(unittest.TestCase):
+    def test_decodes_once_and_keeps_geometry(self):
+        frame = ChatFrame.decode(
+            '{"chat_region_detected": true, "messages": [{"side": "LEFT", "user": " Irin ", "message": "hi",'
+            ' "x_center": 0.2, "y_center": 7}, "junk",],}'
+        )
+
+        self.assertEqual(len(frame.messages), 1)
+        message = frame.messages[0]
+        self.assertEqual((message.side, message.user, message.x_center, message.y_center), ("left", "Irin", 0.2, None))
+        self.assertEqual(ChatFrame.from_payload(frame.to_payload()), frame)
+        self.assertIsNone(ChatFrame.decode("no json here"))
+
+    def test_parse_chat_frame_normalizes_without_touching_the_input(self):
+        frame = ChatFrame([ChatMessage("yo", "", "unknown", x_center=0.9), ChatMessage("hey", "", "left")])
+
+        parsed = parse_chat_frame(frame)
+
+        self.assertEqual([(m.side, m.user) for m in parsed.messages], [("right", "ai"), ("left", "player")])
+        self.assertEqual(frame.messages[0].side, "unknown")
+        self.assertTrue(parsed.detected)
+        self.assertEqual(inbound_messages(parsed), [ChatMessage("hey", "player", "left")])
+        self.assertEqual(parse_chat_payload(frame), parsed.to_payload())
+
+
+class TestMessageStreamDecoder(unittest.TestCase):
+    payload = (
+        '```json\n{"chat_region_detected": true, "other": [{"x": 1}], "messages": ['
+        '{"side": "left", "user": "Irin", "message": "hi {there} \\"q\\" \\\\",},'
+        '{"side": "right", "user": "unknown", "message": "[yo]"},'
+        "],}\n```"
+    )
+
+    def test_yields_each_message_when_its_closing_brace_arrives(self):
+        decoder = MessageStreamDecoder()
+        cut = self.payload.index("},") + 1
+
+        self.assertEqual(decoder.feed(self.payload[: cut - 1]), [])
+        first = decoder.feed(self.payload[cut - 1 : cut])
+        self.assertEqual(first, [ChatMessage('hi {there} "q" \\', "Irin", "left")])
+        self.assertEqual([m.message for m in decoder.feed(self.payload[cut:])], ["[yo]"])
+        self.assertEqual(decoder.text, self.payload)
+
+    def test_any_chunking_gives_the_same_messages(self):
+        for size in (1, 2, 5, len(self.payload)):
+            with self.subTest(size=size):
+                decoder = MessageStreamDecoder()
+                messages = []
+                for start in range(0, len(self.payload), size):
+                    messages += decoder.feed(self.payload[start : start + size])
+                self.assertEqual([m.user for m in messages], ["Irin", "unknown"])
+
+    def test_decodes_a_bare_message_list(self):
+        messages = MessageStreamDecoder().feed('[{"message": "a"}, {"message": "b"}]')
+        self.assertEqual([m.message for m in messages], ["a", "b"])
+
+    def test_inbound_player_message_filters_single_messages(self):
+        self.assertEqual(
+            inbound_player_message({"side": "left", "user": "", "message": " hey "}),
+            ChatMessage("hey", "player", "left"),
+        )
+        self.assertIsNone(inbound_player_message({"side": "right", "user": "AI", "message": "yo"}))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,12 @@
+import json
+import os
+import tempfile
 import unittest
 from pathlib import Path
 
 from PIL import Image
 
-from src.heartopia.chat_preprocess import crop_chat_message_list
+from src.heartopia.chat_preprocess import AnchorProfileStore, crop_chat_message_list, prepare_chat_message_list
 
 
 FIXTURE_DIR = Path("tests/fixtures/screenshots")
@@ -47,5 +50,71 @@ class TestChatPreprocess(unittest.TestCase):
                 self.assertLessEqual(_teal_ratio(cropped), 0.002)
 
 
+def _write_anchors(path: Path, list_x: int, mtime_ns: int) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "profiles": {
+                    "400x300": {
+                        "message_list": {"x": list_x, "y": 20, "width": 200, "height": 150},
+                        "lanes": {"left_x": list_x + 40, "right_x": list_x + 160},
+                        "classifier": {"split_x": list_x + 100},
+                    },
+                    "bad-key": {"message_list": {"x": 0, "y": 0, "width": 10, "height": 10}},
+                    "640x480": {"message_list": {"x": 0, "y": 0, "width": 0, "height": 0}},
+                }
+            }
+        ),
+        encoding="utf-8",
+    )
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class TestAnchorProfileStore(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "anchors.json"
+
+    def test_precomputes_crop_rect_and_hints(self):
+        _write_anchors(self.path, list_x=50, mtime_ns=1_000_000_000)
+        profile = AnchorProfileStore(self.path).get(400, 300)
+
+        self.assertEqual(profile.rect, (50, 20, 250, 170))
+        self.assertAlmostEqual(profile.hints["left_lane_norm"], 0.2)
+        self.assertAlmostEqual(profile.hints["right_lane_norm"], 0.8)
+        self.assertAlmostEqual(profile.hints["split_norm"], 0.5)
+
+    def test_invalid_profiles_are_dropped_at_load(self):
+        _write_anchors(self.path, list_x=50, mtime_ns=1_000_000_000)
+        store = AnchorProfileStore(self.path)
+
+        self.assertIsNone(store.get(640, 480))
+        self.assertIsNotNone(store.get(400, 300))
+
+    def test_reloads_only_when_mtime_changes(self):
+        _write_anchors(self.path, list_x=50, mtime_ns=1_000_000_000)
+        store = AnchorProfileStore(self.path)
+        for _ in range(5):
+            store.get(400, 300)
+        self.assertEqual(store.reloads, 1)
+
+        _write_anchors(self.path, list_x=80, mtime_ns=2_000_000_000)
+        self.assertEqual(store.get(400, 300).rect[0], 80)
+        self.assertEqual(store.reloads, 2)
+
+    def test_prepare_uses_store_profile(self):
+        _write_anchors(self.path, list_x=50, mtime_ns=1_000_000_000)
+        cropped, hints = prepare_chat_message_list(Image.new("RGB", (400, 300)), anchors_path=self.path)
+
+        self.assertEqual(cropped.size, (200, 150))
+        self.assertAlmostEqual(hints["split_norm"], 0.5)
+
+    def test_missing_file_falls_back_to_default_crop(self):
+        cropped, hints = prepare_chat_message_list(Image.new("RGB", (400, 300)), anchors_path=self.path)
+        self.assertLess(cropped.width, 400)
+        self.assertEqual(hints["split_norm"], 0.515)
+
+
 if __name__ == "__main__":
     unittest.main()
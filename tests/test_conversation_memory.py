@@ -0,0 +1,121 @@
+import json
+import unittest
+
+from src.bot import BotState, run_serial
+from src.chat.memory import ConversationMemory, count_tokens, message_tokens
+
+
+def _payload(*messages: tuple[str, str]) -> str:
+    return json.dumps(
+        {
+            "chat_region_detected": True,
+            "messages": [{"side": "left", "user": user, "message": text} for user, text in messages],
+        }
+    )
+
+
+class TestTokenCount(unittest.TestCase):
+    def test_counts_words_in_four_char_pieces_and_punctuation(self):
+        self.assertEqual(count_tokens("hi"), 1)
+        self.assertEqual(count_tokens("fishing!!"), 4)  # "fish" "ing" "!" "!"
+        self.assertEqual(count_tokens(""), 0)
+
+
+class TestConversationMemory(unittest.TestCase):
+    def test_keeps_turns_per_player(self):
+        memory = ConversationMemory()
+        memory.add_user("Irin", "hi")
+        memory.add_user("Bo", "yo")
+        memory.add_reply("Irin", "hey!")
+
+        self.assertEqual(
+            memory.prompt_messages("Irin"),
+            [{"role": "user", "content": "hi", "name": "Irin"}, {"role": "assistant", "content": "hey!"}],
+        )
+        self.assertEqual(len(memory.history("Bo")), 1)
+
+    def test_prompt_stays_within_budget_and_summarizes_older_turns(self):
+        memory = ConversationMemory(token_budget=120)
+        for idx in range(30):
+            memory.add_user("Irin", f"message number {idx} about fishing")
+            memory.add_reply("Irin", f"reply {idx}")
+
+        prompt = memory.prompt_messages("Irin")
+
+        self.assertLessEqual(sum(message_tokens(m) for m in prompt), 120)
+        self.assertEqual(memory.last_prompt_tokens, sum(message_tokens(m) for m in prompt))
+        self.assertEqual(prompt[0]["role"], "system")
+        self.assertTrue(prompt[0]["content"].startswith("Earlier with Irin: "))
+        self.assertEqual(prompt[-1], {"role": "assistant", "content": "reply 29"})
+        self.assertGreater(memory.trimmed_turns, 0)
+
+    def test_trimmed_turns_are_counted_once(self):
+        memory = ConversationMemory(token_budget=60)
+        for idx in range(10):
+            memory.add_user("Irin", f"message number {idx} about fishing")
+
+        memory.prompt_messages("Irin")
+        trimmed = memory.trimmed_turns
+        memory.prompt_messages("Irin")
+        self.assertEqual(memory.trimmed_turns, trimmed)
+
+        memory.add_user("Irin", "one more message about fishing")
+        memory.prompt_messages("Irin")
+        self.assertEqual(memory.trimmed_turns, trimmed + 1)
+
+    def test_prompt_can_end_at_an_earlier_message(self):
+        memory = ConversationMemory()
+        memory.add_user("Irin", "hi")
+        memory.add_user("Irin", "wanna fish")
+
+        self.assertEqual([m["content"] for m in memory.prompt_messages("Irin", until="hi")], ["hi"])
+        self.assertEqual([m["content"] for m in memory.prompt_messages("Irin", until="gone")], ["hi", "wanna fish"])
+
+    def test_history_and_player_count_are_bounded(self):
+        memory = ConversationMemory(max_turns=3, max_players=2)
+        for idx in range(5):
+            memory.add_user("Irin", str(idx))
+        self.assertEqual([m["content"] for m in memory.history("Irin")], ["2", "3", "4"])
+
+        memory.add_user("Bo", "yo")
+        memory.add_user("Cy", "hey")
+        self.assertEqual(memory.history("Irin"), [])
+        self.assertEqual(len(memory), 2)
+
+
+class TestMemoryInLoop(unittest.TestCase):
+    def test_context_survives_scroll_off(self):
+        frames = iter(
+            [
+                _payload(("Irin", "my fav fish is koi")),
+                _payload(("Bo", "hey")),  # Irin's message has scrolled off
+                _payload(("Irin", "what is my fav fish")),
+            ]
+        )
+        prompts = []
+
+        def respond(prompt, context, conversation_messages=None):
+            prompts.append(conversation_messages)
+            return {"choices": [{"message": {"content": f"re: {prompt}"}}]}
+
+        run_serial(lambda: next(frames), respond, lambda reply: None, state=BotState(), interval=0, max_cycles=3)
+
+        contents = [m["content"] for m in prompts[-1]]
+        self.assertEqual(contents, ["my fav fish is koi", "re: my fav fish is koi", "what is my fav fish"])
+        self.assertEqual([m["content"] for m in prompts[1]], ["hey"])
+
+    def test_each_message_in_a_frame_gets_a_prompt_ending_with_it(self):
+        frames = iter([_payload(("Irin", "hi"), ("Irin", "wanna go fishing"))])
+        prompts = {}
+
+        def respond(prompt, context, conversation_messages=None):
+            prompts[prompt] = [m["content"] for m in conversation_messages]
+            return {"choices": [{"message": {"content": f"re: {prompt}"}}]}
+
+        run_serial(lambda: next(frames), respond, lambda reply: None, state=BotState(), interval=0, max_cycles=1)
+
+        self.assertEqual(prompts, {"hi": ["hi"], "wanna go fishing": ["hi", "wanna go fishing"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.bot import BotState, run_serial
+from src.bot.dedupe import DedupeStore, FuzzyDedupeStore, read_snapshot, write_snapshot
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDedupeStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_lru_eviction_keeps_recently_seen_keys(self):
+        store = DedupeStore(capacity=2, ttl=None, clock=self.clock)
+        store.add("a")
+        store.add("b")
+        self.assertIn("a", store)  # refreshes "a"
+        store.add("c")
+
+        self.assertEqual(set(store), {"a", "c"})
+        self.assertEqual(store.lru_evictions, 1)
+
+    def test_keys_expire_after_ttl_unless_seen(self):
+        store = DedupeStore(capacity=10, ttl=60, clock=self.clock)
+        store.add("old")
+        store.add("visible")
+        for _ in range(3):
+            self.clock.now += 30
+            self.assertIn("visible", store)
+
+        self.assertNotIn("old", store)
+        self.assertEqual(store.ttl_evictions, 1)
+        self.assertEqual(len(store), 1)
+
+    def test_compares_equal_to_a_set(self):
+        store = DedupeStore(clock=self.clock)
+        store.add(("Irin", "hi"))
+        self.assertEqual(store, {("Irin", "hi")})
+
+    def test_snapshot_round_trip_restores_tuple_keys(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state.json"
+            store = DedupeStore(clock=self.clock)
+            store.add(("Irin", "hi"))
+            store.add("hey")
+            write_snapshot(path, {"players": store})
+
+            restored = DedupeStore(clock=self.clock)
+            restored.load_snapshot(read_snapshot(path)["players"])
+
+        self.assertEqual(set(restored), {("Irin", "hi"), "hey"})
+        self.assertFalse(store.dirty)
+
+    def test_unreadable_snapshot_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state.json"
+            path.write_text("{not json", encoding="utf-8")
+            self.assertEqual(read_snapshot(path), {})
+            self.assertEqual(read_snapshot(Path(tmp) / "missing.json"), {})
+
+
+class TestFuzzyDedupeStore(unittest.TestCase):
+    def test_matches_a_misread_character(self):
+        store = FuzzyDedupeStore()
+        original = ("Irin", "do you want to go fishing later")
+        store.add(original)
+
+        self.assertEqual(store.match(("Irin", "do you want to go flshing later")), original)
+        self.assertIsNone(store.match(("Irin", "do you want to go shopping later")))
+        self.assertEqual(store.fuzzy_hits, 1)
+
+    def test_short_messages_need_an_exact_match(self):
+        store = FuzzyDedupeStore()
+        store.add("hi")
+
+        self.assertEqual(store.match("hi"), "hi")
+        self.assertIsNone(store.match("hii"))
+
+    def test_containment_matches_a_wrapped_bubble_of_a_sent_reply(self):
+        store = FuzzyDedupeStore(containment=True)
+        store.add("omg yes!! i just caught a golden koi by the lake, come see")
+
+        self.assertIsNotNone(store.match("i just caught a golden kol by the"))
+        self.assertIsNotNone(store.match("lake, come see"))
+        self.assertIsNone(store.match("golden"))  # too short to claim as ours
+        self.assertIsNone(FuzzyDedupeStore().match("lake, come see"))
+
+    def test_long_names_do_not_widen_the_edit_budget(self):
+        store = FuzzyDedupeStore()
+        store.add(("StrawberryMilk22", "yes"))
+
+        self.assertIsNone(store.match(("StrawberryMilk22", "yep")))
+        self.assertIsNone(store.match(("StrawberryMilk2", "yes")))
+
+    def test_never_matches_across_different_digits_or_short_words(self):
+        store = FuzzyDedupeStore()
+        store.add(("StrawberryMilk22", "meet me at 5"))
+        store.add(("Irin", "do you want to go fishing later"))
+
+        self.assertIsNone(store.match(("StrawberryMilk22", "meet me at 6")))
+        self.assertIsNone(store.match(("Irin", "do you want too go fishing later")))
+
+    def test_containment_only_checks_the_most_recent_keys(self):
+        store = FuzzyDedupeStore(containment=True, containment_window=1)
+        store.add("omg yes i love fishing too")
+        self.assertIsNotNone(store.match("i love fishing"))
+
+        store.add("see you at the plaza")
+        self.assertIsNone(store.match("i love fishing"))
+
+    def test_evicted_keys_leave_the_index(self):
+        store = FuzzyDedupeStore(capacity=1)
+        store.add("first message here")
+        store.add("second message here")
+
+        self.assertIsNone(store.match("first message hera"))
+        self.assertNotIn("fir", store._postings)
+
+
+class TestBotStatePersistence(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "dedupe.json"
+        self.clock = FakeClock()
+
+    def test_checkpoint_waits_for_interval(self):
+        state = BotState(snapshot_path=self.path, snapshot_interval=60, clock=self.clock)
+        state.player_context.add(("Irin", "hi"))
+
+        state.checkpoint()
+        self.assertFalse(self.path.exists())
+
+        self.clock.now += 61
+        state.checkpoint()
+        stored = json.loads(self.path.read_text(encoding="utf-8"))
+        self.assertEqual(stored["stores"]["player_context"][0][0], ["Irin", "hi"])
+
+    def test_ocr_variants_and_echoes_do_not_trigger_replies(self):
+        frames = iter(
+            [
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Irin", "message": "what are you doing today"}]}',
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Irin", "message": "what are you doinq today"}, '
+                '{"side": "left", "user": "unknown", "message": "just fishing by the lake"}]}',
+            ]
+        )
+        reply = {"choices": [{"message": {"content": "just fishing by the lake wbu"}}]}
+        sent = []
+
+        run_serial(lambda: next(frames), lambda *args, **kwargs: reply, sent.append, interval=0, max_cycles=2)
+
+        self.assertEqual(sent, ["just fishing by the lake wbu"])
+
+    def test_player_repeating_part_of_an_older_reply_gets_an_answer(self):
+        frames = iter(
+            [
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Irin", "message": "do you like fishing"}]}',
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Mo", "message": "hey there"}]}',
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Kai", "message": "what are you up to"}]}',
+                '{"chat_region_detected": true, "messages": ['
+                '{"side": "left", "user": "Irin", "message": "i love fishing"}]}',
+            ]
+        )
+        replies = iter(["omg yes i love fishing too", "hiii", "just chilling", "same!!"])
+        sent = []
+
+        run_serial(
+            lambda: next(frames),
+            lambda *args, **kwargs: {"choices": [{"message": {"content": next(replies)}}]},
+            sent.append,
+            interval=0,
+            max_cycles=4,
+        )
+
+        self.assertEqual(sent, ["omg yes i love fishing too", "hiii", "just chilling", "same!!"])
+
+    def test_wrapped_piece_of_any_reply_from_a_concurrent_cycle_is_not_answered(self):
+        replies = {
+            "wanna meet up": "meet me at the fountain after the contest ok",
+            "hey": "heyyy",
+            "wyd": "fishing rn",
+            "nice hat": "ty!!",
+        }
+        players = [("Irin", "wanna meet up"), ("Mo", "hey"), ("Kai", "wyd"), ("Bo", "nice hat")]
+        first = [{"side": "left", "user": user, "message": text} for user, text in players]
+        # The first reply wrapped over two bubbles, one of them misread as a player's.
+        second = first + [{"side": "left", "user": "Irin", "message": "meet me at the fountain"}]
+        frames = iter(json.dumps({"chat_region_detected": True, "messages": frame}) for frame in (first, second))
+        sent = []
+
+        run_serial(
+            lambda: next(frames),
+            lambda prompt, *args, **kwargs: {"choices": [{"message": {"content": replies.get(prompt, "re: " + prompt)}}]},
+            sent.append,
+            interval=0,
+            max_cycles=2,
+            reply_concurrency=4,
+        )
+
+        self.assertEqual(sent, [replies[text] for _, text in players])
+
+    def test_restart_does_not_reply_twice(self):
+        payload = '{"chat_region_detected": true, "messages": [{"side": "left", "user": "Irin", "message": "hi"}]}'
+        respond = lambda *args, **kwargs: {"choices": [{"message": {"content": "hey"}}]}  # noqa: E731
+        sent = []
+
+        for _ in range(2):  # two bot runs, the second restoring the first one's snapshot
+            state = BotState(snapshot_path=self.path)
+            run_serial(lambda: payload, respond, sent.append, state=state, interval=0, max_cycles=1)
+            state.save()
+
+        self.assertEqual(sent, ["hey"])
+
+
+if __name__ == "__main__":
+    unittest.main()
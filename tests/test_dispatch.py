@@ -0,0 +1,205 @@
+import random
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.chat.packets import split_packets
+from src.heartopia import interfacing
+from src.heartopia.dispatch import (
+    LEGACY_TIMING,
+    Dispatcher,
+    InputBackend,
+    InputTiming,
+    PyAutoGuiInput,
+    VirtualInput,
+    create_input_backend,
+)
+
+TEXT_BOX = (100, 500)
+SEND_BUTTON = (300, 500)
+REPLY = "sure thing, meet me by the fountain in the town square after the fishing contest ends"
+# Delays lowered from the legacy-safe defaults, as a measured send gap would allow.
+TUNED = {"pause": 0.0, "settle": 0.01, "after_paste": 0.02, "send_gap": 0.15}
+
+
+def _dispatcher(timing: InputTiming | None = None, probe=None) -> Dispatcher:
+    return Dispatcher(VirtualInput(), timing or InputTiming(jitter=0), probe, random.Random(0))
+
+
+class ChatAreaProbe:
+    """A chat area that shows a new line `delay` seconds after each send click."""
+
+    def __init__(self, backend: VirtualInput, delay: float | None):
+        self.backend = backend
+        self.delay = delay
+
+    def __call__(self) -> Image.Image:
+        shown = 0
+        if self.delay is not None:
+            sends = [at for at, action, value in self.backend.actions if action == "move" and value == SEND_BUTTON]
+            shown = sum(1 for at in sends if self.backend.now() >= at + self.delay)
+        image = Image.new("L", (96, 72), 240)
+        for line in range(shown):
+            image.paste(40, (0, 4 * line, 96, 4 * line + 3))
+        return image
+
+
+class TestDispatcher(unittest.TestCase):
+    def test_focuses_the_text_box_once_per_message(self):
+        dispatcher = _dispatcher()
+        packets = split_packets(REPLY)
+
+        sent = dispatcher.send_packets(iter(packets), TEXT_BOX, SEND_BUTTON)
+
+        self.assertEqual(sent, packets)
+        self.assertEqual(dispatcher.backend.pasted(), packets)
+        self.assertEqual(dispatcher.backend.clicks(), [TEXT_BOX] + [SEND_BUTTON] * len(packets))
+        self.assertEqual(dispatcher.stats()["messages"], 1)
+
+    def test_refocus_clicks_the_text_box_before_every_packet(self):
+        dispatcher = _dispatcher(InputTiming(jitter=0, refocus=True))
+
+        dispatcher.send_packets(["one", "two"], TEXT_BOX, SEND_BUTTON)
+
+        self.assertEqual(dispatcher.backend.clicks(), [TEXT_BOX, SEND_BUTTON, TEXT_BOX, SEND_BUTTON])
+
+    def test_jitter_stays_within_a_few_pixels(self):
+        dispatcher = Dispatcher(VirtualInput(), InputTiming(jitter=2), rng=random.Random(0))
+
+        dispatcher.click(TEXT_BOX)
+
+        x, y = dispatcher.backend.clicks()[0]
+        self.assertTrue(1 <= x - TEXT_BOX[0] <= 2 and 1 <= y - TEXT_BOX[1] <= 2)
+
+    def test_defaults_never_send_faster_than_the_legacy_timings(self):
+        packets = split_packets(REPLY)
+        legacy, current = _dispatcher(LEGACY_TIMING), _dispatcher()
+
+        legacy.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+        current.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+
+        # 2 clicks of 3 calls each plus a paste, at pyautogui's 0.1 s pause.
+        self.assertAlmostEqual(legacy.stats()["ms_per_packet"], 1040.0)
+        self.assertGreaterEqual(current.stats()["ms_per_packet"], legacy.stats()["ms_per_packet"])
+
+    def test_tuned_timings_send_much_faster(self):
+        packets = split_packets(REPLY)
+        legacy, tuned = _dispatcher(LEGACY_TIMING), _dispatcher(InputTiming(jitter=0, **TUNED))
+
+        legacy.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+        tuned.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+
+        self.assertLess(tuned.stats()["ms_per_packet"], legacy.stats()["ms_per_packet"] / 4)
+
+    def test_confirmed_sends_wait_only_until_the_packet_appears(self):
+        backend = VirtualInput()
+        dispatcher = Dispatcher(backend, InputTiming(jitter=0, confirm=True, **TUNED), ChatAreaProbe(backend, 0.08))
+
+        dispatcher.send_packets(["one", "two", "three"], TEXT_BOX, SEND_BUTTON)
+
+        stats = dispatcher.stats()
+        self.assertEqual((stats["confirmed"], stats["unconfirmed"]), (3, 0))
+        self.assertTrue(all(0.05 <= latency <= 0.08 for latency in dispatcher.confirm_latencies))
+        self.assertLess(stats["ms_per_packet"], 150)
+        self.assertGreaterEqual(stats["suggested_send_gap"], 0.06)
+
+    def test_calibration_replaces_the_send_gap_with_the_measured_one(self):
+        backend = VirtualInput()
+        dispatcher = Dispatcher(backend, InputTiming(jitter=0, confirm=True), ChatAreaProbe(backend, 0.6))
+
+        dispatcher.send_packets(["one", "two", "three", "four", "five"], TEXT_BOX, SEND_BUTTON)
+        dispatcher.send_packets(["six", "seven"], TEXT_BOX, SEND_BUTTON)
+
+        stats = dispatcher.stats()
+        self.assertTrue(dispatcher.calibrated)
+        self.assertEqual(stats["confirmed"], 5)  # Later sends are no longer confirmed
+        self.assertEqual(stats["send_gap"], stats["suggested_send_gap"])
+        self.assertLess(dispatcher.send_gap, InputTiming.send_gap)
+
+    def test_calibrated_sends_are_faster_than_the_legacy_timings(self):
+        packets = split_packets(REPLY)
+        legacy = _dispatcher(LEGACY_TIMING)
+        backend = VirtualInput()
+        calibrated = Dispatcher(backend, InputTiming(jitter=0, confirm=True), ChatAreaProbe(backend, 0.5))
+        calibrated.send_packets(["warm", "up", "the", "send", "gap"], TEXT_BOX, SEND_BUTTON)
+        calibrated.send_seconds, calibrated.counts["packets"] = 0.0, 0
+
+        legacy.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+        calibrated.send_packets(packets, TEXT_BOX, SEND_BUTTON)
+
+        self.assertLess(calibrated.stats()["ms_per_packet"], legacy.stats()["ms_per_packet"] * 0.8)
+
+    def test_unconfirmed_sends_keep_confirming(self):
+        backend = VirtualInput()
+        timing = InputTiming(jitter=0, confirm=True, confirm_timeout=0.3, calibration_sends=1)
+        dispatcher = Dispatcher(backend, timing, ChatAreaProbe(backend, None))
+
+        dispatcher.send_packets(["one", "two"], TEXT_BOX, SEND_BUTTON)
+
+        self.assertFalse(dispatcher.calibrated)
+        self.assertEqual(dispatcher.stats()["send_gap"], InputTiming.send_gap)
+
+    def test_unconfirmed_send_times_out_without_resending(self):
+        backend = VirtualInput()
+        timing = InputTiming(jitter=0, confirm=True, confirm_timeout=0.3)
+        dispatcher = Dispatcher(backend, timing, ChatAreaProbe(backend, None))
+
+        dispatcher.send_packets(["hello"], TEXT_BOX, SEND_BUTTON)
+
+        self.assertEqual(backend.pasted(), ["hello"])
+        self.assertEqual(dispatcher.stats()["unconfirmed"], 1)
+        self.assertGreaterEqual(backend.now(), 0.3)
+        self.assertIsNone(dispatcher.stats()["suggested_send_gap"])
+
+    def test_empty_reply_sends_nothing(self):
+        dispatcher = _dispatcher()
+
+        self.assertEqual(dispatcher.send_packets([], TEXT_BOX, SEND_BUTTON), [])
+        self.assertEqual(dispatcher.backend.actions, [])
+        self.assertEqual(dispatcher.stats()["messages"], 0)
+
+    def test_pyautogui_backend_leaves_the_global_pause_alone(self):
+        gui = mock.Mock(PAUSE=0.1)
+        with mock.patch.dict("sys.modules", {"pyautogui": gui, "pyperclip": mock.Mock()}):
+            backend = PyAutoGuiInput()
+            backend.move(*TEXT_BOX)
+            backend.mouse_down()
+            backend.mouse_up()
+            backend.paste("hi")
+
+        self.assertEqual(gui.PAUSE, 0.1)
+        for call in gui.method_calls:
+            self.assertIs(call.kwargs["_pause"], False)
+
+    def test_incomplete_backend_fails_when_created(self):
+        class NoPaste(VirtualInput):
+            paste = InputBackend.paste
+
+        with self.assertRaises(TypeError):
+            NoPaste()
+
+    def test_unknown_backend_is_rejected(self):
+        self.assertIsInstance(create_input_backend("virtual"), VirtualInput)
+        with self.assertRaises(ValueError):
+            create_input_backend("xdotool")
+
+
+class TestSendChat(unittest.TestCase):
+    def test_send_chat_opens_chat_then_sends_one_script(self):
+        dispatcher = _dispatcher()
+        interfacing.setDispatcher(dispatcher)
+        self.addCleanup(interfacing.setDispatcher, None)
+        positions = {"chat_button": (10, 10), "chat_bubble": (20, 20), "text_box": TEXT_BOX, "send_button": SEND_BUTTON}
+        with mock.patch.dict(interfacing.required_positions, positions), \
+                mock.patch.object(interfacing, "positionsLoaded", True), \
+                mock.patch.object(interfacing, "chatOpen", False):
+            interfacing.sendChat(REPLY)
+
+        packets = split_packets(REPLY)
+        self.assertEqual(dispatcher.backend.pasted(), packets)
+        self.assertEqual(dispatcher.backend.clicks(), [(10, 10), (20, 20), TEXT_BOX] + [SEND_BUTTON] * len(packets))
+
+
+if __name__ == "__main__":
+    unittest.main()
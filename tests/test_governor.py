@@ -0,0 +1,263 @@
+import asyncio
+import json
+import random
+import unittest
+
+from src.ai.backends import BackendError, ChatBackend
+from src.ai.governor import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GovernedBackend,
+    Governor,
+    GovernorConfig,
+    ThrottledError,
+    TokenBucket,
+    estimate_tokens,
+)
+from src.bot import BotState, run_serial
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class ScriptedBackend(ChatBackend):
+    """Raises or answers from `script` in order, then answers with `content`."""
+
+    def __init__(self, script=(), content="ok"):
+        self.script = list(script)
+        self.content = content
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.script:
+            outcome = self.script.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+        return {"choices": [{"message": {"content": self.content}}], "usage": {"total_tokens": 50}}
+
+    def complete(self, model, messages, **options):
+        return self._next()
+
+    def stream(self, model, messages, **options):
+        yield self._next()["choices"][0]["message"]["content"]
+
+    async def acomplete(self, model, messages, **options):
+        return self._next()
+
+
+class EmptyStreamBackend(ScriptedBackend):
+    """Streams no deltas at all once the script has run out."""
+
+    def stream(self, model, messages, **options):
+        self._next()
+        yield from ()
+
+
+def _governor(clock: FakeClock, **config) -> Governor:
+    return Governor(GovernorConfig(**config), clock=clock, sleep=clock.sleep, rng=random.Random(0))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_waits_once_empty_and_refills_over_time(self):
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, clock=clock)
+
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 1.0)
+        self.assertAlmostEqual(bucket.reserve(1), 2.0)  # Queued behind the previous caller
+
+        clock.now += 2
+        self.assertAlmostEqual(bucket.available, 0.0)
+        bucket.adjust(-30)
+        self.assertAlmostEqual(bucket.available, 30.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures_and_probes_after_cooldown(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failures=2, cooldown=10, clock=clock)
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now += 10
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # One probe at a time
+
+        breaker.record_failure()
+        self.assertAlmostEqual(breaker.remaining(), 20)  # Failed probe doubles the cooldown
+
+        clock.now += 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestGovernedBackend(unittest.TestCase):
+    def test_retries_rate_limits_with_retry_after_and_tracks_usage(self):
+        clock = FakeClock()
+        governor = _governor(clock)
+        inner = ScriptedBackend([BackendError("slow down", status_code=429, retry_after=3.0)])
+        backend = GovernedBackend(inner, governor)
+
+        response = backend.complete("m", MESSAGES)
+
+        self.assertEqual(response["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(inner.calls, 2)
+        self.assertGreaterEqual(clock.now, 3.0)
+        self.assertEqual(governor.retries, 1)
+        self.assertEqual(governor.usage.models["m"]["total_tokens"], 50)
+
+    def test_client_errors_are_not_retried(self):
+        governor = _governor(FakeClock())
+        inner = ScriptedBackend([BackendError("bad request", status_code=400)])
+
+        with self.assertRaises(BackendError):
+            GovernedBackend(inner, governor).complete("m", MESSAGES)
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(governor.breaker("m").consecutive_failures, 0)
+
+    def test_breaker_refuses_calls_until_cooldown(self):
+        clock = FakeClock()
+        governor = _governor(clock, max_retries=0, breaker_failures=2, breaker_cooldown=30)
+        inner = ScriptedBackend([BackendError("down", status_code=503)] * 2)
+        backend = GovernedBackend(inner, governor)
+
+        for _ in range(2):
+            with self.assertRaises(BackendError):
+                backend.complete("m", MESSAGES)
+        with self.assertRaises(CircuitOpenError):
+            backend.complete("m", MESSAGES)
+        self.assertEqual(inner.calls, 2)
+        self.assertAlmostEqual(governor.idle_seconds(), 30)
+
+        clock.now += 30
+        self.assertEqual(backend.complete("m", MESSAGES)["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(governor.stats()["breakers"], {"m": "closed"})
+
+    def test_probe_refused_by_the_rate_limit_is_handed_back(self):
+        clock = FakeClock()
+        governor = _governor(
+            clock, max_retries=0, breaker_failures=1, breaker_cooldown=30, requests_per_minute=1, max_wait=10
+        )
+        backend = GovernedBackend(ScriptedBackend([BackendError("down", status_code=503)]), governor)
+
+        with self.assertRaises(BackendError):
+            backend.complete("m", MESSAGES)
+        clock.now += 30
+        with self.assertRaises(ThrottledError):
+            backend.complete("m", MESSAGES)  # Allowed as the probe, then refused by the request budget
+
+        clock.now += 60
+        self.assertEqual(backend.complete("m", MESSAGES)["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(governor.stats()["breakers"], {"m": "closed"})
+
+    def test_probe_streaming_no_deltas_closes_the_breaker(self):
+        clock = FakeClock()
+        governor = _governor(clock, max_retries=0, breaker_failures=1, breaker_cooldown=30)
+        backend = GovernedBackend(EmptyStreamBackend([BackendError("down", status_code=503)]), governor)
+
+        with self.assertRaises(BackendError):
+            backend.complete("m", MESSAGES)
+        clock.now += 30
+        self.assertEqual(list(backend.stream("m", MESSAGES)), [])
+
+        self.assertEqual(governor.stats()["breakers"], {"m": "closed"})
+        self.assertEqual(backend.complete("m", MESSAGES)["choices"][0]["message"]["content"], "ok")
+
+    def test_breakers_are_per_model(self):
+        clock = FakeClock()
+        governor = _governor(clock, max_retries=0, breaker_failures=1, breaker_cooldown=30)
+        backend = GovernedBackend(ScriptedBackend([BackendError("down", status_code=503)]), governor)
+
+        with self.assertRaises(BackendError):
+            backend.complete("small", MESSAGES)
+        with self.assertRaises(CircuitOpenError):
+            backend.complete("small", MESSAGES)
+
+        self.assertEqual(backend.complete("large", MESSAGES)["choices"][0]["message"]["content"], "ok")
+        self.assertEqual(governor.idle_seconds(), 0.0)  # Not every model is down
+        self.assertEqual(governor.stats()["breakers"], {"small": "open", "large": "closed"})
+
+    def test_request_budget_paces_calls(self):
+        clock = FakeClock()
+        backend = GovernedBackend(ScriptedBackend(), _governor(clock, requests_per_minute=2))
+
+        for _ in range(4):
+            backend.complete("m", MESSAGES)
+
+        self.assertAlmostEqual(clock.now, 60.0)  # Two free, then one every 30s
+
+    def test_refuses_rate_limit_waits_longer_than_max_wait(self):
+        clock = FakeClock()
+        governor = _governor(clock, requests_per_minute=1, max_wait=10)
+        inner = ScriptedBackend()
+        backend = GovernedBackend(inner, governor)
+
+        backend.complete("m", MESSAGES)
+        with self.assertRaises(ThrottledError):
+            backend.complete("m", MESSAGES)
+
+        self.assertEqual((inner.calls, clock.now), (1, 0.0))
+        self.assertEqual(governor.breaker("m").consecutive_failures, 0)
+        clock.now += 60  # The refused call's budget was handed back
+        backend.complete("m", MESSAGES)
+        self.assertEqual(clock.now, 60.0)
+
+    def test_stream_and_async_calls_are_governed(self):
+        clock = FakeClock()
+        governor = _governor(clock)
+        inner = ScriptedBackend([BackendError("timeout")])
+        backend = GovernedBackend(inner, governor)
+
+        self.assertEqual(list(backend.stream("m", MESSAGES)), ["ok"])
+        self.assertEqual(asyncio.run(backend.acomplete("m", MESSAGES))["usage"]["total_tokens"], 50)
+        self.assertEqual(governor.retries, 1)
+        self.assertEqual(governor.usage.models["m"]["requests"], 2)
+
+    def test_estimate_counts_images_and_completion(self):
+        vision = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:,"}}]}]
+        self.assertEqual(estimate_tokens(vision, max_tokens=10), 810)
+
+
+class TestDegradedLoop(unittest.TestCase):
+    def test_loop_survives_read_errors_and_idles_while_breaker_is_open(self):
+        governor = _governor(FakeClock(), breaker_failures=1, breaker_cooldown=0.05)
+        governor.breaker("m").record_failure()
+        message = {"side": "left", "user": "Irin", "message": "hi"}
+        frames = iter(
+            [BackendError("down", status_code=503), json.dumps({"chat_region_detected": True, "messages": [message]})]
+        )
+
+        def read_chat():
+            frame = next(frames)
+            if isinstance(frame, Exception):
+                raise frame
+            return frame
+
+        def respond(prompt, context, conversation_messages=None):
+            return {"choices": [{"message": {"content": "hey"}}]}
+
+        sent = []
+        run_serial(read_chat, respond, sent.append, state=BotState(), interval=0, max_cycles=2, governor=governor)
+
+        self.assertEqual(sent, ["hey"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import base64
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from src.ai.image_encoding import EncodeSettings, encode_for_vision
+from src.heartopia.chat_preprocess import crop_chat_message_list
+
+
+FIXTURE_DIR = Path("tests/fixtures/screenshots")
+
+
+def _fixture_crop() -> Image.Image:
+    screenshots = sorted(FIXTURE_DIR.glob("*.png"))
+    return crop_chat_message_list(Image.open(screenshots[0]).convert("RGB"))
+
+
+class TestImageEncoding(unittest.TestCase):
+    def test_data_url_mime_matches_encoded_format(self):
+        crop = _fixture_crop()
+        for fmt, mime in (("JPEG", "image/jpeg"), ("WEBP", "image/webp"), ("PNG", "image/png")):
+            with self.subTest(format=fmt):
+                encoded = encode_for_vision(crop, EncodeSettings(format=fmt))
+                self.assertTrue(encoded.data_url.startswith(f"data:{mime};base64,"))
+                decoded = Image.open(BytesIO(base64.b64decode(encoded.base64)))
+                self.assertEqual(decoded.format, fmt)
+
+    def test_jpeg_is_smaller_than_png(self):
+        crop = _fixture_crop()
+        png = encode_for_vision(crop, EncodeSettings(format="PNG"))
+        jpeg = encode_for_vision(crop, EncodeSettings(format="JPEG", quality=80))
+        self.assertLess(jpeg.num_bytes, png.num_bytes)
+
+    def test_downscales_to_pixel_budget_keeping_aspect(self):
+        crop = _fixture_crop()
+        encoded = encode_for_vision(crop, EncodeSettings(max_pixels=40_000))
+        self.assertLessEqual(encoded.width * encoded.height, 40_000)
+        self.assertAlmostEqual(encoded.width / encoded.height, crop.width / crop.height, delta=0.05)
+
+    def test_grayscale_and_contrast_options(self):
+        crop = _fixture_crop()
+        encoded = encode_for_vision(crop, EncodeSettings(format="PNG", grayscale=True, autocontrast=True))
+        decoded = Image.open(BytesIO(encoded.data))
+        self.assertEqual(decoded.mode, "L")
+        low, high = decoded.getextrema()
+        self.assertEqual((low, high), (0, 255))
+        self.assertGreaterEqual(encoded.encode_ms, 0.0)
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            encode_for_vision(_fixture_crop(), EncodeSettings(format="BMP"))
+
+
+if __name__ == "__main__":
+    unittest.main()
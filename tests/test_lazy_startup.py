@@ -0,0 +1,76 @@
+import importlib.util
+import subprocess
+import sys
+import unittest
+import unittest.mock
+from pathlib import Path
+
+
+_CHECK_SNIPPET = """
+import os, sys
+os.environ.pop("heartopiaChatAPI", None)
+sys.stdin.close()
+import src.heartopia.interfacing
+import src.ai.groq
+heavy = sorted(m for m in ("pyautogui", "pyperclip", "groq", "httpx", "requests") if m in sys.modules)
+print(",".join(heavy))
+"""
+
+
+class TestLazyStartup(unittest.TestCase):
+    def test_imports_are_headless_and_side_effect_free(self):
+        # A fresh interpreter with no API key and a closed stdin: importing must
+        # neither prompt for calibration, exit, nor pull in UI/HTTP libraries.
+        result = subprocess.run(
+            [sys.executable, "-c", _CHECK_SNIPPET],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        self.assertEqual(result.returncode, 0, msg=result.stderr)
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_missing_api_key_raises_on_first_use(self):
+        from src.ai import groq
+
+        previous = groq._backend
+        groq.set_backend(None)
+        try:
+            with unittest.mock.patch.dict("os.environ", {"heartopiaChatAPI": ""}):
+                with unittest.mock.patch.object(groq, "load_env_file"):
+                    with self.assertRaises(RuntimeError):
+                        groq.get_backend()
+        finally:
+            groq.set_backend(previous)
+
+
+def _load_startup_benchmark():
+    path = Path(__file__).resolve().parents[1] / "tools" / "benchmarks" / "startup.py"
+    spec = importlib.util.spec_from_file_location("startup_benchmark", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestStartupBenchmark(unittest.TestCase):
+    # The benchmark runs its snippets as strings, so an API change would
+    # otherwise only show up when someone next runs it.
+    def setUp(self):
+        self.benchmark = _load_startup_benchmark()
+
+    def test_import_snippets_run(self):
+        for module in self.benchmark.IMPORT_TARGETS:
+            with self.subTest(module=module):
+                result = self.benchmark._run_snippet(self.benchmark._IMPORT_SNIPPET.format(module=module))
+                self.assertNotIn("error", result)
+
+    def test_first_cycle_snippet_runs(self):
+        image = sorted(self.benchmark.FIXTURE_DIR.glob("*.png"))[0]
+        result = self.benchmark._run_snippet(self.benchmark._FIRST_CYCLE_SNIPPET.format(image=str(image)))
+
+        self.assertNotIn("error", result)
+        self.assertGreater(result["total"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
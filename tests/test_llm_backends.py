@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+from src.ai.backends import BackendConfig, BackendError, ChatBackend, OpenAICompatibleBackend, create_backend
+from src.ai.stub_server import StubServer, StubSettings
+
+
+MESSAGES = [
+    {"role": "system", "content": "be brief"},
+    {"role": "user", "content": "hi"},
+]
+
+
+class TestOpenAICompatibleBackend(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(settings=StubSettings(seed=1)).start()
+        self.backend = OpenAICompatibleBackend(BackendConfig(api_key="test", base_url=self.server.base_url))
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.stop()
+
+    def test_complete_returns_chat_completion_shape(self):
+        response = self.backend.complete("stub-model", MESSAGES)
+        self.assertEqual(response["choices"][0]["message"]["content"], "stub reply to: hi")
+        self.assertIn("usage", response)
+
+    def test_reuses_one_keep_alive_connection(self):
+        for _ in range(5):
+            self.backend.complete("stub-model", MESSAGES)
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_stream_yields_deltas(self):
+        deltas = list(self.backend.stream("stub-model", MESSAGES))
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual("".join(deltas), "stub reply to: hi")
+
+    def test_vision_request_returns_configured_payload(self):
+        self.server.settings.vision_payload = {"chat_region_detected": True, "messages": []}
+        response = self.backend.complete(
+            "vision-model",
+            [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:,"}}]}],
+        )
+        self.assertEqual(
+            response["choices"][0]["message"]["content"],
+            '{"chat_region_detected": true, "messages": []}',
+        )
+
+    def test_injected_failure_raises_backend_error_with_status(self):
+        self.server.settings.failure_rate = 1.0
+        self.server.settings.failure_status = 429
+        with self.assertRaises(BackendError) as ctx:
+            self.backend.complete("stub-model", MESSAGES)
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.retry_after, 1.0)
+
+    def test_async_complete(self):
+        async def run():
+            try:
+                return await self.backend.acomplete("stub-model", MESSAGES)
+            finally:
+                await self.backend.aclose()
+
+        response = asyncio.run(run())
+        self.assertEqual(response["choices"][0]["message"]["content"], "stub reply to: hi")
+
+
+class CompleteOnlyBackend(ChatBackend):
+    def complete(self, model, messages, **options):
+        return {"choices": [{"message": {"content": f"{model}: {messages[-1]['content']}"}}]}
+
+
+class TestChatBackendBase(unittest.TestCase):
+    def test_backend_without_complete_fails_when_created(self):
+        class StreamOnly(ChatBackend):
+            def stream(self, model, messages, **options):
+                yield "hi"
+
+        with self.assertRaises(TypeError):
+            StreamOnly()
+
+    def test_stream_and_acomplete_fall_back_to_complete(self):
+        backend = CompleteOnlyBackend()
+
+        self.assertEqual(list(backend.stream("m", MESSAGES)), ["m: hi"])
+        response = asyncio.run(backend.acomplete("m", MESSAGES))
+        self.assertEqual(response["choices"][0]["message"]["content"], "m: hi")
+
+
+class TestCreateBackend(unittest.TestCase):
+    def test_custom_base_url_selects_openai_client(self):
+        backend = create_backend(BackendConfig(api_key="k", base_url="http://127.0.0.1:1/v1"), name=None)
+        self.assertEqual(backend.name, "openai")
+        backend.close()
+
+    def test_unknown_backend_name_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_backend(BackendConfig(api_key="k"), name="nope")
+
+
+if __name__ == "__main__":
+    unittest.main()
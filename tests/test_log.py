@@ -0,0 +1,53 @@
+import io
+import json
+import unittest
+
+from src import log as logging_module
+from src.log import DEBUG, INFO, WARNING, configure, debug, error, flush, log
+
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.out = io.StringIO()
+        configure(level=INFO, json_lines=False, stream=self.out, log_file=None)
+        self.addCleanup(configure, level=INFO, json_lines=False, stream=None)
+
+    def _lines(self) -> list[str]:
+        flush()
+        return self.out.getvalue().splitlines()
+
+    def test_plain_format_names_calling_module(self):
+        log("hello")
+        self.assertEqual(self._lines(), ["[ test_log ] : hello"])
+
+    def test_disabled_levels_are_dropped(self):
+        debug("noisy detail")
+        log("kept")
+        self.assertEqual(self._lines(), ["[ test_log ] : kept"])
+        self.assertFalse(logging_module.is_enabled(DEBUG))
+
+    def test_level_threshold_can_be_raised(self):
+        configure(level="WARNING", stream=self.out)
+        log("info is hidden")
+        error("errors still show")
+        self.assertEqual(self._lines(), ["[ test_log ] : errors still show"])
+        self.assertTrue(logging_module.is_enabled(WARNING))
+
+    def test_json_lines_carry_level_module_and_line(self):
+        configure(level=DEBUG, json_lines=True, stream=self.out)
+        debug("structured")
+        record = json.loads(self._lines()[0])
+        self.assertEqual(record["level"], "DEBUG")
+        self.assertEqual(record["module"], "test_log")
+        self.assertEqual(record["msg"], "structured")
+        self.assertIsInstance(record["line"], int)
+        self.assertIn("ts", record)
+
+    def test_records_keep_call_order(self):
+        for idx in range(50):
+            log(f"line {idx}")
+        self.assertEqual(self._lines(), [f"[ test_log ] : line {idx}" for idx in range(50)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+
+from src.ai import groq
+from src.ai.backends import BackendError, ChatBackend
+from src.ai.governor import CircuitOpenError, GovernedBackend, Governor, GovernorConfig
+from src.ai.router import ModelRouter, RouterPolicy, is_simple_message
+
+POLICY = RouterPolicy(small_model="small", large_model="large", vision_models=("scout", "maverick"), min_samples=2)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingModelBackend(ChatBackend):
+    """Answers with the model name, except for models listed in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls: list[str] = []
+
+    def _answer(self, model):
+        self.calls.append(model)
+        if model in self.failing:
+            raise BackendError(f"{model} is down", status_code=503)
+        return {"choices": [{"message": {"content": model}}]}
+
+    def complete(self, model, messages, **options):
+        return self._answer(model)
+
+    def stream(self, model, messages, **options):
+        yield self._answer(model)["choices"][0]["message"]["content"]
+
+    async def acomplete(self, model, messages, **options):
+        return self._answer(model)
+
+
+class TestRoutingPolicy(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(POLICY, clock=FakeClock())
+
+    def test_short_chatter_goes_to_the_small_model(self):
+        self.assertTrue(is_simple_message("lol nice fit", 40))
+        self.assertEqual(self.router.chat_models("hiii"), ["small", "large"])
+        self.assertEqual(self.router.decisions[-1].reason, "simple, 4 chars")
+
+    def test_questions_and_long_messages_go_to_the_large_model(self):
+        self.assertEqual(self.router.chat_models("wanna go fishing?")[0], "large")
+        self.assertEqual(self.router.chat_models("how")[0], "large")
+        self.assertEqual(self.router.chat_models("x" * 41)[0], "large")
+
+    def test_routes_on_the_latest_user_turn(self):
+        conversation = [
+            {"role": "user", "content": "what is your favourite fish to catch around here"},
+            {"role": "assistant", "content": "koi!!"},
+            {"role": "user", "content": "same"},
+        ]
+        self.assertEqual(self.router.chat_models("ignored", conversation)[0], "small")
+
+    def test_disabled_router_keeps_the_large_model(self):
+        router = ModelRouter(RouterPolicy(large_model="large", vision_models=("scout",), enabled=False))
+        self.assertEqual(router.chat_models("hi"), ["large"])
+        self.assertEqual(router.vision_models(), ["scout"])
+
+
+class TestModelHealth(unittest.TestCase):
+    def test_slow_or_failing_model_is_skipped_until_recovery(self):
+        clock = FakeClock()
+        router = ModelRouter(POLICY, clock=clock)
+        for _ in range(3):
+            router.record("small", 9000, ok=True)
+
+        self.assertEqual(router.chat_models("hi"), ["large", "small"])
+        self.assertIn("small degraded", router.decisions[-1].reason)
+
+        clock.now += POLICY.recovery_seconds
+        self.assertEqual(router.chat_models("hi")[0], "small")
+
+        for _ in range(5):
+            router.record("scout", None, ok=False)
+        self.assertEqual(router.vision_models()[0], "maverick")
+        self.assertGreater(router.stats()["models"]["scout"]["error_rate"], POLICY.max_error_rate)
+
+    def test_run_fails_over_and_records_both_models(self):
+        router = ModelRouter(POLICY, clock=FakeClock())
+        backend = FailingModelBackend(failing={"small"})
+
+        result = router.run(["small", "large"], lambda model: backend.complete(model, []))
+
+        self.assertEqual(result["choices"][0]["message"]["content"], "large")
+        self.assertEqual(router.failovers, 1)
+        self.assertEqual(router.stats()["models"]["small"]["calls"], 1)
+
+    def test_open_circuit_skips_to_the_next_model(self):
+        router = ModelRouter(POLICY, clock=FakeClock())
+
+        def refuse_small(model):
+            if model == "small":
+                raise CircuitOpenError("open", retry_after=5)
+            return model
+
+        self.assertEqual(router.run(["small", "large"], refuse_small), "large")
+        self.assertNotIn("small", router.stats()["models"])  # Its health is untouched
+
+    def test_open_circuit_on_every_model_is_raised(self):
+        router = ModelRouter(POLICY, clock=FakeClock())
+
+        def refuse(model):
+            raise CircuitOpenError("open", retry_after=5)
+
+        with self.assertRaises(CircuitOpenError):
+            router.run(["small", "large"], refuse)
+        self.assertEqual(router.failovers, 0)
+
+    def test_governed_backend_fails_over_past_an_open_breaker(self):
+        governor = Governor(GovernorConfig(max_retries=0, breaker_failures=1))
+        backend = GovernedBackend(FailingModelBackend(failing={"small"}), governor)
+        router = ModelRouter(POLICY, clock=FakeClock())
+        call = lambda model: backend.complete(model, [])  # noqa: E731
+
+        router.run(["small", "large"], call)
+        self.assertEqual(router.run(["small", "large"], call)["choices"][0]["message"]["content"], "large")
+        self.assertEqual(backend.inner.calls, ["small", "large", "large"])
+
+
+class TestRoutedCalls(unittest.TestCase):
+    def setUp(self):
+        self.backend = FailingModelBackend()
+        groq.set_backend(self.backend)
+        groq.set_router(ModelRouter(POLICY))
+
+    def tearDown(self):
+        groq.set_backend(None)
+        groq.set_router(None)
+
+    def test_get_response_uses_the_routed_model(self):
+        self.assertEqual(groq.getResponse("hi", "ctx")["choices"][0]["message"]["content"], "small")
+        self.assertEqual(groq.getResponse("what u doing?", "ctx")["choices"][0]["message"]["content"], "large")
+
+    def test_stream_and_async_fail_over_before_the_first_token(self):
+        self.backend.failing.add("small")
+
+        self.assertEqual(list(groq.streamResponse("hi", "ctx")), ["large"])
+        response = asyncio.run(groq.getResponseAsync("hi", "ctx"))
+        self.assertEqual(response["choices"][0]["message"]["content"], "large")
+        self.assertEqual(self.backend.calls, ["small", "large", "small", "large"])
+
+
+if __name__ == "__main__":
+    unittest.main()
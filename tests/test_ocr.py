@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.ai import groq
+from src.ai.backends import ChatBackend
+from src.heartopia import ocr
+from src.heartopia.bubbles import segment_bubbles
+
+BACKGROUND = (250, 247, 244)
+FILL = (255, 252, 247)
+INK = (70, 66, 62)
+FONT = ImageFont.load_default(size=16)
+TRAINING = ["the quick brown", "fox jumps over", "the lazy dog", "abcdefghijklm", "nopqrstuvwxyz"]
+
+
+def _mk_chat_image(messages: list[str]) -> Image.Image:
+    """Right-side bubbles, one per message, with letters spaced like the game font."""
+    img = Image.new("RGB", (320, 60 * len(messages) + 20), BACKGROUND)
+    d = ImageDraw.Draw(img)
+    for i, message in enumerate(messages):
+        y = 20 + 60 * i
+        d.rounded_rectangle((120, y, 315, y + 36), radius=8, fill=FILL)
+        x = 130.0
+        for char in message:
+            d.text((x, y + 8), char, fill=INK, font=FONT)
+            x += FONT.getlength(char) + 2
+    return img
+
+
+def _mk_atlas() -> ocr.GlyphAtlas:
+    image = _mk_chat_image(TRAINING)
+    return ocr.build_atlas([(image, [{"user": "unknown", "message": m} for m in TRAINING])])
+
+
+class TestGlyphAtlas(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.atlas = _mk_atlas()
+
+    def test_build_covers_every_training_character(self):
+        self.assertEqual(set(self.atlas.chars), set("".join(TRAINING).replace(" ", "")))
+        self.assertGreater(self.atlas.ascent, self.atlas.descent)
+
+    def test_reads_unseen_messages_with_local_geometry(self):
+        image = _mk_chat_image(["brown fox", "hey you", "lol jk"])
+
+        frame = ocr.read_bubbles(image, segment_bubbles(image), self.atlas)
+
+        self.assertEqual([m.message for m in frame.messages], ["brown fox", "hey you", "lol jk"])
+        self.assertEqual({m.side for m in frame.messages}, {"right"})
+        self.assertTrue(all(m.y_center is not None for m in frame.messages))
+
+    def test_unknown_glyphs_fall_back(self):
+        image = _mk_chat_image(["hey you", "WOW 100%"])
+
+        self.assertIsNone(ocr.read_bubbles(image, segment_bubbles(image), self.atlas))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "atlas.npz"
+            self.atlas.save(path)
+            loaded = ocr.GlyphAtlas.load(path)
+
+        self.assertEqual(loaded.chars, self.atlas.chars)
+        self.assertEqual((loaded.ascent, loaded.descent), (self.atlas.ascent, self.atlas.descent))
+        image = _mk_chat_image(["lazy"])
+        self.assertEqual(ocr.read_bubbles(image, segment_bubbles(image), loaded).messages[0].message, "lazy")
+
+
+class CountingBackend(ChatBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, model, messages, **options):
+        self.calls += 1
+        content = {"chat_region_detected": True, "messages": [{"user": "unknown", "message": "WOW"}]}
+        return {"choices": [{"message": {"content": json.dumps(content)}}]}
+
+
+class TestLocalReadBeforeVision(unittest.TestCase):
+    def setUp(self):
+        self.backend = CountingBackend()
+        groq.set_backend(self.backend)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.atlas_path = str(Path(self.tmp.name) / "atlas.npz")
+        _mk_atlas().save(self.atlas_path)
+
+    def tearDown(self):
+        groq.set_backend(None)
+        ocr._atlases.clear()
+        self.tmp.cleanup()
+
+    def _read(self, message: str) -> str:
+        image = _mk_chat_image([message])
+        with mock.patch.dict("os.environ", {ocr.ATLAS_ENV: self.atlas_path}):
+            return groq._read_full_crop(image, segment_bubbles(image)).messages[0].message
+
+    def test_confident_read_skips_the_vision_call(self):
+        self.assertEqual(self._read("hey you"), "hey you")
+        self.assertEqual(self.backend.calls, 0)
+
+    def test_low_confidence_asks_the_vision_model(self):
+        self.assertEqual(self._read("WOW"), "WOW")
+        self.assertEqual(self.backend.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from src.chat.packets import packetize, split_packets
+
+
+class TestPackets(unittest.TestCase):
+    def test_short_message_is_single_packet(self):
+        self.assertEqual(split_packets("hi there :)"), ["hi there :)"])
+
+    def test_splits_on_word_boundaries(self):
+        packets = split_packets("hey whats up lol i was just fishing by the lake and caught a huge bass omg")
+        self.assertEqual(packets, ["hey whats up lol i was just fishing by", "the lake and caught a huge bass omg"])
+        self.assertTrue(all(len(p) <= 40 for p in packets))
+
+    def test_hard_splits_words_longer_than_a_packet(self):
+        self.assertEqual(split_packets("a" * 95), ["a" * 40, "a" * 40, "a" * 15])
+
+    def test_empty_message_keeps_single_empty_packet(self):
+        self.assertEqual(split_packets("   "), [""])
+
+    def test_streamed_chunks_match_whole_message(self):
+        text = "omg yes the festival is tonight!! meet me by the fountain at 8 ok?"
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+        self.assertEqual(list(packetize(chunks)), split_packets(text))
+
+    def test_first_packet_yields_before_stream_ends(self):
+        consumed = []
+
+        def tokens():
+            for token in ["the ", "quick ", "brown ", "fox ", "jumps ", "over ", "the ", "lazy ", "dog ", "again"]:
+                consumed.append(token)
+                yield token
+
+        packets = packetize(tokens())
+        self.assertEqual(next(packets), "the quick brown fox jumps over the lazy")
+        self.assertLess(len(consumed), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
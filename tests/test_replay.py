@@ -0,0 +1,148 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from src.ai import groq
+from src.ai.backends import ChatBackend
+from src.bot import ReplyCache, run_serial
+from src.bot.recording import RecordingBackend, SessionRecorder
+from src.bot.replay import RecordedCycle, ReplayBackend, format_report, load_session, replay_parallel, replay_session
+
+FIXTURE_DIR = Path("tests/fixtures/screenshots")
+
+
+def _payload(*messages: tuple[str, str]) -> str:
+    return json.dumps(
+        {
+            "chat_region_detected": True,
+            "messages": [{"side": "left", "user": user, "message": text} for user, text in messages],
+        }
+    )
+
+
+VISION = [
+    _payload(("Irin", "hi")),
+    _payload(("Irin", "hi"), ("Bo", "wyd")),
+    _payload(("Irin", "hi"), ("Bo", "wyd"), ("Irin", "same")),
+]
+
+
+class FakeModel(ChatBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.vision = iter(VISION * 4)
+
+    def complete(self, model, messages, **options):
+        if any(not isinstance(m["content"], str) for m in messages):
+            content = next(self.vision)
+        else:
+            content = f"re: {messages[-1]['content']}"
+        return {"choices": [{"message": {"content": content}}]}
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.session = Path(tmp.name) / "session"
+        self.addCleanup(groq.set_backend, None)
+        self.addCleanup(groq.reset_vision_history)
+        groq.reset_vision_history()
+
+        self.sent = self._record()
+
+    def _record(self, reply_cache: ReplyCache | None = None) -> list[str]:
+        screenshots = sorted(FIXTURE_DIR.glob("*.png"))
+        frames = iter([Image.open(path).convert("RGB") for path in screenshots])
+        recorder = SessionRecorder(self.session)
+        groq.set_backend(RecordingBackend(FakeModel(), recorder))
+        capture, read = recorder.capture(lambda: next(frames)), recorder.read(groq.imageToText)
+        respond = groq.getResponse
+        if reply_cache is not None:
+            reply_cache.on_hit = recorder.cache_hit
+            respond = reply_cache.wrap(groq.getResponse)
+        sent = []
+        run_serial(
+            lambda: read(capture()),
+            respond,
+            recorder.send(sent.append),
+            interval=0,
+            max_cycles=len(screenshots),
+        )
+        recorder.close()
+        groq.set_backend(None)
+        groq.reset_vision_history()
+        return sent
+
+    def test_recorder_writes_frames_and_events(self):
+        cycles = load_session(self.session)
+
+        self.assertEqual(len(cycles), 3)
+        self.assertTrue(all(cycle.frame.exists() for cycle in cycles))
+        self.assertEqual([s for cycle in cycles for s in cycle.sends], self.sent)
+        self.assertTrue(all(cycle.vision for cycle in cycles))
+
+    def test_replay_reproduces_recorded_replies(self):
+        report = replay_session(self.session)
+
+        self.assertEqual(report.cycles, 3)
+        self.assertEqual(report.replies, self.sent)
+        self.assertEqual(report.reply_diff(), [])
+        self.assertEqual(report.reply_misses, 0)
+        self.assertEqual(set(report.stage_summary()), {"capture", "vision", "parse", "generate", "send", "cycle"})
+        self.assertIn("cycles/s", format_report(report))
+
+    def test_warmup_cycles_are_not_reported(self):
+        report = replay_session(self.session, start=2, warmup=2)
+
+        self.assertEqual(report.cycles, 1)
+        self.assertEqual(report.recorded_replies, load_session(self.session)[2].sends)
+        self.assertEqual(report.reply_diff(), [])
+
+    def test_parallel_chunks_match_single_process(self):
+        report = replay_parallel(self.session, processes=2, warmup=1)
+
+        self.assertEqual(report.processes, 2)
+        self.assertEqual(report.cycles, 3)
+        self.assertEqual(report.replies, self.sent)
+
+    def test_replay_serves_recorded_reply_cache_hits(self):
+        self.session = self.session.with_name("cached")
+        reply_cache = ReplyCache(pool_size=1)
+        reply_cache.put("hi", "cached hi", [{"role": "user", "content": "hi"}])
+        sent = self._record(reply_cache)
+
+        report = replay_session(self.session)
+
+        self.assertIn("cached hi", sent)
+        self.assertEqual(report.replies, sent)
+        self.assertEqual(report.reply_misses, 0)
+
+    def test_diff_shows_changed_dedupe(self):
+        report = replay_session(self.session)
+        report.replies = report.replies[:-1]
+
+        diff = report.reply_diff()
+        self.assertIn(f"-{self.sent[-1]}", diff)
+
+
+class TestReplayBackend(unittest.TestCase):
+    def test_unmatched_prompt_takes_next_unused_reply(self):
+        cycles = [RecordedCycle(1, Path("frame.png"), replies=[("a", "one"), ("b", "two")])]
+        backend = ReplayBackend(cycles)
+        messages = [{"role": "user", "content": "changed"}]
+
+        first = backend.complete("m", messages)["choices"][0]["message"]["content"]
+        second = backend.complete("m", messages)["choices"][0]["message"]["content"]
+        third = backend.complete("m", messages)["choices"][0]["message"]["content"]
+
+        self.assertEqual((first, second, third), ("one", "two", "(no recorded reply)"))
+        self.assertEqual(backend.reply_misses, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
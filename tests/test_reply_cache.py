@@ -0,0 +1,139 @@
+import asyncio
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.bot import BotState, ReplyCache, run_serial
+from src.bot.reply_cache import cache_text
+
+OPENER = [{"role": "user", "content": "hi", "name": "Irin"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt, context, conversation_messages=None):
+        self.calls += 1
+        return {"choices": [{"message": {"content": f"reply {self.calls}"}}]}
+
+
+class TestReplyCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ReplyCache(pool_size=3, ttl=60, clock=self.clock, rng=random.Random(0))
+
+    def test_normalizes_case_punctuation_and_stretched_letters(self):
+        self.assertEqual(cache_text("Hiii!!"), cache_text("hi"))
+        self.assertEqual(self.cache.key("HEY :)"), self.cache.key("hey"))
+        self.assertNotEqual(cache_text("good"), cache_text("god"))
+        self.assertNotEqual(cache_text("too"), cache_text("to"))
+
+    def test_serves_from_pool_once_full_without_repeating(self):
+        model = CountingModel()
+        respond = self.cache.wrap(model)
+
+        responses = [respond("hi", "ctx", conversation_messages=OPENER) for _ in range(8)]
+        replies = [response["choices"][0]["message"]["content"] for response in responses]
+
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(set(replies), {"reply 1", "reply 2", "reply 3"})
+        self.assertTrue(all(a != b for a, b in zip(replies, replies[1:])))
+        self.assertEqual(self.cache.stats()["hits"], 5)
+        self.assertAlmostEqual(self.cache.hit_rate, 5 / 8)
+
+    def test_long_messages_and_named_replies_are_not_cached(self):
+        self.assertIsNone(self.cache.key("do you want to go fishing later"))
+
+        for _ in range(3):
+            self.cache.put("hi", "hi Irin!!", OPENER)
+        self.assertIsNone(self.cache.get("hi", OPENER))
+
+    def test_pools_expire_and_are_size_bounded(self):
+        cache = ReplyCache(capacity=2, pool_size=1, ttl=60, clock=self.clock)
+        cache.put("hi", "hey", OPENER)
+        self.assertEqual(cache.get("hi", OPENER), "hey")
+
+        self.clock.now += 61
+        self.assertIsNone(cache.get("hi", OPENER))
+
+        for message in ("hi", "lol", "ty"):
+            cache.put(message, "ok", [{"role": "user", "content": message}])
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.evictions, 2)
+
+    def test_opener_and_ongoing_conversations_use_separate_pools(self):
+        ongoing = [
+            {"role": "user", "content": "sup"},
+            {"role": "assistant", "content": "nm"},
+            {"role": "user", "content": "lol"},
+        ]
+        self.assertNotEqual(self.cache.key("lol", OPENER), self.cache.key("lol", ongoing))
+
+    def test_ongoing_turns_are_pooled_per_player_and_questions_skip_the_cache(self):
+        def ongoing(name, message):
+            return [
+                {"role": "user", "content": "sup", "name": name},
+                {"role": "assistant", "content": "nm"},
+                {"role": "user", "content": message, "name": name},
+            ]
+
+        self.assertNotEqual(self.cache.key("lol", ongoing("Irin", "lol")), self.cache.key("lol", ongoing("Bo", "lol")))
+        self.assertIsNone(self.cache.key("why", ongoing("Irin", "why")))
+        self.assertIsNotNone(self.cache.key("wyd?", OPENER))
+
+    def test_prewarm_from_model_and_file(self):
+        model = CountingModel()
+        self.assertEqual(self.cache.prewarm(model, ["hi", "ty"]), 6)
+        self.assertIsNotNone(self.cache.get("ty", [{"role": "user", "content": "ty"}]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "prewarm.json"
+            path.write_text(json.dumps({"wyd": ["nm hbu", "just fishing", "chillin"]}), encoding="utf-8")
+            self.assertEqual(self.cache.load(path), 3)
+        self.assertIn(self.cache.get("wyd", [{"role": "user", "content": "wyd"}]), {"nm hbu", "just fishing", "chillin"})
+
+    def test_async_and_stream_wrappers(self):
+        async def respond_async(prompt, context, conversation_messages=None):
+            return {"choices": [{"message": {"content": "hey"}}]}
+
+        def stream(prompt, context, conversation_messages=None):
+            yield "he"
+            yield "y"
+
+        cache = ReplyCache(pool_size=1)
+        response = asyncio.run(cache.wrap_async(respond_async)("hi", "ctx", conversation_messages=OPENER))
+        self.assertEqual(response["choices"][0]["message"]["content"], "hey")
+        self.assertEqual(list(cache.wrap_stream(stream)("hi", "ctx", conversation_messages=OPENER)), ["hey"])
+        self.assertEqual(cache.hits, 1)
+
+
+class TestReplyCacheInLoop(unittest.TestCase):
+    def test_repeated_openers_from_different_players_skip_the_model(self):
+        def frame(user):
+            message = {"side": "left", "user": user, "message": "hi"}
+            return json.dumps({"chat_region_detected": True, "messages": [message]})
+
+        frames = iter([frame(f"Player{idx}") for idx in range(5)])
+        model = CountingModel()
+        cache = ReplyCache(pool_size=2)
+        sent = []
+
+        run_serial(lambda: next(frames), cache.wrap(model), sent.append, state=BotState(), interval=0, max_cycles=5)
+
+        self.assertEqual(len(sent), 5)
+        self.assertEqual(model.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from src.bot import PollScheduler, SchedulerConfig, run_serial
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _poll(scheduler: PollScheduler, clock: FakeClock, payload: str, new_messages: int = 0) -> float:
+    delay = scheduler.next_delay()
+    clock.now += delay
+    scheduler.observe(payload, new_messages)
+    return delay
+
+
+class TestPollScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_idle_chat_backs_off_exponentially_to_the_cap(self):
+        config = SchedulerConfig(latency_target=1.0, max_interval=8.0, max_vision_per_minute=1000)
+        scheduler = PollScheduler(config, clock=self.clock)
+
+        delays = [_poll(scheduler, self.clock, "same") for _ in range(6)]
+
+        self.assertEqual(delays, [1.0, 2.0, 4.0, 8.0, 8.0, 8.0])
+        self.assertEqual(scheduler.counts["idle"], 6)
+
+    def test_activity_resets_to_latency_target(self):
+        config = SchedulerConfig(latency_target=1.0, max_interval=8.0, max_vision_per_minute=1000)
+        scheduler = PollScheduler(config, clock=self.clock)
+        for _ in range(4):
+            _poll(scheduler, self.clock, "same")
+
+        _poll(scheduler, self.clock, "new message", new_messages=1)
+
+        self.assertTrue(scheduler.is_active())
+        self.assertEqual(scheduler.next_delay(), 1.0)
+        self.assertEqual(scheduler.decisions[-1].reason, "active")
+
+    def test_active_delay_leaves_room_for_cycle_time(self):
+        config = SchedulerConfig(latency_target=1.0, min_interval=0.25, max_vision_per_minute=1000)
+        scheduler = PollScheduler(config, clock=self.clock)
+        for idx in range(10):
+            delay = scheduler.next_delay()
+            self.clock.now += delay + 0.5  # each cycle takes half a second
+            scheduler.observe(f"payload {idx}", 1)
+
+        self.assertLess(scheduler.next_delay(), 0.75)
+
+    def test_vision_cap_throttles_polls(self):
+        config = SchedulerConfig(latency_target=1.0, min_interval=0.25, max_vision_per_minute=10)
+        scheduler = PollScheduler(config, clock=self.clock)
+
+        start = self.clock.now
+        for idx in range(11):
+            _poll(scheduler, self.clock, f"payload {idx}", 1)
+
+        self.assertGreater(scheduler.counts["throttled"], 0)
+        self.assertGreaterEqual(self.clock.now - start, 60.0)
+        self.assertEqual(scheduler.stats()["polls"], 11)
+
+
+class TestSchedulerInLoop(unittest.TestCase):
+    def test_serial_loop_feeds_scheduler(self):
+        payload = '{"chat_region_detected": true, "messages": [{"side": "left", "user": "Irin", "message": "hi"}]}'
+        scheduler = PollScheduler(SchedulerConfig(latency_target=0.0, min_interval=0.0, max_interval=0.0))
+        sent = []
+
+        run_serial(
+            lambda: payload,
+            lambda *args, **kwargs: {"choices": [{"message": {"content": "hey"}}]},
+            sent.append,
+            max_cycles=3,
+            scheduler=scheduler,
+        )
+
+        self.assertEqual(sent, ["hey"])
+        self.assertEqual(scheduler.stats()["polls"], 3)
+        self.assertTrue(scheduler.is_active())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -61,7 +61,7 @@ class TestScreenshotContract(unittest.TestCase):
                 image_path = FIXTURE_DIR / case["image"]
                 self.assertTrue(image_path.exists(), f"Missing image: {image_path}")
 
-                raw = self.image_to_text(str(image_path))
+                raw = self.image_to_text(str(image_path), use_history=False)
                 parsed = parse_chat_payload(raw)
 
                 expected = case.get("expected", {})
@@ -0,0 +1,94 @@
+import json
+import unittest
+
+from PIL import Image, ImageDraw
+
+from src.heartopia.scroll_tracking import ScrollTranscript, plan_strip, row_profile
+
+
+BACKGROUND = (236, 231, 226)
+
+
+def _mk_chat(bubbles: list[tuple[int, str]], height: int = 340) -> Image.Image:
+    """Draw bubbles as (top_y, side) pairs on a message-list sized canvas."""
+    img = Image.new("RGB", (460, height), BACKGROUND)
+    d = ImageDraw.Draw(img)
+    for idx, (top, side) in enumerate(bubbles):
+        x0, x1 = (20, 220) if side == "left" else (240, 440)
+        d.rounded_rectangle((x0, top, x1, top + 40), radius=8, fill=(255, 255, 255))
+        d.text((x0 + 10, top + 12), f"message {idx}", fill=(40, 40, 40))
+    return img
+
+
+class TestScrollTracking(unittest.TestCase):
+    def test_plans_only_new_bottom_strip_after_scroll(self):
+        before = _mk_chat([(20, "left"), (80, "right"), (140, "left"), (200, "right")])
+        # Everything moved up 60px and one new bubble arrived at the bottom.
+        after = _mk_chat([(-40, "left"), (20, "right"), (80, "left"), (140, "right"), (200, "left")])
+
+        plan = plan_strip(row_profile(before), row_profile(after))
+
+        self.assertIsNotNone(plan)
+        self.assertEqual(plan.scroll_offset, 60)
+        self.assertGreaterEqual(plan.strip_top, 181)
+        self.assertLessEqual(plan.strip_top, 200)
+
+    def test_plans_appended_bubble_without_scroll(self):
+        before = _mk_chat([(20, "left"), (80, "right")])
+        after = _mk_chat([(20, "left"), (80, "right"), (140, "left")])
+
+        plan = plan_strip(row_profile(before), row_profile(after))
+
+        self.assertEqual(plan.scroll_offset, 0)
+        self.assertGreaterEqual(plan.strip_top, 121)
+        self.assertLessEqual(plan.strip_top, 140)
+
+    def test_unrelated_frame_requires_full_read(self):
+        before = _mk_chat([(20, "left"), (80, "right"), (140, "left"), (200, "right")])
+        after = _mk_chat([(10, "right"), (55, "right"), (100, "left"), (190, "left"), (280, "right")])
+
+        self.assertIsNone(plan_strip(row_profile(before), row_profile(after)))
+
+    def test_merge_shifts_carried_bubbles_and_places_strip(self):
+        before = _mk_chat([(20, "left"), (80, "right"), (140, "left"), (200, "right")])
+        after = _mk_chat([(-40, "left"), (20, "right"), (80, "left"), (140, "right"), (200, "left")])
+        scale = before.height - 1
+        previous_payload = {
+            "chat_region_detected": True,
+            "messages": [
+                {"side": "left", "y_center": 40 / scale, "user": "A", "message": "m0"},
+                {"side": "right", "y_center": 100 / scale, "user": "unknown", "message": "m1"},
+                {"side": "left", "y_center": 160 / scale, "user": "A", "message": "m2"},
+                {"side": "right", "y_center": 220 / scale, "user": "unknown", "message": "m3"},
+            ],
+        }
+
+        transcript = ScrollTranscript()
+        self.assertIsNone(transcript.plan(before))
+        transcript.commit(before, json.dumps(previous_payload), None)
+
+        plan = transcript.plan(after)
+        strip_height = plan.strip_height
+        strip_payload = {
+            "chat_region_detected": True,
+            "messages": [
+                {"side": "left", "y_center": (220 - plan.strip_top) / (strip_height - 1), "user": "A", "message": "m4"},
+            ],
+        }
+        merged = transcript.merge(plan, json.dumps(strip_payload)).to_payload()
+
+        self.assertEqual([m["message"] for m in merged["messages"]], ["m1", "m2", "m3", "m4"])
+        self.assertAlmostEqual(merged["messages"][0]["y_center"] * scale, 40, places=3)
+        self.assertAlmostEqual(merged["messages"][-1]["y_center"] * scale, 220, places=3)
+
+    def test_merge_rejects_invalid_strip_payload(self):
+        before = _mk_chat([(20, "left")])
+        transcript = ScrollTranscript()
+        transcript.commit(before, json.dumps({"messages": [{"y_center": 0.1, "message": "m"}]}), None)
+        plan = transcript.plan(_mk_chat([(20, "left"), (80, "right")]))
+
+        self.assertIsNone(transcript.merge(plan, "not-json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
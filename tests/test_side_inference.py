@@ -1,9 +1,10 @@
 import json
 import unittest
 
+import numpy as np
 from PIL import Image, ImageDraw
 
-from src.heartopia.side_inference import correct_message_sides
+from src.heartopia.side_inference import _box_sums, _dark_integral, correct_message_sides
 
 
 def _mk_test_image() -> Image.Image:
@@ -78,6 +79,24 @@ class TestSideInference(unittest.TestCase):
         )
         self.assertEqual(corrected["messages"][0]["side"], "left")
 
+    def test_integral_box_sums_match_pixel_counts(self):
+        img = _mk_test_image()
+        integral = _dark_integral(img)
+        boxes = [(0, 0, 199, 119), (190, 10, 199, 40), (0, 70, 10, 100), (50, 50, 60, 60)]
+
+        x0, y0, x1, y1 = (np.array(col) for col in zip(*boxes))
+        sums = _box_sums(integral, x0, y0, x1, y1).tolist()
+
+        px = img.load()
+        for (bx0, by0, bx1, by1), total in zip(boxes, sums):
+            expected = sum(
+                1
+                for y in range(by0, by1 + 1)
+                for x in range(bx0, bx1 + 1)
+                if max(px[x, y]) < 120
+            )
+            self.assertEqual(total, expected)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from src.chat.similarity import (
+    allowed_edits,
+    bounded_edit_distance,
+    fuzzy_form,
+    min_shared_shingles,
+    shingles,
+    substring_edit_distance,
+)
+
+
+class TestSimilarity(unittest.TestCase):
+    def test_fuzzy_form_ignores_case_spacing_and_punctuation(self):
+        self.assertEqual(fuzzy_form("OMG, see you\nlater!"), fuzzy_form("omg see you later"))
+
+    def test_bounded_edit_distance(self):
+        self.assertEqual(bounded_edit_distance("fishing", "flshing", 2), 1)
+        self.assertEqual(bounded_edit_distance("fishing", "shopping", 2), 3)
+        self.assertEqual(bounded_edit_distance("a", "abcdef", 2), 3)
+
+    def test_substring_edit_distance(self):
+        self.assertEqual(substring_edit_distance("goldenkoi", "icaughtagoldenkoibythelake", 1), 0)
+        self.assertEqual(substring_edit_distance("goldenkol", "icaughtagoldenkoibythelake", 1), 1)
+        self.assertEqual(substring_edit_distance("silverfin", "icaughtagoldenkoibythelake", 1), 2)
+
+    def test_shingle_filter_keeps_near_matches(self):
+        form, variant = fuzzy_form("do you want to go fishing later"), fuzzy_form("do you want to go flshing later")
+        edits = allowed_edits(len(form))
+        shared = len(shingles(form) & shingles(variant))
+        self.assertGreaterEqual(shared, min_shared_shingles(len(shingles(variant)), edits))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import argparse
+import sys
+from pathlib import Path
+from statistics import mean
+
+"""
+Vision upload encoding benchmark.
+
+Crops every screenshot in the fixture directory the same way the bot does and
+compares payload size and encode latency across encoding settings.
+
+Run from the repo root:
+    python tools/benchmarks/encoding.py
+    python tools/benchmarks/encoding.py --dir "your/screenshots" --repeat 20
+"""
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from PIL import Image  # noqa: E402
+
+from src.ai.image_encoding import EncodeSettings, encode_for_vision  # noqa: E402
+from src.heartopia.chat_preprocess import prepare_chat_message_list  # noqa: E402
+
+SETTINGS = [
+    EncodeSettings(format="PNG"),
+    EncodeSettings(format="JPEG", quality=90),
+    EncodeSettings(format="JPEG", quality=80),
+    EncodeSettings(format="JPEG", quality=60),
+    EncodeSettings(format="JPEG", quality=80, grayscale=True),
+    EncodeSettings(format="JPEG", quality=80, max_pixels=100_000),
+    EncodeSettings(format="JPEG", quality=80, max_pixels=100_000, grayscale=True, autocontrast=True),
+    EncodeSettings(format="WEBP", quality=80),
+    EncodeSettings(format="WEBP", quality=60, max_pixels=100_000),
+    EncodeSettings(format="WEBP", quality=80, grayscale=True, autocontrast=True),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare vision upload size and encode time.")
+    parser.add_argument("--dir", default=str(REPO_ROOT / "tests" / "fixtures" / "screenshots"))
+    parser.add_argument("--repeat", type=int, default=10, help="Encodes per image and setting.")
+    args = parser.parse_args()
+
+    screenshots = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".webp"})
+    if not screenshots:
+        print(f"No screenshots found in {args.dir}")
+        return
+    crops = [prepare_chat_message_list(Image.open(p).convert("RGB"))[0] for p in screenshots]
+    print(f"{len(crops)} crops, {args.repeat} encodes each\n")
+
+    baseline = None
+    print(f"{'setting':<36} {'bytes':>9} {'base64':>9} {'vs png':>7} {'encode':>10}")
+    for settings in SETTINGS:
+        sizes = []
+        timings = []
+        for crop in crops:
+            for _ in range(args.repeat):
+                encoded = encode_for_vision(crop, settings)
+                timings.append(encoded.encode_ms)
+            sizes.append(encoded.num_bytes)
+        avg_bytes = mean(sizes)
+        baseline = baseline or avg_bytes
+        print(
+            f"{settings.label():<36} {avg_bytes:>9.0f} {avg_bytes * 4 / 3:>9.0f} "
+            f"{avg_bytes / baseline:>6.0%} {mean(timings):>7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
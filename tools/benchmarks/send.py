@@ -0,0 +1,111 @@
+import argparse
+import sys
+from pathlib import Path
+
+"""
+Chat send-time benchmark.
+
+Sends replies of increasing length through the input dispatcher on the
+virtual input backend (no game, mouse or clipboard needed) and compares the
+time per reply with the timings `sendChat` used before the dispatcher.
+With `--confirm-latency` a simulated chat area shows each packet that many
+seconds after its send click; the dispatcher calibrates its send gap on a
+warm-up reply first, as it would at the start of a session.
+
+Run from the repo root:
+    python tools/benchmarks/send.py
+    python tools/benchmarks/send.py --confirm-latency 0.5
+    python tools/benchmarks/send.py --pause 0 --settle 0.01 --send-gap 0.15
+"""
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from PIL import Image  # noqa: E402
+
+from src.chat.packets import split_packets  # noqa: E402
+from src.heartopia.dispatch import LEGACY_TIMING, Dispatcher, InputTiming, VirtualInput  # noqa: E402
+
+WORDS = "sure thing meet me by the fountain in the town square after the fishing contest ends ok".split()
+LENGTHS = [20, 40, 80, 120, 200]
+TEXT_BOX = (100, 500)
+SEND_BUTTON = (300, 500)
+
+
+class SimulatedChat:
+    """A chat area that shows a new line `latency` seconds after each send click."""
+
+    def __init__(self, backend: VirtualInput, latency: float):
+        self.backend = backend
+        self.latency = latency
+
+    def __call__(self) -> Image.Image:
+        sends = [
+            at for at, action, value in self.backend.actions if action == "move" and _near(value, SEND_BUTTON)
+        ]
+        shown = sum(1 for at in sends if self.backend.now() >= at + self.latency)
+        image = Image.new("L", (96, 72), 240)
+        for line in range(min(shown, 18)):
+            image.paste(40, (0, 4 * line, 96, 4 * line + 3))
+        return image
+
+
+def _near(point: tuple[int, int], target: tuple[int, int], slack: int = 4) -> bool:
+    return abs(point[0] - target[0]) <= slack and abs(point[1] - target[1]) <= slack
+
+
+def _reply(length: int) -> str:
+    words = []
+    while len(" ".join(words)) < length:
+        words.append(WORDS[len(words) % len(WORDS)])
+    return " ".join(words)[:length].strip()
+
+
+def _dispatcher(timing: InputTiming, latency: float | None = None) -> Dispatcher:
+    backend = VirtualInput()
+    if latency is None:
+        return Dispatcher(backend, timing)
+    dispatcher = Dispatcher(backend, timing, SimulatedChat(backend, latency))
+    while not dispatcher.calibrated and dispatcher.counts["packets"] < 20:
+        dispatcher.send_packets(split_packets(_reply(200)), TEXT_BOX, SEND_BUTTON)
+    return dispatcher
+
+
+def _send_seconds(dispatcher: Dispatcher, reply: str) -> tuple[int, float]:
+    started = dispatcher.send_seconds
+    sent = dispatcher.send_packets(split_packets(reply), TEXT_BOX, SEND_BUTTON)
+    return len(sent), dispatcher.send_seconds - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare chat send time against the legacy input timings.")
+    parser.add_argument("--pause", type=float, default=InputTiming.pause)
+    parser.add_argument("--settle", type=float, default=InputTiming.settle)
+    parser.add_argument("--send-gap", type=float, default=InputTiming.send_gap)
+    parser.add_argument("--refocus", action="store_true", help="Click the text box before every packet.")
+    parser.add_argument(
+        "--confirm-latency", type=float, help="Confirm sends against a chat area that shows them after this delay."
+    )
+    args = parser.parse_args()
+    timing = InputTiming(
+        pause=args.pause,
+        settle=args.settle,
+        send_gap=args.send_gap,
+        refocus=args.refocus,
+        confirm=args.confirm_latency is not None,
+    )
+    legacy = _dispatcher(LEGACY_TIMING)
+    current = _dispatcher(timing, args.confirm_latency)
+    if args.confirm_latency is not None:
+        print(f"send gap calibrated: {current.calibrated}, {current.send_gap}s")
+
+    print(f"{'chars':>6} {'packets':>8} {'legacy':>9} {'dispatch':>9} {'speedup':>8}")
+    for length in LENGTHS:
+        reply = _reply(length)
+        packets, legacy_seconds = _send_seconds(legacy, reply)
+        _, seconds = _send_seconds(current, reply)
+        print(f"{len(reply):>6} {packets:>8} {legacy_seconds:>8.2f}s {seconds:>8.2f}s {legacy_seconds / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
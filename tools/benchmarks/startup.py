@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+"""
+Startup-time benchmark.
+
+Measures, each in a fresh interpreter:
+- cold import time of the bot's entry modules,
+- the first bot cycle (vision read of a fixture screenshot + one reply)
+  against the local stand-in LLM server, so no network or game is needed.
+
+Run from the repo root:
+    python tools/benchmarks/startup.py
+"""
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+FIXTURE_DIR = REPO_ROOT / "tests" / "fixtures" / "screenshots"
+
+IMPORT_TARGETS = [
+    "src.log",
+    "src.chat",
+    "src.ai.groq",
+    "src.heartopia.interfacing",
+    "src.bot",
+    "llm_console",
+]
+
+_IMPORT_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - t0}}))
+"""
+
+_FIRST_CYCLE_SNIPPET = """
+import json, os, time
+t0 = time.perf_counter()
+from src.ai.stub_server import StubServer
+server = StubServer().start()
+os.environ["HEARTOPIA_LLM_BASE_URL"] = server.base_url
+os.environ.setdefault("heartopiaChatAPI", "offline-benchmark")
+from src.ai.groq import getResponse, imageToText
+from src.bot import BotState, generate_reply, select_new_messages
+from src.chat.models import ChatMessage
+t_import = time.perf_counter()
+raw = imageToText({image!r})
+t_vision = time.perf_counter()
+state = BotState()
+selected = select_new_messages(raw, state)
+reply = generate_reply(getResponse, ChatMessage("hi", "Irin", "left"), [])
+t_reply = time.perf_counter()
+server.stop()
+print(json.dumps({{
+    "import": t_import - t0,
+    "first_vision": t_vision - t_import,
+    "first_reply": t_reply - t_vision,
+    "total": t_reply - t0,
+}}))
+"""
+
+
+def _run_snippet(code: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _fmt(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:8.1f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import and first-cycle startup time.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported.")
+    args = parser.parse_args()
+
+    print("Cold imports (best of {}):".format(args.repeat))
+    for module in IMPORT_TARGETS:
+        runs = [_run_snippet(_IMPORT_SNIPPET.format(module=module)) for _ in range(args.repeat)]
+        errors = [r["error"] for r in runs if "error" in r]
+        if errors:
+            print(f"  {module:<28} error: {errors[0]}")
+            continue
+        print(f"  {module:<28} {_fmt(min(r['seconds'] for r in runs))}")
+
+    screenshots = sorted(FIXTURE_DIR.glob("*.png"))
+    if not screenshots:
+        print("No fixture screenshots found; skipping first-cycle timing.")
+        return
+
+    print("First cycle against the stand-in LLM server (best of {}):".format(args.repeat))
+    runs = [_run_snippet(_FIRST_CYCLE_SNIPPET.format(image=str(screenshots[0]))) for _ in range(args.repeat)]
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        print(f"  error: {errors[0]}")
+        return
+    for key in ("import", "first_vision", "first_reply", "total"):
+        print(f"  {key:<28} {_fmt(min(r[key] for r in runs))}")
+
+
+if __name__ == "__main__":
+    main()